@@ -0,0 +1,277 @@
+"""
+Micro-benchmarks for the orchestrator's hot paths.
+
+    python bench.py [scenario ...] [--profiles 500] [--log-size 1G] [--procs 20]
+                    [--stub-lines 20000] [--stub-rate 0] [--counts 10 100 1000] [--repeat 20]
+
+Scenarios other than `procscan` share a fixture built in a temp directory: a
+UNISON_DIR with `--profiles` synthetic profiles whose logs are `--log-size`
+sparse files ending in `--log-runs` realistic unison runs (so "multi-GB" logs
+cost no disk), and a stub `unison` executable that prints realistic transfer
+output for `--stub-lines` files at `--stub-rate` lines/s (0 = unthrottled). The
+engine-backed helpers are measured through an in-process `daemon.Engine`, the
+code `main.py` calls; the `gui` scenario needs dearpygui (no display required)
+and is reported as skipped without it.
+
+Each scenario prints one JSON object per measurement on stdout, after a `meta`
+record describing the run, so results can be diffed between commits.
+"""
+
+import argparse, atexit, json, os, platform, shutil, signal, statistics, subprocess, sys, tempfile, threading, time
+
+import procscan
+
+
+def _timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter(); fn(); samples.append((time.perf_counter() - t0) * 1000)
+    return {"mean_ms": statistics.fmean(samples), "p50_ms": statistics.median(samples),
+            "min_ms": min(samples), "max_ms": max(samples), "repeat": repeat}
+
+
+def _emit(**rec):
+    print(json.dumps(rec), flush=True)
+
+
+# ─────────────────────────── SCENARIOS ───────────────────────────
+def bench_procscan(args):
+    """Scan latency of ProcScanner (cold and warm cache) vs. the pgrep path at N fake unison processes."""
+    if not procscan.ProcScanner.available():
+        print("procscan: /proc not available", file=sys.stderr); return
+    for n in args.counts:
+        # argv[0] is rewritten so the sleepers match the "unison" pattern like real syncs would
+        kids = [subprocess.Popen(["unison-bench", "600"], executable="sleep", start_new_session=True)
+                for _ in range(n)]
+        try:
+            time.sleep(0.2)
+            found = len(procscan.ProcScanner().scan())
+            _emit(scenario="procscan", impl="pgrep", processes=n, found=len(procscan.pgrep_processes()),
+                  **_timed(procscan.pgrep_processes, args.repeat))
+            _emit(scenario="procscan", impl="proc-cold", processes=n, found=found,
+                  **_timed(lambda: procscan.ProcScanner().scan(), args.repeat))
+            warm = procscan.ProcScanner(); warm.scan()
+            _emit(scenario="procscan", impl="proc-warm", processes=n, found=found,
+                  **_timed(warm.scan, args.repeat))
+        finally:
+            for k in kids: os.killpg(k.pid, signal.SIGKILL)
+            for k in kids: k.wait()
+
+
+# ─────────────────────────── FIXTURE ───────────────────────────
+STUB_UNISON = r'''#!{python}
+"""Stand-in for unison: realistic -batch output, then a run record appended to the profile's log."""
+import os, sys, time
+profile, files = sys.argv[1], int(os.environ.get("BENCH_UNISON_LINES", "1000"))
+rate = float(os.environ.get("BENCH_UNISON_RATE", "0"))
+out, t0 = sys.stdout, time.time()
+clock = lambda t: time.strftime("%H:%M:%S", time.localtime(t))
+day = time.strftime("%d %b %Y")
+out.write("Contacting server...\nLooking for changes\n  Waiting for changes from server\nReconciling changes\n"
+          f"Propagating updates\nUNISON 2.53.3 (OCAML 4.14.1) started propagating changes at {{clock(t0)}}.00 on {{day}}\n")
+for i in range(files):
+    name = f"photos/2026/IMG_{{i:06d}}.jpg"
+    out.write(f"[BGN] Updating file {{name}} from /srv/a to /srv/b\n")
+    out.write(f"  {{(i * 100) // max(1, files)}}%  00:{{i % 60:02d}} ETA\r")
+    out.write(f"[END] Updating file {{name}}\n")
+    if rate: out.flush(); time.sleep(3 / rate)
+t1 = time.time()
+summary = (f"UNISON 2.53.3 (OCAML 4.14.1) finished propagating changes at {{clock(t1)}}.00 on {{day}}\n"
+           f"Synchronization complete at {{clock(t1)}}  ({{files}} items transferred, 0 skipped, 0 failed)\n")
+out.write(summary); out.flush()
+with open(os.path.join(os.environ["BENCH_UNISON_DIR"], f"{{profile}}.log"), "a") as log: log.write(summary)
+'''
+
+_FIXTURE = {}
+
+
+def _size(text: str) -> int:
+    units = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30, "T": 1 << 40}
+    return int(float(text[:-1]) * units[text[-1].upper()]) if text[-1].upper() in units else int(text)
+
+
+def _log_run(when: float, files: int) -> str:
+    day, start, end = time.strftime("%d %b %Y", time.localtime(when)), time.localtime(when), time.localtime(when + 7)
+    lines = [f"UNISON 2.53.3 (OCAML 4.14.1) started propagating changes at {time.strftime('%H:%M:%S', start)}.00 on {day}"]
+    for i in range(files):
+        lines += [f"[BGN] Updating file docs/report-{i:04d}.odt from /srv/a to /srv/b", f"[END] Updating file docs/report-{i:04d}.odt"]
+    lines += [f"UNISON 2.53.3 (OCAML 4.14.1) finished propagating changes at {time.strftime('%H:%M:%S', end)}.00 on {day}",
+              f"Synchronization complete at {time.strftime('%H:%M:%S', end)}  ({files} items transferred, 0 skipped, 0 failed)"]
+    return "\n".join(lines) + "\n"
+
+
+def fixture(args) -> dict:
+    """Builds (once per process) the temp UNISON_DIR, orchestrator dir and stub unison."""
+    if _FIXTURE: return _FIXTURE
+    root = tempfile.mkdtemp(prefix="unison-bench-")
+    if not args.keep: atexit.register(shutil.rmtree, root, True)
+    udir, odir, bindir = (os.path.join(root, d) for d in ("unison", "orch", "bin"))
+    for d in (udir, odir, bindir): os.makedirs(d)
+    t0, log_size, now = time.perf_counter(), _size(args.log_size), time.time()
+    runs = "".join(_log_run(now - (args.log_runs - i) * 3600, 5) for i in range(args.log_runs))
+    for i in range(args.profiles):
+        name = f"bench-{i:05d}"
+        with open(os.path.join(udir, f"{name}.prf"), "w") as f:
+            f.write(f"root = /srv/a/{name}\nroot = ssh://backup//srv/b/{name}\n\nauto = true\nbatch = true\n"
+                    f"prefer = newer\nlog = true\nlogfile = {udir}/{name}.log\n")
+        with open(os.path.join(udir, f"{name}.log"), "w") as f:
+            f.seek(max(0, log_size - len(runs))); f.write(runs)     # sparse: the hole costs no disk
+    stub = os.path.join(bindir, "unison")
+    with open(stub, "w") as f: f.write(STUB_UNISON.format(python=sys.executable))
+    os.chmod(stub, 0o755)
+    _FIXTURE.update(root=root, unison_dir=udir, orch_dir=odir, unison=stub,
+                    env=dict(os.environ, BENCH_UNISON_DIR=udir, BENCH_UNISON_LINES=str(args.stub_lines),
+                             BENCH_UNISON_RATE=str(args.stub_rate)))
+    _emit(scenario="fixture", profiles=args.profiles, log_bytes=log_size, build_s=round(time.perf_counter() - t0, 3), dir=root)
+    return _FIXTURE
+
+
+def _engine(fx):
+    from daemon import Engine
+    return Engine(fx["unison_dir"], fx["orch_dir"], unison=fx["unison"])
+
+
+def _profiles(fx):
+    from scheduler import list_profiles
+    return list_profiles(fx["unison_dir"])
+
+
+# ─────────────────────────── ENGINE SCENARIOS ───────────────────────────
+def bench_profiles(args):
+    """load_profiles(): building the state store (cold) vs. the in-memory list the GUI reads (warm)."""
+    from statestore import StateStore
+    fx = fixture(args)
+    _emit(scenario="load_profiles", impl="cold", profiles=args.profiles,
+          **_timed(lambda: StateStore(fx["unison_dir"], fx["orch_dir"]).profiles(), args.repeat))
+    engine = _engine(fx)
+    _emit(scenario="load_profiles", impl="warm", profiles=args.profiles, **_timed(engine.list_profiles, args.repeat))
+
+
+def _bench_log_reader(args, scenario, read):
+    from logindex import LogIndex
+    fx = fixture(args)
+    paths = [os.path.join(fx["unison_dir"], f"{p}.log") for p in _profiles(fx)]
+    _emit(scenario=scenario, impl="cold", profiles=len(paths),
+          **_timed(lambda: [read(LogIndex(tail_lines=40), p) for p in paths], args.repeat))
+    index = LogIndex(tail_lines=40)
+    for p in paths: read(index, p)
+    before = index.bytes_read
+    _emit(scenario=scenario, impl="warm", profiles=len(paths),
+          **_timed(lambda: [read(index, p) for p in paths], args.repeat), bytes_read=index.bytes_read - before)
+    run = _log_run(time.time(), 5)
+    def appended():
+        for p in paths:
+            with open(p, "a") as f: f.write(run)
+        t0 = time.perf_counter(); [read(index, p) for p in paths]; return (time.perf_counter() - t0) * 1000
+    samples = [appended() for _ in range(min(args.repeat, 5))]
+    _emit(scenario=scenario, impl="after-append", profiles=len(paths), mean_ms=statistics.fmean(samples),
+          p50_ms=statistics.median(samples), min_ms=min(samples), max_ms=max(samples), repeat=len(samples))
+
+
+def bench_last_sync(args):
+    """last_sync() over every profile: fresh index, unchanged logs, and one run appended to each log."""
+    _bench_log_reader(args, "last_sync", lambda index, p: index.last_sync(p))
+
+
+def bench_tail_log(args):
+    """tail_log() over every profile, same three cases as last_sync."""
+    _bench_log_reader(args, "tail_log", lambda index, p: index.tail(p))
+
+
+def bench_processes(args):
+    """get_running_unison_processes() while `--procs` stub unisons are running."""
+    fx = fixture(args)
+    env = dict(fx["env"], BENCH_UNISON_LINES="1000000", BENCH_UNISON_RATE="10")
+    kids = [subprocess.Popen([fx["unison"], p, "-batch"], env=env, stdout=subprocess.DEVNULL, start_new_session=True)
+            for p in _profiles(fx)[:args.procs]]
+    try:
+        time.sleep(0.5)
+        engine = _engine(fx)
+        _emit(scenario="get_running_unison_processes", impl="proc" if engine.scanner else "pgrep", processes=len(kids),
+              found=len(engine.processes()), **_timed(engine.processes, args.repeat))
+    finally:
+        for k in kids: os.killpg(k.pid, signal.SIGKILL)
+        for k in kids: k.wait()
+
+
+def bench_stream(args):
+    """Script log streaming: stub unison output through outstream.pump (script runner) and a capture-mode job."""
+    from outstream import OutputRing, pump
+    from scheduler import SyncScheduler
+    fx = fixture(args)
+    profile = _profiles(fx)[0]
+    ring, snaps = OutputRing(5000, 512 * 1024), []
+    def render():
+        # what the UI tick does at UI_FPS while output arrives
+        while not ring_done.is_set():
+            t0 = time.perf_counter(); ring.snapshot(); snaps.append((time.perf_counter() - t0) * 1000); time.sleep(0.1)
+    ring_done = threading.Event(); renderer = threading.Thread(target=render); renderer.start()
+    t0 = time.perf_counter()
+    proc = subprocess.Popen([fx["unison"], profile, "-batch"], env=fx["env"], stdout=subprocess.PIPE, stderr=subprocess.STDOUT, bufsize=0)
+    pump(proc.stdout, ring); proc.wait(); wall = time.perf_counter() - t0
+    ring_done.set(); renderer.join()
+    _emit(scenario="script_stream", impl="pump", lines=args.stub_lines * 3, chars=ring.total_chars, wall_s=round(wall, 3),
+          lines_per_s=round(args.stub_lines * 3 / wall), snapshot_p50_ms=statistics.median(snaps or [0]),
+          snapshot_max_ms=max(snaps or [0]), dropped_lines=ring.dropped)
+
+    sched = SyncScheduler(fx["unison_dir"], workers=1, unison=fx["unison"], capture_output=True)
+    saved = dict(os.environ)
+    os.environ.update(fx["env"])          # the scheduler passes our environment to unison
+    try:
+        t0 = time.perf_counter()
+        job, = sched.submit([profile]); sched.start().wait(); sched.stop()
+        wall = time.perf_counter() - t0
+    finally:                              # don't leak the stub settings into later scenarios
+        os.environ.clear(); os.environ.update(saved)
+    _emit(scenario="script_stream", impl="job-capture", lines=args.stub_lines * 3, wall_s=round(wall, 3),
+          lines_per_s=round(args.stub_lines * 3 / wall), rc=job.rc, progress=job.progress)
+
+
+# ─────────────────────────── GUI SCENARIOS ───────────────────────────
+def bench_gui(args):
+    """refresh_profile_panel() + one viewport tick, and refresh_monitor_tab(), on a headless DearPyGui context."""
+    try: from dearpygui import dearpygui as dpg
+    except ImportError:
+        _emit(scenario="gui", skipped="dearpygui not installed"); return
+    import main as app
+    fx = fixture(args)
+    app.UNISON_DIR, app.ORCH_DIR, app.ENGINE = fx["unison_dir"], fx["orch_dir"], _engine(fx)
+    dpg.create_context()
+    try:
+        app.build_gui()
+        app.LAST_SYNC_CACHE.update(app.last_syncs(app.load_profiles()))
+        def panel():
+            app.refresh_profile_panel(); app._sync_profile_viewport()
+        _emit(scenario="refresh_profile_panel", profiles=args.profiles, **_timed(panel, args.repeat))
+        dpg.set_value("log_combo", app.load_profiles()[0])
+        _emit(scenario="refresh_monitor_tab", profiles=args.profiles, **_timed(app.refresh_monitor_tab, args.repeat))
+    finally:
+        dpg.destroy_context()
+
+
+SCENARIOS = {"procscan": bench_procscan, "load_profiles": bench_profiles, "last_sync": bench_last_sync,
+             "tail_log": bench_tail_log, "processes": bench_processes, "stream": bench_stream, "gui": bench_gui}
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("scenarios", nargs="*", default=list(SCENARIOS), help=f"any of: {', '.join(SCENARIOS)}")
+    ap.add_argument("--counts", type=int, nargs="+", default=[10, 100, 1000], help="procscan: fake process counts")
+    ap.add_argument("--repeat", type=int, default=20)
+    ap.add_argument("--profiles", type=int, default=500, help="synthetic profiles in the fixture")
+    ap.add_argument("--log-size", default="1G", help="apparent size of each profile log (sparse), e.g. 512M, 4G")
+    ap.add_argument("--log-runs", type=int, default=50, help="real unison runs at the end of each log")
+    ap.add_argument("--procs", type=int, default=20, help="processes: stub unisons running while scanning")
+    ap.add_argument("--stub-lines", type=int, default=20000, help="files the stub unison reports per run")
+    ap.add_argument("--stub-rate", type=float, default=0, help="stub output lines per second (0 = unthrottled)")
+    ap.add_argument("--keep", action="store_true", help="keep the fixture directory")
+    args = ap.parse_args(argv)
+    unknown = [s for s in args.scenarios if s not in SCENARIOS]
+    if unknown: ap.error(f"unknown scenario(s): {', '.join(unknown)}")
+    _emit(scenario="meta", python=platform.python_version(), platform=platform.platform(), time=time.time(),
+          args={k: v for k, v in vars(args).items() if k != "scenarios"}, scenarios=args.scenarios)
+    for name in args.scenarios: SCENARIOS[name](args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Pre-sync change detection.
+
+Most scheduled runs find nothing to propagate, yet each unison still pays its
+startup and archive scan. `ChangeScanner.plan()` walks the local roots of every
+profile with `os.scandir` on a thread pool (roots shared by several profiles are
+walked once) and reduces each tree to a digest of (path, size, mtime, mode). A
+profile is only run when a digest differs from the one stored after its last
+successful run, its .prf changed, it has a remote root (the far side cannot be
+seen from here), or it has not run for `force_every` seconds.
+
+A successful run is recorded with the digests `plan()` took before unison
+started, not a rescan afterwards: a file edited while unison was running then
+shows up as a change on the next plan instead of being recorded as synced.
+Changes unison itself wrote into a local root make the next plan run that
+profile once more. The forced run remains the safety net for anything the
+snapshot cannot see.
+
+    python changescan.py [--force-every 24] [profile ...]    # print the plan
+"""
+
+import argparse, hashlib, json, os, sys, threading, time
+from concurrent.futures import ThreadPoolExecutor
+
+from fsutil import atomic_write
+from prf import Profile
+
+UNISON_DIR = os.path.expanduser("~/.unison")
+CACHE_PATH = os.path.join(os.path.expanduser("~/unison_orchestrator"), "changescan.json")
+FORCE_EVERY_SECS = 24 * 3600
+SCAN_WORKERS = 8
+
+
+def is_remote(root: str) -> bool:
+    return "://" in root
+
+
+def scan_root(root: str) -> tuple[str, int]:
+    """(digest, entries) of the tree under a local root; deterministic for unchanged trees."""
+    h, n, stack = hashlib.blake2b(digest_size=16), 0, [os.path.expanduser(root)]
+    while stack:
+        d = stack.pop()
+        try: entries = sorted(os.scandir(d), key=lambda e: e.name)
+        except OSError as e:
+            h.update(f"!{d}\0{e.errno}\n".encode("utf-8", "surrogateescape")); continue
+        for e in entries:
+            try: st = e.stat(follow_symlinks=False)
+            except FileNotFoundError: continue
+            h.update(f"{e.path}\0{st.st_size}\0{st.st_mtime_ns}\0{st.st_mode}\n".encode("utf-8", "surrogateescape"))
+            n += 1
+            if e.is_dir(follow_symlinks=False): stack.append(e.path)
+    return h.hexdigest(), n
+
+
+class ChangeScanner:
+    def __init__(self, cache_path=CACHE_PATH, force_every=FORCE_EVERY_SECS, workers=SCAN_WORKERS):
+        self.cache_path, self.force_every, self.workers = cache_path, force_every, workers
+        try:
+            with open(cache_path) as f: self.cache = json.load(f)
+        except (FileNotFoundError, ValueError): self.cache = {}
+        self._lock = threading.Lock()
+        self._targets: dict[str, tuple[str, list[str]]] = {}   # profile -> (prf path, roots) from the last plan
+        self._snapshots: dict[str, dict[str, str]] = {}         # profile -> {local root: digest} taken by the last plan
+        self.stats = {"scan_s": 0.0, "roots": 0, "entries": 0}
+
+    @staticmethod
+    def _prf_key(path):
+        try: st = os.stat(path); return f"{st.st_mtime_ns}:{st.st_size}"
+        except FileNotFoundError: return None
+
+    def _scan_all(self, roots) -> dict[str, str]:
+        t0 = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            results = dict(zip(roots, pool.map(scan_root, roots)))
+        self.stats["scan_s"] += time.monotonic() - t0
+        self.stats["roots"] += len(results); self.stats["entries"] += sum(n for _, n in results.values())
+        return {root: digest for root, (digest, _) in results.items()}
+
+    def plan(self, unison_dir, profiles) -> dict[str, str | None]:
+        """profile -> reason it must run ('new', 'remote', 'forced', 'profile', 'changed'), or None to skip.
+        Also snapshots the local roots of every profile that may run, for `commit()`."""
+        now, reasons, need_scan = time.time(), {}, {}
+        for p in profiles:
+            path = os.path.join(unison_dir, f"{p}.prf")
+            try: roots = Profile.load(path).roots
+            except FileNotFoundError: roots = []
+            self._targets[p] = (path, roots)
+            entry = self.cache.get(p)
+            if entry is None: reasons[p] = "new"
+            elif any(is_remote(r) for r in roots): reasons[p] = "remote"
+            elif now - entry.get("last_run", 0) >= self.force_every: reasons[p] = "forced"
+            elif entry.get("prf") != self._prf_key(path) or sorted(entry.get("roots", {})) != sorted(roots):
+                reasons[p] = "profile"
+            else: need_scan[p] = roots
+        # remote profiles always run, so their roots are not worth a snapshot
+        snap = {p: roots for p, roots in need_scan.items()}
+        snap.update((p, [r for r in self._targets[p][1] if not is_remote(r)]) for p, why in reasons.items() if why != "remote")
+        digests = self._scan_all(sorted({r for roots in snap.values() for r in roots}))
+        for p, roots in need_scan.items():
+            stored = self.cache[p]["roots"]
+            reasons[p] = "changed" if any(stored[r] != digests[r] for r in roots) else None
+        for p, roots in snap.items(): self._snapshots[p] = {r: digests[r] for r in roots}
+        return reasons
+
+    def commit(self, profile, duration):
+        """Records a successful (rc 0) run of `profile` with the root digests `plan()` took before it ran."""
+        path, roots = self._targets.get(profile) or (os.path.join(UNISON_DIR, f"{profile}.prf"), [])
+        digests = self._snapshots.get(profile, {})
+        with self._lock:
+            self.cache[profile] = {"roots": {r: digests.get(r) for r in roots}, "prf": self._prf_key(path),
+                                   "last_run": time.time(), "last_run_s": round(duration, 3)}
+
+    def estimated_saving(self, skipped) -> float:
+        """Seconds the skipped profiles took on their last real run."""
+        return sum(self.cache.get(p, {}).get("last_run_s", 0.0) for p in skipped)
+
+    def save(self):
+        with self._lock: text = json.dumps(self.cache)
+        atomic_write(self.cache_path, text)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("profiles", nargs="*")
+    ap.add_argument("--unison-dir", default=UNISON_DIR)
+    ap.add_argument("--cache", default=CACHE_PATH)
+    ap.add_argument("--force-every", type=float, default=FORCE_EVERY_SECS / 3600, metavar="HOURS")
+    args = ap.parse_args(argv)
+    scanner = ChangeScanner(args.cache, args.force_every * 3600)
+    from scheduler import list_profiles
+    profiles = args.profiles or list_profiles(args.unison_dir)
+    plan = scanner.plan(args.unison_dir, profiles)
+    json.dump({"plan": plan, "stats": scanner.stats}, sys.stdout, indent=2); print()
+
+
+if __name__ == "__main__":
+    main()
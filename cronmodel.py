@@ -0,0 +1,265 @@
+"""
+Crontab model and manager.
+
+`CronTab.parse()` turns `crontab -l` output into entries (jobs, environment
+lines, comments, invalid lines) that render back byte-for-byte, with each job's
+schedule parsed into a `Schedule` (5-field expressions with ranges, steps, lists
+and month/day names, plus the @-macros) and the `.sh` script it runs resolved to
+an absolute path. Edits match jobs by that script path instead of substring
+matching on the line.
+
+`CronManager` keeps one parsed CronTab and only forks `crontab -l` again when the
+user's spool file (or, when it is not readable, the spool directory) has a new
+mtime; without a visible spool it falls back to re-reading every `recheck`
+seconds. Edits re-read, change the model and install it with a single
+`crontab -` (which replaces the spool file atomically).
+
+    python cronmodel.py next '*/15 9-17 * * mon-fri' [--count 5]
+    python cronmodel.py upcoming [--hours 48]
+"""
+
+import argparse, datetime as dt, getpass, os, re, shlex, subprocess, sys, threading, time
+
+CRON_RECHECK_SECS = 60
+SPOOL_DIRS = ("/var/spool/cron/crontabs", "/var/spool/cron", "/var/cron/tabs", "/usr/lib/cron/tabs", "/var/at/tabs")
+MONTHS = ("jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec")
+DAYS   = ("sun", "mon", "tue", "wed", "thu", "fri", "sat")
+MACROS = {"@yearly": "0 0 1 1 *", "@annually": "0 0 1 1 *", "@monthly": "0 0 1 * *", "@weekly": "0 0 * * 0",
+          "@daily": "0 0 * * *", "@midnight": "0 0 * * *", "@hourly": "0 * * * *"}
+_FIELDS = (("minute", 0, 59, None, 0), ("hour", 0, 23, None, 0), ("day of month", 1, 31, None, 1),
+           ("month", 1, 12, MONTHS, 1), ("day of week", 0, 7, DAYS, 0))
+_ENV = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*\s*=")
+
+
+class CronError(RuntimeError):
+    """`crontab` itself failed (missing binary, or it rejected the new table)."""
+
+
+# ─────────────────────────── SCHEDULES ───────────────────────────
+def _field(text, name, lo, hi, names, base):
+    def value(tok):
+        if names and tok.lower() in names: return names.index(tok.lower()) + base
+        if not tok.isdigit(): raise ValueError(f"{name}: {tok!r} is not a number")
+        return int(tok)
+    values = set()
+    for part in text.split(","):
+        rng, slash, step = part.partition("/")
+        if slash and (not step.isdigit() or int(step) == 0): raise ValueError(f"{name}: bad step in {part!r}")
+        if rng == "*": a, b = lo, hi
+        else:
+            first, dash, last = rng.partition("-")
+            a = value(first)
+            b = value(last) if dash else (hi if slash else a)
+        if not lo <= a <= b <= hi: raise ValueError(f"{name}: {part!r} is outside {lo}-{hi}")
+        values.update(range(a, b + 1, int(step or 1)))
+    return frozenset(values)
+
+
+class Schedule:
+    __slots__ = ("text", "minutes", "hours", "doms", "months", "dows", "any_dom", "any_dow", "reboot")
+
+    def __init__(self, text):
+        self.text, self.reboot = text, text == "@reboot"
+        if self.reboot: return
+        fields = MACROS.get(text, text).split()
+        if len(fields) != 5: raise ValueError(f"expected 5 fields or an @macro, got {text!r}")
+        self.minutes, self.hours, self.doms, self.months, dows = (_field(f, *spec) for f, spec in zip(fields, _FIELDS))
+        self.dows = frozenset(d % 7 for d in dows)          # 7 is Sunday too
+        self.any_dom, self.any_dow = fields[2].startswith("*"), fields[4].startswith("*")
+
+    @classmethod
+    def parse(cls, text):
+        """Raises ValueError with a readable message for invalid expressions."""
+        return cls(" ".join(text.split()))
+
+    def _day_ok(self, t):
+        dom, dow = t.day in self.doms, t.isoweekday() % 7 in self.dows
+        # cron: when both day fields are restricted, matching either one is enough
+        return dom and dow if self.any_dom or self.any_dow else dom or dow
+
+    def next_after(self, t: dt.datetime) -> dt.datetime | None:
+        """First run strictly after `t` (naive local time), or None for @reboot / impossible dates."""
+        if self.reboot: return None
+        t, end = t.replace(second=0, microsecond=0) + dt.timedelta(minutes=1), t + dt.timedelta(days=366 * 5)
+        while t < end:
+            if t.month not in self.months:
+                t = (t.replace(day=1, hour=0, minute=0) + dt.timedelta(days=32)).replace(day=1)
+            elif not self._day_ok(t): t = (t + dt.timedelta(days=1)).replace(hour=0, minute=0)
+            elif t.hour not in self.hours: t = (t + dt.timedelta(hours=1)).replace(minute=0)
+            elif t.minute not in self.minutes: t += dt.timedelta(minutes=1)
+            else: return t
+        return None
+
+    def runs(self, start: dt.datetime, until: dt.datetime, limit=50) -> list[dt.datetime]:
+        out, t = [], start
+        while len(out) < limit and (t := self.next_after(t)) is not None and t <= until: out.append(t)
+        return out
+
+
+# ─────────────────────────── CRONTAB ───────────────────────────
+def default_resolve(token: str, base=None) -> str:
+    token = os.path.expandvars(os.path.expanduser(token))
+    return token if os.path.isabs(token) or base is None else os.path.join(base, token)
+
+
+class Entry:
+    __slots__ = ("raw", "kind", "schedule", "command", "script", "error")
+
+    def __init__(self, raw, kind, schedule=None, command=None, script=None, error=None):
+        self.raw, self.kind, self.schedule, self.command, self.script, self.error = raw, kind, schedule, command, script, error
+
+    @classmethod
+    def parse(cls, raw, resolve=default_resolve):
+        text = raw.strip()
+        if not text: return cls(raw, "blank")
+        if text.startswith("#"): return cls(raw, "comment")
+        if _ENV.match(text): return cls(raw, "env")
+        if text.startswith("@"):
+            spec, command = (text.split(None, 1) + [""])[:2]
+        else:
+            fields = text.split(None, 5)
+            if len(fields) < 6: return cls(raw, "invalid", error="expected a schedule and a command")
+            spec, command = " ".join(fields[:5]), fields[5]
+        try: schedule = Schedule.parse(spec)
+        except ValueError as e: return cls(raw, "invalid", command=command.strip(), error=str(e))
+        return cls(raw, "job", schedule, command.strip(), cls._script(command, resolve))
+
+    @staticmethod
+    def _script(command, resolve):
+        try: tokens = shlex.split(command, comments=False)
+        except ValueError: tokens = [t.strip("\"'") for t in command.split()]
+        return next((resolve(t) for t in tokens if t.endswith(".sh")), None)
+
+
+class CronTab:
+    def __init__(self, entries=None, resolve=default_resolve):
+        self.entries: list[Entry] = entries or []
+        self.resolve = resolve
+
+    @classmethod
+    def parse(cls, text, resolve=default_resolve):
+        return cls([Entry.parse(ln, resolve) for ln in text.splitlines()], resolve)
+
+    def render(self) -> str:
+        return "".join(e.raw + "\n" for e in self.entries)
+
+    def copy(self):
+        return CronTab(list(self.entries), self.resolve)
+
+    @property
+    def jobs(self) -> list[Entry]:
+        return [e for e in self.entries if e.kind == "job"]
+
+    @property
+    def invalid(self) -> list[Entry]:
+        return [e for e in self.entries if e.kind == "invalid"]
+
+    def scripts(self) -> list[str]:
+        return sorted({e.script for e in self.jobs if e.script})
+
+    def jobs_for(self, script) -> list[Entry]:
+        return [e for e in self.jobs if e.script == script]
+
+    def set_job(self, script, schedule, command):
+        """Schedules `command` for `script`: replaces its existing job(s) in place, else appends."""
+        new = Entry.parse(f"{' '.join(schedule.split())} {command}", self.resolve)
+        if new.kind != "job": raise ValueError(new.error)
+        idx = [i for i, e in enumerate(self.entries) if e.kind == "job" and e.script == script]
+        if not idx: self.entries.append(new); return
+        self.entries[idx[0]] = new
+        for i in reversed(idx[1:]): del self.entries[i]
+
+    def remove_script(self, script) -> bool:
+        before = len(self.entries)
+        self.entries = [e for e in self.entries if not (e.kind == "job" and e.script == script)]
+        return len(self.entries) != before
+
+    def upcoming(self, now=None, hours=48, limit=20) -> list[tuple[dt.datetime, Entry]]:
+        now = now or dt.datetime.now()
+        until = now + dt.timedelta(hours=hours)
+        runs = [(t, e) for e in self.jobs for t in e.schedule.runs(now, until, limit)]
+        return sorted(runs, key=lambda r: r[0])[:limit]
+
+
+# ─────────────────────────── MANAGER ───────────────────────────
+def spool_key(user=None):
+    """Change key for the user's crontab: spool file (mtime, size), else the spool dir's mtime, else None."""
+    user = user or getpass.getuser()
+    for d in SPOOL_DIRS:
+        try: dst = os.stat(d)
+        except OSError: continue
+        try: st = os.stat(os.path.join(d, user)); return ("file", st.st_mtime_ns, st.st_size)
+        except FileNotFoundError: return ("dir", dst.st_mtime_ns)      # no crontab yet; creating one touches the dir
+        except PermissionError: return ("dir", dst.st_mtime_ns)        # crontab(1) renames into the dir on every edit
+    return None
+
+
+class CronManager:
+    def __init__(self, resolve=default_resolve, recheck=CRON_RECHECK_SECS, user=None):
+        self.resolve, self.recheck, self.user = resolve, recheck, user
+        self.version = 0                    # bumped whenever the crontab text changes
+        self.reads = self.writes = 0        # `crontab` forks
+        self._tab, self._key, self._checked, self._stale = None, None, 0.0, True
+        self._lock = threading.Lock()
+
+    def read(self, force=False) -> CronTab:
+        key, now = spool_key(self.user), time.monotonic()
+        with self._lock:
+            unchanged = key == self._key if key is not None else now - self._checked < self.recheck
+            if self._tab is not None and unchanged and not (force or self._stale): return self._tab
+        try: proc = subprocess.run(["crontab", "-l"], capture_output=True, text=True)
+        except FileNotFoundError: text = ""
+        else: text = proc.stdout if proc.returncode == 0 else ""          # non-zero: no crontab for this user
+        tab = CronTab.parse(text, self.resolve)
+        with self._lock:
+            self.reads += 1
+            if self._tab is None or self._tab.render() != text: self.version += 1
+            self._tab, self._key, self._checked, self._stale = tab, key, now, False
+        return tab
+
+    def invalidate(self):
+        self._stale = True
+
+    def write(self, tab: CronTab):
+        """Installs `tab` with one `crontab -` call."""
+        try: proc = subprocess.run(["crontab", "-"], input=tab.render(), capture_output=True, text=True)
+        except FileNotFoundError as e: raise CronError("crontab is not installed") from e
+        if proc.returncode != 0: raise CronError(proc.stderr.strip() or f"crontab exited with {proc.returncode}")
+        with self._lock:
+            self.writes += 1; self.version += 1
+            self._tab, self._key, self._checked, self._stale = tab, spool_key(self.user), time.monotonic(), False
+
+    def install(self, script, schedule, command):
+        Schedule.parse(schedule)                   # fail before forking anything
+        tab = self.read(force=True).copy()
+        tab.set_job(script, schedule, command)
+        self.write(tab)
+
+    def remove(self, script) -> bool:
+        tab = self.read(force=True).copy()
+        if not tab.remove_script(script): return False
+        self.write(tab); return True
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    n = sub.add_parser("next", help="validate a schedule and print its next runs")
+    n.add_argument("schedule"); n.add_argument("--count", type=int, default=5)
+    u = sub.add_parser("upcoming", help="next runs of every job in your crontab")
+    u.add_argument("--hours", type=float, default=48)
+    args = ap.parse_args(argv)
+    if args.cmd == "next":
+        try: sched = Schedule.parse(args.schedule)
+        except ValueError as e: print(f"invalid: {e}", file=sys.stderr); return 1
+        now = dt.datetime.now()
+        for t in sched.runs(now, now + dt.timedelta(days=366 * 5), args.count): print(f"{t:%a %Y-%m-%d %H:%M}")
+        return 0
+    tab = CronManager().read()
+    for e in tab.invalid: print(f"invalid line: {e.raw.strip()}  ({e.error})", file=sys.stderr)
+    for t, e in tab.upcoming(hours=args.hours, limit=100): print(f"{t:%a %Y-%m-%d %H:%M}  {e.script or e.command}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,403 @@
+"""
+Headless orchestrator engine and its Unix-socket JSON API.
+
+`Engine` owns what used to live inside the GUI process: the state store and its
+filesystem watcher, the log index, sync-history ingestion, the process scanner,
+the sync scheduler and its resource governor (limits from ORCH_DIR/governor.json). Run it once as a daemon and any number of GUIs (or
+scripts) attach to it without re-scanning anything; when no daemon is listening
+the GUI builds an in-process `Engine` instead, so both paths use the same methods.
+
+Protocol: one JSON object per line in each direction.
+
+    -> {"id": 1, "method": "start_sync", "params": {"profile": "photos"}}
+    <- {"id": 1, "result": {...}}            or  {"id": 1, "error": "..."}
+
+`stream_output` answers with `{"id", "event": "output", "version", "text"}`
+messages while the profile's job runs, then one `{"id", "event": "end", "job"}`.
+`changes` is a long-poll: pass the last `cursor` and a `timeout` to wait for the
+next profile/log/job/script change.
+
+    python daemon.py serve [--workers 4]
+    python daemon.py call list_profiles
+    python daemon.py call start_sync profile=photos
+    python daemon.py stream photos [--start]
+"""
+
+import argparse, collections, datetime as dt, functools, itertools, json, os, queue, shlex, signal, socket, socketserver, sys, threading, time
+
+from cronmodel import Schedule
+from governor import Governor, merge_status, read_published
+from history import SyncHistory
+from logindex import LogIndex
+from procscan import ProcScanner, pgrep_processes
+from scheduler import SyncScheduler
+from statestore import StateStore
+
+UNISON_DIR  = os.path.expanduser("~/.unison")
+ORCH_DIR    = os.path.expanduser("~/unison_orchestrator")
+SOCKET_PATH = os.path.join(os.environ.get("XDG_RUNTIME_DIR") or ORCH_DIR, "unison-orchestrator.sock")
+EVENT_BACKLOG = 10000      # change events kept for clients that poll with an older cursor
+MAX_WAIT      = 60.0       # upper bound for one `changes` long-poll
+STREAM_FPS    = 10
+STREAMING     = {"stream_output"}   # methods answered with many messages; see DaemonClient.stream
+CRON_HORIZON_H = 48        # how far ahead `crontab()` lists upcoming runs
+
+
+class DaemonError(RuntimeError):
+    """An API call that reached the daemon but failed there."""
+
+
+# ─────────────────────────── ENGINE ───────────────────────────
+class Engine:
+    """Every API method takes and returns JSON-serialisable values, so it works the same over the socket."""
+
+    API = frozenset({"ping", "status", "list_profiles", "profile", "last_syncs", "tail_log", "crontab",
+                     "invalidate_crontab", "install_cron", "remove_cron", "cron_preview", "reload", "processes", "start_sync", "stop_sync", "job", "jobs",
+                     "job_output", "history", "changes", "governor"})
+
+    def __init__(self, unison_dir=UNISON_DIR, orch_dir=ORCH_DIR, history_db=None, workers=4,
+                 unison="unison", tail_lines=40):
+        os.makedirs(unison_dir, exist_ok=True); os.makedirs(orch_dir, exist_ok=True)
+        self.unison_dir = unison_dir
+        self.log_index = LogIndex(tail_lines=tail_lines)
+        self.state = StateStore(unison_dir, orch_dir)
+        self.sync_history = SyncHistory(history_db or os.path.join(orch_dir, "history.sqlite3"), unison_dir)
+        self.scanner = ProcScanner("unison") if ProcScanner.available() else None
+        self.resource_governor = Governor(os.path.join(orch_dir, "governor.json"))
+        self.governor_status_dir = os.path.join(orch_dir, "governor-status")
+        self.scheduler = SyncScheduler(unison_dir, workers=workers, per_device=1, retries=0, unison=unison,
+                                       log_index=self.log_index, on_event=self._on_job_event, capture_output=True,
+                                       governor=self.resource_governor)
+        self._jobs = {}                     # profile -> latest scheduler.Job
+        self._lock = threading.Lock()
+        self._events = collections.deque(maxlen=EVENT_BACKLOG)
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._ingest: "queue.Queue[str]" = queue.Queue()
+        self.state.listener = self._on_state_change
+
+    def start(self):
+        self.state.start(); self.scheduler.start()
+        threading.Thread(target=self._ingest_loop, daemon=True).start()
+        for p in self.state.profiles(): self._ingest.put(p)
+        return self
+
+    def _log(self, profile):
+        return os.path.join(self.unison_dir, f"{profile}.log")
+
+    # ── change events ──
+    def _publish(self, kind, name=None):
+        with self._cond:
+            self._seq += 1; self._events.append((self._seq, kind, name)); self._cond.notify_all()
+
+    def _on_state_change(self, kind, name):
+        if kind == "log": self._ingest.put(name)
+        elif kind == "reset":
+            for p in self.state.profiles(): self._ingest.put(p)
+        self._publish(kind, name)
+
+    def _on_job_event(self, event, job):
+        if event != "queued" and job.finished and not job.active:
+            try: self.sync_history.record_job(job.profile, job.started, job.finished, job.rc)
+            except Exception as e: print(f"History record failed for {job.profile}: {e}", file=sys.stderr)
+        self._publish("job", job.profile)
+
+    def _ingest_loop(self):
+        """Keeps the log index warm and the history database current as logs change."""
+        while True:
+            profile = self._ingest.get()
+            self.log_index.last_sync(self._log(profile))
+            try: self.sync_history.ingest(profile)
+            except Exception as e: print(f"History ingest failed for {profile}: {e}", file=sys.stderr)
+
+    # ── API: state ──
+    def ping(self):
+        return {"pid": os.getpid(), "unison_dir": self.unison_dir}
+
+    def status(self):
+        jobs = [j for j in list(self._jobs.values()) if j.active]   # workers add jobs concurrently
+        return {"pid": os.getpid(), "watcher": self.state.watcher_kind, "profiles": len(self.state.profiles()),
+                "running": sum(j.state == "running" for j in jobs), "queued": sum(j.state == "queued" for j in jobs),
+                "cursor": self._seq, "log_bytes_read": self.log_index.bytes_read}
+
+    def list_profiles(self):
+        return self.state.profiles()
+
+    def profile(self, name):
+        prof = self.state.profile(name)
+        if prof is None: return None
+        return {"name": name, "roots": prof.roots, "options": prof.options(), "includes": prof.includes}
+
+    def last_syncs(self, profiles):
+        return {p: self.log_index.last_sync(self._log(p)) for p in profiles}
+
+    def tail_log(self, profile):
+        return self.log_index.tail(self._log(profile))
+
+    def crontab(self):
+        """Text, managed scripts, jobs with their next run, invalid lines and the upcoming-runs timeline."""
+        text, tab, now = self.state.crontab_text(), self.state.cron.read(), dt.datetime.now()
+        jobs = []
+        for e in tab.jobs:
+            nxt = e.schedule.next_after(now)
+            jobs.append({"schedule": e.schedule.text, "command": e.command, "script": e.script,
+                         "next": nxt.timestamp() if nxt else None})
+        return {"text": text, "version": self.state.cron.version, "scripts": tab.scripts(), "jobs": jobs,
+                "invalid": [{"line": e.raw, "error": e.error} for e in tab.invalid],
+                "upcoming": [[t.timestamp(), e.script or e.command] for t, e in tab.upcoming(now, CRON_HORIZON_H)]}
+
+    def invalidate_crontab(self):
+        self.state.invalidate_crontab()
+
+    def install_cron(self, script, schedule, command=None):
+        """Runs `script` on `schedule` (replacing any job that already runs it); ValueError if invalid."""
+        self.state.cron.install(script, schedule, command or f"{shlex.quote(script)} >> ~/unison_cron.log 2>&1")
+
+    def remove_cron(self, script):
+        return self.state.cron.remove(script)
+
+    @staticmethod
+    def cron_preview(schedule, count=3):
+        """Next `count` run times of a schedule expression (epoch seconds); ValueError if invalid."""
+        now = dt.datetime.now()
+        return [t.timestamp() for t in Schedule.parse(schedule).runs(now, now + dt.timedelta(days=366 * 5), count)]
+
+    def reload(self):
+        self.state.reload(); self._on_state_change("reset", None)
+
+    def processes(self):
+        return self.scanner.scan() if self.scanner else pgrep_processes("unison")
+
+    def governor(self):
+        """Backend, throttle state, load/disk readings and per-job resource usage, including the jobs of
+        governed schedulers running outside the engine (sync_all_profiles.sh from cron)."""
+        return merge_status(self.resource_governor.status(), read_published(self.governor_status_dir))
+
+    def history(self, query, since=0.0, limit=20):
+        if query == "slowest": return self.sync_history.slowest_profiles(since, limit)
+        if query == "failures": return self.sync_history.failure_rate(since, limit)
+        if query == "throughput": return self.sync_history.throughput(since)
+        raise ValueError(f"unknown history query {query!r}")
+
+    def changes(self, cursor=None, timeout=0.0):
+        """Events after `cursor` as {"cursor", "events": [[kind, name], ...], "reset"}.
+
+        `reset` means events were missed (cursor too old, or the daemon restarted) and
+        the caller should reload everything. Without a cursor only the current one is returned.
+        """
+        with self._cond:
+            if cursor is None: return {"cursor": self._seq, "events": [], "reset": False}
+            if timeout and self._seq == cursor:
+                self._cond.wait_for(lambda: self._seq != cursor, min(float(timeout), MAX_WAIT))
+            oldest = self._events[0][0] if self._events else self._seq + 1
+            if cursor > self._seq or cursor < oldest - 1: return {"cursor": self._seq, "events": [], "reset": True}
+            return {"cursor": self._seq, "events": [[k, n] for s, k, n in self._events if s > cursor], "reset": False}
+
+    # ── API: jobs ──
+    @staticmethod
+    def _job_info(job):
+        return {"profile": job.profile, "state": job.state, "active": job.active, "rc": job.rc,
+                "attempts": job.attempts, "elapsed": round(job.elapsed(), 1), "progress": job.progress,
+                "started": job.started, "finished": job.finished,
+                "output_version": job.output.version if job.output else None}
+
+    def start_sync(self, profile):
+        """Queues a sync of `profile` unless one is already queued or running; returns the job."""
+        with self._lock:
+            job = self._jobs.get(profile)
+            if not (job and job.active):
+                job, = self.scheduler.submit([profile]); self._jobs[profile] = job
+        return self._job_info(job)
+
+    def stop_sync(self, profile):
+        job = self._jobs.get(profile)
+        if not (job and job.active): return False
+        self.scheduler.cancel(job); return True
+
+    def job(self, profile):
+        job = self._jobs.get(profile)
+        return self._job_info(job) if job else None
+
+    def jobs(self, active_only=False):
+        return {p: self._job_info(j) for p, j in list(self._jobs.items()) if j.active or not active_only}
+
+    def job_output(self, profile, version=-1):
+        """Current output window of the profile's job, or None if it has not changed since `version`."""
+        job = self._jobs.get(profile)
+        if job is None or job.output is None or job.output.version == version: return None
+        version, text = job.output.snapshot()
+        return {"version": version, "text": text}
+
+
+# ─────────────────────────── SERVER ───────────────────────────
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        engine = self.server.engine
+        try:
+            for line in self.rfile:
+                try:
+                    req = json.loads(line); rid, method, params = req.get("id"), req["method"], req.get("params") or {}
+                except (ValueError, KeyError, AttributeError) as e:
+                    self._send({"id": None, "error": f"bad request: {e}"}); continue
+                try:
+                    if not isinstance(params, dict): raise TypeError("params must be an object")
+                    if method in STREAMING: self._stream(engine, rid, **params); continue
+                    if method not in Engine.API: self._send({"id": rid, "error": f"unknown method {method!r}"}); continue
+                    self._send({"id": rid, "result": getattr(engine, method)(**params)})
+                except (BrokenPipeError, ConnectionResetError): raise
+                except Exception as e: self._send({"id": rid, "error": f"{type(e).__name__}: {e}"})
+        except (BrokenPipeError, ConnectionResetError): pass
+
+    def _send(self, msg):
+        self.wfile.write(json.dumps(msg).encode() + b"\n")
+
+    def _stream(self, engine, rid, profile):
+        version = -1
+        while True:
+            info = engine.job(profile)          # read before the output so the last chunk is never missed
+            if out := engine.job_output(profile, version):
+                version = out["version"]; self._send({"id": rid, "event": "output", **out})
+            if info is None or not info["active"]:
+                self._send({"id": rid, "event": "end", "job": info}); return
+            time.sleep(1 / STREAM_FPS)
+
+
+class EngineServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path, engine):
+        if os.path.exists(path):
+            try: DaemonClient(path)._drop(); live = True
+            except (DaemonError, ValueError): live = True    # something answered, just not with a clean ping
+            except OSError: live = False
+            if live: raise OSError(f"a daemon is already listening on {path}")
+            os.unlink(path)                      # stale socket from a daemon that died
+        old = os.umask(0o177)                    # socket is rw for this user only
+        try: super().__init__(path, _Handler)
+        finally: os.umask(old)
+        self.engine = engine
+
+
+# ─────────────────────────── CLIENT ───────────────────────────
+class DaemonClient:
+    """Blocking client with the same methods as `Engine`; one connection per thread."""
+
+    def __init__(self, path=SOCKET_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._ids = itertools.count(1)
+        self.call("ping")                        # OSError if nobody is listening
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM); sock.connect(self.path)
+        return sock, sock.makefile("rb")
+
+    def _drop(self):
+        conn, self._local.conn = getattr(self._local, "conn", None), None
+        if conn: conn[1].close(); conn[0].close()
+
+    def call(self, method, **params):
+        if method in STREAMING: raise DaemonError(f"{method} is a streaming method; use stream()")
+        for attempt in (0, 1):                   # reconnect once if the daemon was restarted
+            try:
+                if getattr(self._local, "conn", None) is None: self._local.conn = self._connect()
+                sock, rfile = self._local.conn
+                sock.sendall(json.dumps({"id": next(self._ids), "method": method, "params": params}).encode() + b"\n")
+                line = rfile.readline()
+                if not line: raise ConnectionError("daemon closed the connection")
+                break
+            except OSError:
+                self._drop()
+                if attempt: raise
+        msg = json.loads(line)
+        if "error" in msg: raise DaemonError(msg["error"])
+        if "result" not in msg:                  # not a reply to this call; the connection is out of step
+            self._drop(); raise DaemonError(f"unexpected reply to {method}: {line[:200]!r}")
+        return msg["result"]
+
+    def stream(self, method, **params):
+        """Yields every message of a streaming call (on its own connection) up to and including the end event."""
+        sock, rfile = self._connect()
+        try:
+            sock.sendall(json.dumps({"id": 0, "method": method, "params": params}).encode() + b"\n")
+            for line in rfile:
+                msg = json.loads(line)
+                if "error" in msg: raise DaemonError(msg["error"])
+                yield msg
+                if msg.get("event") == "end": return
+        finally:
+            rfile.close(); sock.close()
+
+    def __getattr__(self, name):
+        if name.startswith("_"): raise AttributeError(name)
+        return functools.partial(self.call, name)
+
+
+# ─────────────────────────── CLI ───────────────────────────
+def _param(item):
+    key, sep, value = item.partition("=")
+    if not sep: raise argparse.ArgumentTypeError(f"expected KEY=VALUE, got {item!r}")
+    try: return key, json.loads(value)
+    except ValueError: return key, value
+
+
+def serve(args):
+    try: engine = Engine(args.unison_dir, args.orch_dir, args.history, args.workers, args.unison)
+    except ValueError as e: print(f"Cannot start engine: {e}", file=sys.stderr); return 1
+    try: server = EngineServer(args.socket, engine)
+    except OSError as e: print(f"Cannot listen on {args.socket}: {e}", file=sys.stderr); return 1
+    engine.start()
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    print(f"Unison orchestrator daemon listening on {args.socket} (watcher: {engine.state.watcher_kind})", flush=True)
+    try: server.serve_forever()
+    except KeyboardInterrupt: pass
+    finally:
+        server.server_close()
+        try: os.unlink(args.socket)
+        except FileNotFoundError: pass
+        engine.scheduler.cancel_all()
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--socket", default=SOCKET_PATH)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    s = sub.add_parser("serve", help="run the engine in the foreground")
+    s.add_argument("--unison-dir", default=UNISON_DIR)
+    s.add_argument("--orch-dir", default=ORCH_DIR)
+    s.add_argument("--history", metavar="DB", help="sync history database (default: ORCH_DIR/history.sqlite3)")
+    s.add_argument("--workers", type=int, default=4)
+    s.add_argument("--unison", default="unison", help="unison executable")
+    c = sub.add_parser("call", help="call one API method and print the JSON result")
+    c.add_argument("method")
+    c.add_argument("params", nargs="*", type=_param, metavar="KEY=VALUE", help="VALUE is parsed as JSON when possible")
+    t = sub.add_parser("stream", help="follow a profile's sync output")
+    t.add_argument("profile")
+    t.add_argument("--start", action="store_true", help="start a sync first")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "serve": return serve(args)
+    try: client = DaemonClient(args.socket)
+    except OSError as e: print(f"No daemon at {args.socket}: {e}", file=sys.stderr); return 2
+    try:
+        if args.cmd == "call":
+            json.dump(client.call(args.method, **dict(args.params)), sys.stdout, indent=2); print()
+            return 0
+        if args.start: client.start_sync(profile=args.profile)
+        shown = ""
+        for msg in client.stream("stream_output", profile=args.profile):
+            if msg["event"] == "output":
+                # the window slides once the ring is full; print only what is new when it still overlaps
+                text = msg["text"]
+                sys.stdout.write(text[len(shown):] if text.startswith(shown) else text); sys.stdout.flush()
+                shown = text
+            else:
+                job = msg["job"]
+                print(f"\n[{job['state'] if job else 'no job'}]" + (f" rc={job['rc']}" if job and job["rc"] is not None else ""))
+                return 0 if job and job["state"] == "done" else 1
+    except DaemonError as e:
+        print(f"error: {e}", file=sys.stderr); return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
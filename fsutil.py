@@ -0,0 +1,30 @@
+"""
+Small filesystem helpers shared by the orchestrator's modules.
+
+`atomic_write` replaces a file in one step (temp file in the same directory,
+then `os.replace`), so readers - other processes, unison itself, a crashed
+writer's successor - only ever see the old or the new contents.
+"""
+
+import os, tempfile
+
+
+def atomic_write(path, text: str, keep_mode=False) -> str:
+    """Writes `text` to `path` atomically, creating its directory; returns `path`.
+
+    With `keep_mode` an existing file's permission bits are carried over.
+    """
+    d = os.path.dirname(path) or "."
+    os.makedirs(d, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=d, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f: f.write(text)
+        if keep_mode:
+            try: os.chmod(tmp, os.stat(path).st_mode & 0o7777)
+            except FileNotFoundError: pass
+        os.replace(tmp, path)
+    except BaseException:
+        try: os.unlink(tmp)
+        except FileNotFoundError: pass
+        raise
+    return path
@@ -0,0 +1,504 @@
+"""
+Resource governor for unison jobs.
+
+Every job is started under per-profile limits (`cpu_weight`, `cpu_max` in % of
+one CPU, `io_weight`, `memory_max`) using the first backend that works here:
+
+    cgroup   a delegated cgroup v2 subtree we can write to (and are alone in): one
+             child cgroup per job, the job's shell joins it before exec'ing unison
+    systemd  `systemd-run --user --scope` with CPUWeight/CPUQuota/IOWeight/MemoryMax
+             (plus ionice, since user managers rarely get the io controller)
+    nice     `nice` + `ionice` only; memory caps are not enforced
+
+The backend is chosen when the first job starts, so a process that only builds a
+`Governor` (e.g. the GUI, until it runs a sync) is never moved between cgroups.
+
+New jobs are admitted adaptively: while at least one job runs, another only
+starts if the 1-minute load average per CPU is below `max_load_per_cpu` and the
+disks behind the job's roots (or all disks, if unknown) are less than
+`max_disk_busy` % busy, both read from /proc and sampled at most every
+`SAMPLE_SECS`.
+
+Limits come from a JSON config (default ~/unison_orchestrator/governor.json):
+
+    {"default":   {"cpu_weight": 50, "io_weight": 50},
+     "groups":    {"photos-*": {"io_weight": 10, "memory_max": "2G"}, "db-backup": {"cpu_max": 100}},
+     "admission": {"max_load_per_cpu": 1.0, "max_disk_busy": 85}}
+
+A governed scheduler running in another process (sync_all_profiles.sh from cron)
+publishes its `status()` to STATUS_DIR/<pid>.json every STATUS_SECS, so the
+daemon/GUI can show those jobs too (`read_published`).
+
+Groups are fnmatch patterns over profile names; every matching group is applied
+over the default, in file order. The file is validated when loaded: a bad value
+raises ValueError naming the setting, instead of failing a job later.
+"""
+
+import argparse, fnmatch, json, math, os, re, shutil, subprocess, sys, threading, time
+from fsutil import atomic_write
+
+CONFIG_PATH = os.path.join(os.path.expanduser("~/unison_orchestrator"), "governor.json")
+STATUS_DIR  = os.path.join(os.path.expanduser("~/unison_orchestrator"), "governor-status")
+CGROUP_ROOT = "/sys/fs/cgroup"
+STATUS_SECS = 2.0
+STATUS_STALE_SECS = 30     # a published status older than this is ignored (publisher hung or suspended)
+SAMPLE_SECS = 1.0
+CLK_TCK     = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+DEFAULT_LIMITS    = {"cpu_weight": 50, "io_weight": 50}
+DEFAULT_ADMISSION = {"max_load_per_cpu": 1.0, "max_disk_busy": 85.0}
+_UNITS = {"": 1, "K": 1 << 10, "M": 1 << 20, "G": 1 << 30, "T": 1 << 40}
+_SIZE  = re.compile(r"(\d+(?:\.\d+)?)\s*([KMGT]?)(?:I?B)?", re.I)
+_UNLIMITED = ("", "max", "none", "infinity")
+
+
+def parse_size(value) -> int | None:
+    """Bytes from 2G / 2GiB / 512 MB / 1073741824; None for 'max' (no cap). ValueError otherwise."""
+    if value is None or isinstance(value, str) and value.strip().lower() in _UNLIMITED: return None
+    if isinstance(value, bool): raise ValueError("expected a size")
+    if isinstance(value, (int, float)): size = int(value)
+    elif m := _SIZE.fullmatch(str(value).strip()): size = int(float(m.group(1)) * _UNITS[m.group(2).upper()])
+    else: raise ValueError("expected a size such as 2G, 512MiB or max")
+    if size <= 0: raise ValueError("must be positive")
+    return size
+
+
+def _number(value, lo, hi=None) -> float:
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)): raise ValueError("expected a number")
+    x = float(value)
+    if x < lo or hi is not None and x > hi: raise ValueError(f"must be between {lo} and {hi}" if hi else f"must be ≥ {lo}")
+    return x
+
+
+def normalise_limits(raw, where="limits") -> dict:
+    """Validated copy of one limits block: integer weights, cpu_max in % (None = no quota), memory_max in bytes."""
+    if not isinstance(raw, dict): raise ValueError(f"{where}: expected an object")
+    out = {}
+    for key, value in raw.items():
+        try:
+            if key in ("cpu_weight", "io_weight"): out[key] = int(_number(value, 1, 10000))
+            elif key == "cpu_max":
+                out[key] = None if value is None or isinstance(value, str) and value.strip().lower() in _UNLIMITED \
+                    else _number(value, 1)
+            elif key == "memory_max": out[key] = parse_size(value)
+            else: raise ValueError("unknown limit (cpu_weight, cpu_max, io_weight, memory_max)")
+        except (TypeError, ValueError) as e: raise ValueError(f"{where}.{key} = {value!r}: {e}") from None
+    return out
+
+
+def load_config(path) -> tuple[dict, dict, dict]:
+    """(default limits, {pattern: limits}, admission) from a governor.json; defaults if it does not exist."""
+    try: config = json.loads(_read(path))
+    except FileNotFoundError: config = {}
+    except ValueError as e: raise ValueError(f"{path}: not valid JSON: {e}") from None
+    if not isinstance(config, dict): raise ValueError(f"{path}: expected a JSON object")
+    unknown = set(config) - {"default", "groups", "admission"}
+    if unknown: raise ValueError(f"{path}: unknown section(s) {', '.join(sorted(unknown))}")
+    default = {**DEFAULT_LIMITS, **normalise_limits(config.get("default", {}), f"{path}: default")}
+    groups = config.get("groups", {})
+    if not isinstance(groups, dict): raise ValueError(f"{path}: groups: expected an object of pattern -> limits")
+    groups = {pattern: normalise_limits(limits, f"{path}: groups[{pattern!r}]") for pattern, limits in groups.items()}
+    admission, raw = dict(DEFAULT_ADMISSION), config.get("admission", {})
+    if not isinstance(raw, dict): raise ValueError(f"{path}: admission: expected an object")
+    for key, value in raw.items():
+        if key not in ("max_load_per_cpu", "max_disk_busy", "recheck_secs"):
+            raise ValueError(f"{path}: admission.{key}: unknown setting (max_load_per_cpu, max_disk_busy, recheck_secs)")
+        try: admission[key] = _number(value, 0.1 if key == "recheck_secs" else 0)
+        except (TypeError, ValueError) as e: raise ValueError(f"{path}: admission.{key} = {value!r}: {e}") from None
+    return default, groups, admission
+
+
+def nice_level(cpu_weight) -> int:
+    # cgroup weight 100 == nice 0 and each nice step is ~1.25x; unprivileged users can only go up
+    return max(0, min(19, round(math.log(100 / max(1, cpu_weight), 1.25))))
+
+
+def ionice_args(io_weight) -> list[str]:
+    if io_weight <= 1: return ["-c", "3"]                                   # idle class
+    return ["-c", "2", "-n", str(max(0, min(7, 4 + round(math.log2(100 / io_weight)))))]
+
+
+def _read(path):
+    with open(path) as f: return f.read()
+
+
+# ─────────────────────────── SYSTEM LOAD ───────────────────────────
+class LoadSampler:
+    """1-minute load average and per-disk busy % (delta of io_ticks in /proc/diskstats)."""
+
+    def __init__(self):
+        self.load = self.load_per_cpu = 0.0
+        self.busy: dict[str, float] = {}
+        self._ticks, self._at, self._disks = {}, 0.0, self._whole_disks()
+
+    @staticmethod
+    def _whole_disks():
+        try: return {d for d in os.listdir("/sys/block") if not d.startswith(("loop", "ram", "zram", "sr", "fd"))}
+        except FileNotFoundError: return set()
+
+    def sample(self, force=False):
+        now = time.monotonic()
+        if not force and now - self._at < SAMPLE_SECS: return
+        try: self.load = float(_read("/proc/loadavg").split()[0])
+        except (OSError, ValueError): self.load = 0.0
+        self.load_per_cpu = self.load / (os.cpu_count() or 1)
+        ticks = {}
+        try:
+            for ln in _read("/proc/diskstats").splitlines():
+                f = ln.split()
+                if len(f) > 12 and f[2] in self._disks: ticks[f[2]] = int(f[12])      # ms spent doing I/O
+        except OSError: pass
+        if self._at:
+            elapsed_ms = (now - self._at) * 1000
+            self.busy = {d: min(100.0, (t - self._ticks.get(d, t)) / elapsed_ms * 100) for d, t in ticks.items()}
+        self._ticks, self._at = ticks, now
+
+    @staticmethod
+    def disk_of(st_dev) -> str | None:
+        """Whole-disk (or dm/md) name backing a device number, via /sys/dev/block."""
+        try: path = os.path.realpath(f"/sys/dev/block/{os.major(st_dev)}:{os.minor(st_dev)}")
+        except (OSError, ValueError): return None
+        if not os.path.exists(path): return None
+        return os.path.basename(os.path.dirname(path)) if os.path.exists(os.path.join(path, "partition")) else os.path.basename(path)
+
+
+# ─────────────────────────── BACKENDS ───────────────────────────
+class NiceBackend:
+    name = "nice"
+    enforces = ("cpu_weight", "io_weight")
+
+    def __init__(self):
+        self._nice, self._ionice = shutil.which("nice"), shutil.which("ionice")
+
+    def command(self, key, limits, cmd):
+        out = [self._nice, "-n", str(nice_level(limits.get("cpu_weight", 100)))] if self._nice else []
+        if self._ionice: out += [self._ionice, *ionice_args(limits.get("io_weight", 100))]
+        return out + cmd
+
+    def cgroup_of(self, key, pid): return None
+
+    def release(self, key): pass
+
+    def sweep(self): pass
+
+
+class SystemdBackend(NiceBackend):
+    name = "systemd"
+    enforces = ("cpu_weight", "cpu_max", "io_weight", "memory_max")
+
+    @classmethod
+    def probe(cls):
+        exe = shutil.which("systemd-run")
+        if not exe: return None
+        try: ok = subprocess.run([exe, "--user", "--scope", "--quiet", "true"], capture_output=True, timeout=5).returncode == 0
+        except (OSError, subprocess.TimeoutExpired): ok = False
+        return cls(exe) if ok else None
+
+    def __init__(self, exe):
+        super().__init__(); self._exe, self._units, self._seq = exe, {}, 0
+
+    def command(self, key, limits, cmd):
+        self._seq += 1
+        unit = self._units[key] = f"unison-{re.sub(r'[^A-Za-z0-9_.-]', '_', key.profile)}-{os.getpid()}-{self._seq}"
+        props = [f"CPUWeight={limits.get('cpu_weight', 100)}", f"IOWeight={limits.get('io_weight', 100)}"]
+        if limits.get("cpu_max"): props.append(f"CPUQuota={limits['cpu_max']:g}%")
+        if limits.get("memory_max"): props.append(f"MemoryMax={limits['memory_max']}")
+        ionice = [self._ionice, *ionice_args(limits.get("io_weight", 100))] if self._ionice else []
+        return [self._exe, "--user", "--scope", "--quiet", "--collect", f"--unit={unit}",
+                *(a for p in props for a in ("-p", p)), "--", *ionice, *cmd]
+
+    def cgroup_of(self, key, pid):
+        # until systemd-run has moved itself into the scope, the pid is still in our own cgroup
+        cg = _proc_cgroup(pid)
+        return cg if cg and key in self._units and cg.endswith(f"/{self._units[key]}.scope") else None
+
+    def release(self, key):
+        self._units.pop(key, None)
+
+
+class CgroupBackend:
+    """Direct cgroup v2: needs write access to our own cgroup (root, or a unit with Delegate=yes)."""
+    name = "cgroup"
+    enforces = ("cpu_weight", "cpu_max", "io_weight", "memory_max")
+
+    @classmethod
+    def probe(cls):
+        own, pid = _proc_cgroup(os.getpid()), str(os.getpid())
+        if own is None or not os.path.exists(os.path.join(CGROUP_ROOT, "cgroup.controllers")): return None
+        base = own.rstrip("/")
+        try:
+            # only a cgroup of our own: moving out of a shared one (a login session, a service's
+            # main cgroup) would leave the others behind and fail with EBUSY anyway
+            if _read(os.path.join(base, "cgroup.procs")).split() != [pid]: return None
+            wanted = {"cpu", "io", "memory"} & set(_read(os.path.join(base, "cgroup.controllers")).split())
+            if not wanted or not os.access(base, os.W_OK): return None
+        except OSError: return None
+        # no-internal-processes rule: move ourselves to a leaf before enabling controllers for children
+        leaf = os.path.join(base, "orchestrator")
+        try:
+            os.makedirs(leaf, exist_ok=True)
+            with open(os.path.join(leaf, "cgroup.procs"), "w") as f: f.write(pid)
+            with open(os.path.join(base, "cgroup.subtree_control"), "w") as f: f.write(" ".join(f"+{c}" for c in wanted))
+        except OSError:
+            try:
+                with open(os.path.join(base, "cgroup.procs"), "w") as f: f.write(pid)
+                os.rmdir(leaf)
+            except OSError: pass
+            return None
+        return cls(base, wanted)
+
+    def __init__(self, base, controllers):
+        self.base, self.controllers, self._dirs, self._seq = base, controllers, {}, 0
+        self._stale: set[str] = set()       # job cgroups whose rmdir failed (a straggler was still inside)
+
+    def command(self, key, limits, cmd):
+        self._seq += 1
+        d = os.path.join(self.base, f"unison-job-{os.getpid()}-{self._seq}")
+        os.makedirs(d, exist_ok=True)
+        settings = {"cpu.weight": limits.get("cpu_weight"), "io.weight": limits.get("io_weight") and f"default {limits['io_weight']}",
+                    "cpu.max": limits.get("cpu_max") and f"{int(limits['cpu_max'] * 1000)} 100000",
+                    "memory.max": limits.get("memory_max")}
+        for name, value in settings.items():
+            if value is not None and name.split(".")[0] in self.controllers:
+                with open(os.path.join(d, name), "w") as f: f.write(str(value))
+        self._dirs[key] = d
+        # the shell joins the cgroup, then execs unison with the same pid
+        return ["/bin/sh", "-c", 'echo $$ > "$0" && exec "$@"', os.path.join(d, "cgroup.procs"), *cmd]
+
+    def cgroup_of(self, key, pid):
+        return self._dirs.get(key)
+
+    def release(self, key):
+        d = self._dirs.pop(key, None)
+        if d: self._stale.add(d)
+        self.sweep()
+
+    def sweep(self):
+        """Removes finished job cgroups; an empty cgroup stays until someone rmdirs it."""
+        for d in list(self._stale):
+            try: os.rmdir(d)
+            except FileNotFoundError: pass
+            except OSError: continue          # EBUSY: a child process (e.g. ssh) is still exiting
+            self._stale.discard(d)
+
+
+def _proc_cgroup(pid) -> str | None:
+    try:
+        for ln in _read(f"/proc/{pid}/cgroup").splitlines():
+            if ln.startswith("0::"): return os.path.join(CGROUP_ROOT, ln[3:].lstrip("/"))
+    except OSError: pass
+    return None
+
+
+# ─────────────────────────── GOVERNOR ───────────────────────────
+class Governor:
+    def __init__(self, config_path=CONFIG_PATH, backend="auto"):
+        self.default, self.groups, self.admission = load_config(config_path)     # ValueError on a bad config
+        self.backend_choice, self._backend, self._fallback = backend, None, NiceBackend()
+        self.load = LoadSampler()
+        self.recheck = self.admission.get("recheck_secs", SAMPLE_SECS)   # how long a held job waits before asking again
+        self.throttled, self.reason = False, ""
+        self._jobs = {}                    # job -> {"profile", "pid", "limits", "cgroup", "last": (cpu_s, t)}
+        self._disk_cache: dict[str, str | None] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def backend(self):
+        """The backend in use, probed on first access."""
+        with self._lock: return self._resolve()
+
+    def _resolve(self):
+        if self._backend is None:
+            probes = {"cgroup": CgroupBackend.probe, "systemd": SystemdBackend.probe}
+            choice = self.backend_choice
+            order = list(probes) if choice == "auto" else [choice] if choice in probes else []
+            self._backend = next((b for b in (probes[name]() for name in order) if b is not None), None) or self._fallback
+        return self._backend
+
+    def limits_for(self, profile) -> dict:
+        limits = dict(self.default)
+        for pattern, extra in self.groups.items():
+            if fnmatch.fnmatch(profile, pattern): limits.update(extra)
+        return limits
+
+    # ── launching ──
+    def command(self, job, cmd) -> list[str]:
+        """`cmd` wrapped so the job starts under its profile's limits; never raises (falls back to nice/ionice)."""
+        limits = self.limits_for(job.profile)
+        with self._lock:                   # workers call this concurrently; backends keep per-job state
+            self._jobs[job] = {"profile": job.profile, "limits": limits, "pid": None, "cgroup": None, "last": None}
+            backend = self._resolve()
+            try: return backend.command(job, limits, cmd)
+            except OSError as e:
+                print(f"[{job.profile}] {backend.name} limits not applied ({e}); using nice/ionice", file=sys.stderr)
+                return self._fallback.command(job, limits, cmd)
+
+    def attach(self, job, pid):
+        """Records the job's pid; its cgroup is looked up in `status()`, once the job is in it."""
+        with self._lock:
+            if job in self._jobs: self._jobs[job]["pid"] = pid
+
+    def release(self, job):
+        with self._lock:
+            self._jobs.pop(job, None)
+            if self._backend: self._backend.release(job)
+
+    # ── admission ──
+    def _disks_for(self, devices):
+        out = set()
+        for dev in devices:
+            if not dev.startswith("dev:"): continue
+            if dev not in self._disk_cache: self._disk_cache[dev] = LoadSampler.disk_of(int(dev[4:]))
+            if self._disk_cache[dev]: out.add(self._disk_cache[dev])
+        return out
+
+    def admit(self, running, devices=()) -> bool:
+        """Whether one more job may start now; the first job is always admitted."""
+        self.load.sample()
+        adm, reason = self.admission, ""
+        if running:
+            if self.load.load_per_cpu >= adm["max_load_per_cpu"]:
+                reason = f"load {self.load.load:.2f} ({self.load.load_per_cpu:.2f}/cpu ≥ {adm['max_load_per_cpu']})"
+            else:
+                disks = self._disks_for(devices) & self.load.busy.keys() or self.load.busy.keys()
+                busy = max(((self.load.busy[d], d) for d in disks), default=(0.0, ""))
+                if busy[0] >= adm["max_disk_busy"]: reason = f"{busy[1]} {busy[0]:.0f}% busy (≥ {adm['max_disk_busy']:.0f}%)"
+        self.throttled, self.reason = bool(reason), reason
+        return not reason
+
+    def clear(self):
+        """No job is waiting for admission (queue empty, or the held job was cancelled)."""
+        self.throttled, self.reason = False, ""
+
+    # ── reporting ──
+    @staticmethod
+    def _cgroup_usage(cg):
+        stat = dict(ln.split() for ln in _read(os.path.join(cg, "cpu.stat")).splitlines())
+        cpu_s, rss, rd, wr = int(stat["usage_usec"]) / 1e6, None, None, None
+        try: rss = int(_read(os.path.join(cg, "memory.current")))
+        except OSError: pass
+        try:
+            rd = wr = 0
+            for ln in _read(os.path.join(cg, "io.stat")).splitlines():
+                kv = dict(p.split("=") for p in ln.split()[1:])
+                rd += int(kv.get("rbytes", 0)); wr += int(kv.get("wbytes", 0))
+        except OSError: rd = wr = None
+        return cpu_s, rss, rd, wr
+
+    @staticmethod
+    def _group_usage(pgids) -> dict[int, list]:
+        """pgid -> [cpu_s, rss, read, write] summed over every process in the group (unison and its ssh)."""
+        out, page = {}, os.sysconf("SC_PAGE_SIZE")
+        for name in os.listdir("/proc"):
+            if not name.isdigit(): continue
+            try:
+                f = _read(f"/proc/{name}/stat"); rest = f[f.rfind(")") + 2:].split()
+                if (pgid := int(rest[2])) not in pgids: continue
+                acc = out.setdefault(pgid, [0.0, 0, 0, 0])
+                acc[0] += (int(rest[11]) + int(rest[12])) / CLK_TCK; acc[1] += int(rest[21]) * page
+                io = dict(ln.split(": ") for ln in _read(f"/proc/{name}/io").splitlines())
+                acc[2] += int(io["read_bytes"]); acc[3] += int(io["write_bytes"])
+            except (OSError, KeyError, ValueError, IndexError): continue
+        return out
+
+    def _usage(self, job, info, now, groups):
+        if info["cgroup"] is None and self._backend: info["cgroup"] = self._backend.cgroup_of(job, info["pid"])
+        cg, pid = info["cgroup"], info["pid"]
+        usage = None
+        if cg:
+            try: usage = self._cgroup_usage(cg)
+            except (OSError, KeyError, ValueError): cg = None       # not readable here (e.g. hybrid hierarchy)
+        cpu_s, rss, rd, wr = usage or groups.get(pid) or (None,) * 4
+        cpu_pct = None
+        if cpu_s is not None:
+            if info["last"]: cpu_pct = max(0.0, (cpu_s - info["last"][0]) / max(1e-3, now - info["last"][1]) * 100)
+            info["last"] = (cpu_s, now)
+        return {"profile": info["profile"], "pid": pid, "cpu_pct": cpu_pct, "memory": rss, "read_bytes": rd,
+                "write_bytes": wr, "limits": info["limits"], "in_cgroup": bool(cg)}
+
+    def status(self) -> dict:
+        self.load.sample()
+        now = time.monotonic()
+        with self._lock: running = [(job, info) for job, info in self._jobs.items() if info["pid"]]
+        groups = self._group_usage({info["pid"] for _, info in running}) if running else {}
+        with self._lock:
+            jobs = [self._usage(job, info, now, groups) for job, info in running]
+            backend = self._backend
+            if backend: backend.sweep()
+        return {"backend": backend.name if backend else "pending", "enforces": list(backend.enforces) if backend else [],
+                "throttled": self.throttled,
+                "reason": self.reason, "load": self.load.load, "load_per_cpu": round(self.load.load_per_cpu, 3),
+                "disk_busy": {d: round(b, 1) for d, b in sorted(self.load.busy.items(), key=lambda kv: -kv[1])},
+                "admission": self.admission, "jobs": jobs}
+
+
+# ─────────────────────────── CROSS-PROCESS STATUS ───────────────────────────
+def publish(status, status_dir=STATUS_DIR):
+    """Atomically writes this process's governor status for `read_published`."""
+    atomic_write(os.path.join(status_dir, f"{os.getpid()}.json"), json.dumps(status))
+
+
+def publish_loop(gov, stop, status_dir=STATUS_DIR, every=STATUS_SECS):
+    """Publishes `gov.status()` until `stop` (a threading.Event) is set, then withdraws it."""
+    try:
+        while True:
+            try: publish(gov.status(), status_dir)
+            except OSError as e: print(f"governor: cannot publish status: {e}", file=sys.stderr)
+            if stop.wait(every): break
+    finally:
+        try: os.unlink(os.path.join(status_dir, f"{os.getpid()}.json"))
+        except FileNotFoundError: pass
+
+
+def _alive(pid) -> bool:
+    try: os.kill(pid, 0)
+    except ProcessLookupError: return False
+    except PermissionError: pass
+    return True
+
+
+def read_published(status_dir=STATUS_DIR) -> list[dict]:
+    """Statuses published by other live processes, each with its "pid"; files of dead ones are removed."""
+    out, now = [], time.time()
+    try: names = os.listdir(status_dir)
+    except FileNotFoundError: return out
+    for name in names:
+        if not name.endswith(".json") or not name[:-5].isdigit() or (pid := int(name[:-5])) == os.getpid(): continue
+        path = os.path.join(status_dir, name)
+        try:
+            if not _alive(pid): os.unlink(path); continue
+            if now - os.stat(path).st_mtime > STATUS_STALE_SECS: continue
+            status = json.loads(_read(path))
+        except (OSError, ValueError): continue
+        status["pid"] = pid; out.append(status)
+    return out
+
+
+def merge_status(own, others) -> dict:
+    """`own` plus the jobs and throttle state of other governed schedulers; every job gets a "source"."""
+    merged = {**own, "jobs": [{**j, "source": "engine"} for j in own["jobs"]], "sources": []}
+    reasons = [own["reason"]] if own["throttled"] else []
+    for st in others:
+        merged["jobs"] += [{**j, "source": f"scheduler {st['pid']}"} for j in st.get("jobs", [])]
+        merged["sources"].append({k: st.get(k) for k in ("pid", "backend", "throttled", "reason")})
+        if st.get("throttled"): reasons.append(f"scheduler {st['pid']}: {st.get('reason', '')}")
+    merged["throttled"], merged["reason"] = bool(reasons), "; ".join(reasons)
+    return merged
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("profiles", nargs="*", help="print the limits these profiles would run under")
+    ap.add_argument("--config", default=CONFIG_PATH)
+    ap.add_argument("--backend", choices=("auto", "cgroup", "systemd", "nice"), default="auto")
+    args = ap.parse_args(argv)
+    try: gov = Governor(args.config, args.backend)
+    except ValueError as e: print(f"Invalid governor config: {e}", file=sys.stderr); return 2
+    gov.backend                       # probe now, as the first job would
+    gov.load.sample(force=True); time.sleep(SAMPLE_SECS)
+    out = gov.status()
+    out["limits"] = {p: gov.limits_for(p) for p in args.profiles}
+    json.dump(out, sys.stdout, indent=2); print()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,230 @@
+"""
+Sync history database.
+
+Ingests each profile's unison log incrementally into an SQLite table of runs
+(start/end, duration, files transferred, skipped, failed, conflicts, exit code)
+and answers trend queries over it. Per profile the ingester remembers the log's
+inode and the offset just past the last completed run, so each call only parses
+bytes written since then. Reading that offset, parsing and inserting happen in
+one `BEGIN IMMEDIATE` transaction, so processes sharing the database (the daemon
+and a cron-run scheduler with `--history`) never ingest the same runs twice.
+Runs finished by the scheduler are matched to their log record to attach the
+exit code (or stored on their own when unison died before logging a summary).
+
+Triggers keep a per-day, per-profile rollup (`daily`) in step with `runs`, so the
+trend queries read whole days from it and only scan raw runs for the partial day
+at the start of their window.
+
+    python history.py slowest|throughput|failures [--days 30] [--db FILE]
+"""
+
+import argparse, json, os, re, sqlite3, sys, threading, time
+
+DB_PATH = os.path.join(os.path.expanduser("~/unison_orchestrator"), "history.sqlite3")
+BUSY_TIMEOUT = 30.0        # seconds to wait for another process's write transaction
+UNISON_DIR = os.path.expanduser("~/.unison")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id          INTEGER PRIMARY KEY,
+    profile     TEXT NOT NULL,
+    source      TEXT NOT NULL,          -- 'log' or 'scheduler'
+    started     REAL,
+    ended       REAL NOT NULL,
+    duration    REAL,
+    files       INTEGER,
+    skipped     INTEGER,
+    failed      INTEGER,
+    conflicts   INTEGER,
+    bytes       INTEGER,                -- unison logs do not report sizes; NULL unless known
+    exit_code   INTEGER
+);
+CREATE INDEX IF NOT EXISTS runs_profile_ended ON runs(profile, ended);
+CREATE INDEX IF NOT EXISTS runs_ended ON runs(ended);
+CREATE TABLE IF NOT EXISTS ingest_state (
+    profile     TEXT PRIMARY KEY,
+    inode       INTEGER,
+    offset      INTEGER,
+    last_date   TEXT
+);
+"""
+
+DAY = 86400
+_FAILED = "(COALESCE({0}failed, 0) > 0 OR COALESCE({0}exit_code, 0) NOT BETWEEN 0 AND 1)"
+# One row per (day, profile) of `runs`, in the columns of the `daily` table
+_AGGREGATE = (f"SELECT CAST(ended / {DAY} AS INTEGER) * {DAY} AS day, profile, COUNT(*) AS runs,"
+              " COUNT(duration) AS timed_runs, SUM(duration) AS duration_sum, MAX(duration) AS duration_max,"
+              f" SUM(files) AS files, SUM(bytes) AS bytes, SUM({_FAILED.format('')}) AS failures,"
+              " SUM(COALESCE(conflicts, 0)) AS conflicts FROM runs WHERE {where} GROUP BY day, profile")
+_NEW_DAY = f"CAST(NEW.ended / {DAY} AS INTEGER) * {DAY}"
+
+def _plus(col, value):
+    # SUM() semantics: NULL until a non-NULL value is added
+    return f"{col} = CASE WHEN {value} IS NULL THEN {col} ELSE COALESCE({col}, 0) + {value} END"
+
+ROLLUP = (
+    """CREATE TABLE daily (
+    day          INTEGER NOT NULL,
+    profile      TEXT NOT NULL,
+    runs         INTEGER NOT NULL DEFAULT 0,
+    timed_runs   INTEGER NOT NULL DEFAULT 0,
+    duration_sum REAL,
+    duration_max REAL,
+    files        INTEGER,
+    bytes        INTEGER,
+    failures     INTEGER NOT NULL DEFAULT 0,
+    conflicts    INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, profile)
+) WITHOUT ROWID""",
+    f"""CREATE TRIGGER runs_daily_insert AFTER INSERT ON runs BEGIN
+    INSERT OR IGNORE INTO daily(day, profile) VALUES ({_NEW_DAY}, NEW.profile);
+    UPDATE daily SET runs = runs + 1, timed_runs = timed_runs + (NEW.duration IS NOT NULL),
+        {_plus("duration_sum", "NEW.duration")},
+        duration_max = COALESCE(MAX(duration_max, NEW.duration), duration_max, NEW.duration),
+        {_plus("files", "NEW.files")}, {_plus("bytes", "NEW.bytes")},
+        failures = failures + {_FAILED.format("NEW.")}, conflicts = conflicts + COALESCE(NEW.conflicts, 0)
+    WHERE day = {_NEW_DAY} AND profile = NEW.profile;
+END""",
+    f"""CREATE TRIGGER runs_daily_exit_code AFTER UPDATE OF exit_code ON runs BEGIN
+    UPDATE daily SET failures = failures - {_FAILED.format("OLD.")} + {_FAILED.format("NEW.")}
+    WHERE day = {_NEW_DAY} AND profile = NEW.profile;
+END""",
+    "INSERT INTO daily " + _AGGREGATE.format(where="1"),       # backfill a database from before the rollup
+)
+
+_PROPAGATE = re.compile(rb"(started|finished) propagating changes at (\d\d:\d\d:\d\d)\S* on (\d{1,2} \w{3} \d{4})")
+_COMPLETE  = re.compile(rb"^Synchronization (?:complete|incomplete) at (\d\d:\d\d:\d\d)\s+"
+                        rb"\((\d+) items? transferred, (\d+) skipped, (\d+) failed\)")
+
+
+def _epoch(date: str, clock: str) -> float:
+    return time.mktime(time.strptime(f"{date} {clock}", "%d %b %Y %H:%M:%S"))
+
+
+class SyncHistory:
+    def __init__(self, path=DB_PATH, unison_dir=UNISON_DIR):
+        self.path, self.unison_dir = path, unison_dir
+        if path != ":memory:": os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=BUSY_TIMEOUT, check_same_thread=False)
+        self._db.executescript(SCHEMA)
+        with self._db:
+            self._db.execute("BEGIN IMMEDIATE")
+            if not self._db.execute("SELECT 1 FROM sqlite_master WHERE name='daily'").fetchone():
+                for sql in ROLLUP: self._db.execute(sql)
+        self._lock = threading.Lock()
+
+    # ── ingestion ──
+    def ingest(self, profile) -> int:
+        """Parses new completed runs from `profile`'s log; returns how many were added."""
+        log = os.path.join(self.unison_dir, f"{profile}.log")
+        try: st = os.stat(log)
+        except FileNotFoundError: return 0
+        with self._lock, self._db:
+            self._db.execute("BEGIN IMMEDIATE")   # take the write lock before reading the offset
+            row = self._db.execute("SELECT inode, offset, last_date FROM ingest_state WHERE profile=?", (profile,)).fetchone()
+            inode, offset, last_date = row if row else (None, 0, None)
+            if inode != st.st_ino or st.st_size < offset: offset = 0          # rotated or truncated
+            if st.st_size == offset and inode == st.st_ino: return 0
+            runs, offset, last_date = self._parse(log, offset, last_date)
+            self._db.executemany(
+                "INSERT INTO runs(profile, source, started, ended, duration, files, skipped, failed, conflicts)"
+                " VALUES (?, 'log', ?, ?, ?, ?, ?, ?, ?)", [(profile, *r) for r in runs])
+            self._db.execute("INSERT OR REPLACE INTO ingest_state VALUES (?, ?, ?, ?)",
+                             (profile, st.st_ino, offset, last_date))
+            return len(runs)
+
+    def _parse(self, log, offset, last_date):
+        runs, start, conflicts, pos = [], None, 0, offset
+        fallback_date = time.strftime("%d %b %Y")
+        with open(log, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                pos += len(line)
+                if not line.endswith(b"\n"): break                 # run still being written
+                if m := _PROPAGATE.search(line):
+                    last_date = m.group(3).decode()
+                    if m.group(1) == b"started": start = _epoch(last_date, m.group(2).decode())
+                elif line.startswith(b"[CONFLICT]") or b"<-?->" in line: conflicts += 1
+                elif m := _COMPLETE.match(line):
+                    end = _epoch(last_date or fallback_date, m.group(1).decode())
+                    if start is not None and end < start: end += 86400       # crossed midnight
+                    begin = start if start is not None else end
+                    runs.append((begin, end, end - begin, *(int(g) for g in m.groups()[1:]), conflicts))
+                    start, conflicts, offset = None, 0, pos
+        return runs, offset, last_date
+
+    def record_job(self, profile, started, ended, exit_code):
+        """Attaches a scheduler exit code to the matching log run, or stores the run on its own."""
+        self.ingest(profile)
+        with self._lock, self._db:
+            cur = self._db.execute(
+                "UPDATE runs SET exit_code=? WHERE id=(SELECT id FROM runs WHERE profile=? AND source='log'"
+                " AND exit_code IS NULL AND ended BETWEEN ? AND ? ORDER BY ended DESC LIMIT 1)",
+                (exit_code, profile, started - 2, ended + 2))
+            if cur.rowcount == 0:
+                self._db.execute("INSERT INTO runs(profile, source, started, ended, duration, exit_code)"
+                                 " VALUES (?, 'scheduler', ?, ?, ?, ?)", (profile, started, ended, ended - started, exit_code))
+
+    # ── queries ──
+    def _query(self, sql, args):
+        with self._lock:
+            cur = self._db.execute(sql, args)
+            cols = [c[0] for c in cur.description]
+            return [dict(zip(cols, r)) for r in cur.fetchall()]
+
+    @staticmethod
+    def _days(since, profile=None):
+        """`daily` rows from `since` on: whole days from the rollup, the partial first day from `runs`."""
+        first_day = -(-since // DAY) * DAY
+        where, args = "ended >= ? AND ended < ?", [since, first_day]
+        if profile: where += " AND profile = ?"; args.append(profile)
+        rollup = "SELECT * FROM daily WHERE day >= ?" + (" AND profile = ?" if profile else "")
+        return f"({rollup} UNION ALL {_AGGREGATE.format(where=where)})", [first_day, *args[2:], *args]
+
+    def slowest_profiles(self, since=0.0, limit=20):
+        days, args = self._days(since)
+        return self._query(
+            "SELECT profile, SUM(timed_runs) AS runs, SUM(duration_sum) / SUM(timed_runs) AS avg_s,"
+            f" MAX(duration_max) AS max_s FROM {days} GROUP BY profile HAVING SUM(timed_runs) > 0"
+            " ORDER BY avg_s DESC LIMIT ?", (*args, limit))
+
+    def throughput(self, since=0.0, bucket_secs=DAY, profile=None):
+        if bucket_secs % DAY:                                        # finer than the rollup
+            sql = ("SELECT CAST(ended / ? AS INTEGER) * ? AS bucket, COUNT(*) AS runs, SUM(files) AS files,"
+                   " SUM(bytes) AS bytes, SUM(duration) AS busy_s FROM runs WHERE ended >= ?")
+            args = [bucket_secs, bucket_secs, since]
+            if profile: sql += " AND profile = ?"; args.append(profile)
+            return self._query(sql + " GROUP BY bucket ORDER BY bucket", args)
+        days, args = self._days(since, profile)
+        return self._query(
+            "SELECT CAST(day / ? AS INTEGER) * ? AS bucket, SUM(runs) AS runs, SUM(files) AS files,"
+            f" SUM(bytes) AS bytes, SUM(duration_sum) AS busy_s FROM {days} GROUP BY bucket ORDER BY bucket",
+            (bucket_secs, bucket_secs, *args))
+
+    def failure_rate(self, since=0.0, limit=20):
+        days, args = self._days(since)
+        return self._query(
+            "SELECT profile, SUM(runs) AS runs, SUM(failures) * 1.0 / SUM(runs) AS failure_rate,"
+            f" SUM(conflicts) AS conflicts FROM {days} GROUP BY profile ORDER BY failure_rate DESC, runs DESC LIMIT ?",
+            (*args, limit))
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("query", choices=["slowest", "throughput", "failures"])
+    ap.add_argument("--days", type=float, default=30)
+    ap.add_argument("--db", default=DB_PATH)
+    ap.add_argument("--unison-dir", default=UNISON_DIR)
+    ap.add_argument("--no-ingest", action="store_true", help="query without reading new log data first")
+    args = ap.parse_args(argv)
+    hist = SyncHistory(args.db, args.unison_dir)
+    if not args.no_ingest:
+        from scheduler import list_profiles
+        for profile in list_profiles(args.unison_dir): hist.ingest(profile)
+    since = time.time() - args.days * 86400
+    rows = {"slowest": hist.slowest_profiles, "throughput": hist.throughput, "failures": hist.failure_rate}[args.query](since)
+    json.dump(rows, sys.stdout, indent=2); print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+Lightweight instrumentation for finding UI stalls.
+
+`timed(name)` (decorator) and `span(name)` (context manager) record wall-clock
+latency into a per-operation histogram; `count(name, n)` bumps a counter and
+`gauge(name, fn)` registers a value read only when a snapshot is taken. While
+disabled (the default) a decorated call costs one global lookup and `span`
+returns a shared no-op context, so the hooks can stay in hot paths.
+
+Subprocess spawns are counted through a `sys.addaudithook` hook, installed the
+first time instrumentation is enabled, so every `subprocess.Popen` / `os.system`
+/ `posix_spawn` in the process is seen without touching call sites.
+
+Histograms use fixed log-spaced buckets (20 % wide, 10 µs to 2 min) for all-time
+percentiles plus the last `RECENT` samples for exact "live" percentiles.
+"""
+
+import bisect, contextlib, functools, json, os, sys, threading, time
+from collections import deque
+from fsutil import atomic_write
+
+ENABLED = False
+RECENT  = 512
+BUCKETS = [0.01 * 1.2 ** i for i in range(91)]           # upper bounds in ms, up to ~1.5e5
+_SPAWN_EVENTS = {"subprocess.Popen": "Popen", "os.system": "system", "os.posix_spawn": "posix_spawn",
+                 "os.spawn": "spawn", "os.fork": "fork"}
+
+_lock = threading.Lock()
+_ops: dict[str, "Histogram"] = {}
+_counters: dict[str, float] = {}
+_gauges: dict[str, callable] = {}
+_since = time.time()
+_hooked = False
+
+
+class Histogram:
+    __slots__ = ("counts", "n", "total", "max", "recent")
+
+    def __init__(self):
+        self.counts, self.n, self.total, self.max = [0] * (len(BUCKETS) + 1), 0, 0.0, 0.0
+        self.recent = deque(maxlen=RECENT)
+
+    def add(self, ms):
+        self.counts[bisect.bisect_left(BUCKETS, ms)] += 1
+        self.n += 1; self.total += ms; self.recent.append(ms)
+        if ms > self.max: self.max = ms
+
+    def quantile(self, q) -> float:
+        """Upper bound of the bucket holding the q-quantile (at most 20 % high)."""
+        if not self.n: return 0.0
+        rank, seen = q * self.n, 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank: return min(BUCKETS[i] if i < len(BUCKETS) else self.max, self.max)
+        return self.max
+
+    def summary(self) -> dict:
+        recent = sorted(self.recent)
+        pick = lambda q: recent[min(len(recent) - 1, int(q * len(recent)))] if recent else 0.0
+        return {"count": self.n, "total_ms": round(self.total, 3), "mean_ms": round(self.total / self.n, 3) if self.n else 0.0,
+                "p50_ms": round(self.quantile(0.50), 3), "p99_ms": round(self.quantile(0.99), 3),
+                "max_ms": round(self.max, 3), "recent_p50_ms": round(pick(0.50), 3),
+                "recent_p99_ms": round(pick(0.99), 3)}
+
+
+# ─────────────────────────── RECORDING ───────────────────────────
+def record(name, ms):
+    with _lock:
+        h = _ops.get(name)
+        if h is None: h = _ops[name] = Histogram()
+        h.add(ms)
+
+
+def count(name, n=1):
+    if not ENABLED: return
+    with _lock: _counters[name] = _counters.get(name, 0) + n
+
+
+def gauge(name, fn):
+    """Registers `fn()` to be sampled into every snapshot (e.g. a byte counter owned by another object)."""
+    _gauges[name] = fn
+
+
+def timed(name):
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not ENABLED: return fn(*args, **kwargs)
+            t0 = time.perf_counter()
+            try: return fn(*args, **kwargs)
+            finally: record(name, (time.perf_counter() - t0) * 1000)
+        return wrapper
+    return deco
+
+
+class _Span:
+    __slots__ = ("name", "t0")
+
+    def __init__(self, name): self.name = name
+
+    def __enter__(self): self.t0 = time.perf_counter(); return self
+
+    def __exit__(self, *exc): record(self.name, (time.perf_counter() - self.t0) * 1000)
+
+
+_NULL = contextlib.nullcontext()
+
+
+def span(name):
+    return _Span(name) if ENABLED else _NULL
+
+
+# ─────────────────────────── CONTROL ───────────────────────────
+def _audit(event, args):
+    if ENABLED and event in _SPAWN_EVENTS:
+        exe = os.path.basename(str(args[0])) if args and event != "os.fork" else _SPAWN_EVENTS[event]
+        with _lock:
+            _counters["subprocess_spawns"] = _counters.get("subprocess_spawns", 0) + 1
+            _counters[f"spawn.{exe}"] = _counters.get(f"spawn.{exe}", 0) + 1
+
+
+def enable(on=True):
+    global ENABLED, _hooked
+    if on and not _hooked: sys.addaudithook(_audit); _hooked = True    # audit hooks cannot be removed
+    ENABLED = on
+
+
+def reset():
+    global _since
+    with _lock: _ops.clear(); _counters.clear(); _since = time.time()
+
+
+def snapshot() -> dict:
+    with _lock:
+        ops = {name: h.summary() for name, h in sorted(_ops.items())}
+        counters = dict(sorted(_counters.items()))
+    for name, fn in _gauges.items():
+        try: counters[name] = fn()
+        except Exception as e: counters[name] = f"error: {e}"
+    return {"enabled": ENABLED, "since": _since, "taken": time.time(), "operations": ops, "counters": counters}
+
+
+def export(path) -> str:
+    """Writes `snapshot()` as JSON (atomically); returns the path."""
+    return atomic_write(path, json.dumps(snapshot(), indent=2))
+
+
+def format_table(snap=None) -> str:
+    """Fixed-width text of a snapshot, for the Diagnostics tab."""
+    snap = snap or snapshot()
+    lines = [f"{'operation':<28} {'count':>7} {'p50':>8} {'p99':>8} {'max':>8} {'live p50':>9} {'live p99':>9}"]
+    for name, s in snap["operations"].items():
+        lines.append(f"{name:<28} {s['count']:>7} {s['p50_ms']:>8.2f} {s['p99_ms']:>8.2f} {s['max_ms']:>8.1f} "
+                     f"{s['recent_p50_ms']:>9.2f} {s['recent_p99_ms']:>9.2f}")
+    lines.append("")
+    lines += [f"{name:<28} {value}" for name, value in snap["counters"].items()]
+    return "\n".join(lines)
@@ -0,0 +1,161 @@
+"""
+Incremental index over unison profile logs.
+
+`last_sync()` and `tail()` used to read the whole log on every call. The index
+remembers, per log file, its identity (inode/size/mtime), how far it has been
+parsed, the last "Synchronization complete at" line (and when it was written) and a short tail of lines,
+so later calls only parse the bytes appended since the previous scan. The first
+scan of a file reads backwards from EOF in blocks and stops as soon as both
+answers are known. Truncation and rotation (inode change, shrink, or the bytes just before the
+saved offset no longer matching) trigger a fresh backwards scan.
+"""
+
+import os, re, threading, time
+from collections import deque
+
+COMPLETE_PREFIX = b"Synchronization complete at"
+_DATED          = re.compile(rb"propagating changes at (\d\d:\d\d:\d\d)\S* on (\d{1,2} \w{3} \d{4})")
+MAX_DATE_BLOCKS = 4    # extra blocks read back past the completion line looking for a dated line
+BLOCK_SIZE      = 64 * 1024
+ANCHOR_SIZE     = 64   # bytes before `offset` re-checked to catch truncate-then-regrow
+
+
+class _Entry:
+    __slots__ = ("ino", "size", "mtime", "offset", "partial", "anchor", "last_complete", "complete_ref", "last_dated", "tail")
+
+    def __init__(self, tail_lines):
+        self.ino = self.size = self.mtime = self.offset = None
+        self.partial = self.anchor = b""
+        self.last_complete = None
+        self.complete_ref = None        # epoch of the newest dated line before the last completion
+        self.last_dated = None          # epoch of the newest dated line in the file
+        self.tail = deque(maxlen=tail_lines)
+
+
+def _completion_text(line: bytes) -> str:
+    return line[len(COMPLETE_PREFIX):].strip().decode("utf-8", "replace")
+
+
+def _dated(line: bytes) -> float | None:
+    """Epoch of a 'propagating changes at HH:MM:SS on D Mon YYYY' line, else None."""
+    m = _DATED.search(line)
+    if not m: return None
+    try: return time.mktime(time.strptime(f"{m.group(2).decode()} {m.group(1).decode()}", "%d %b %Y %H:%M:%S"))
+    except ValueError: return None
+
+
+def _completion_epoch(text: str, ref: float, after: bool) -> float | None:
+    """Epoch of a completion clock (HH:MM:SS) on the day of `ref`, moved a day so it falls
+    after `ref` (a dated line before it) or before `ref` (the log's mtime)."""
+    try: h, m, s = (int(x) for x in text.split()[0].split(":"))
+    except (IndexError, ValueError): return None
+    lt = time.localtime(ref)
+    at = time.mktime((lt.tm_year, lt.tm_mon, lt.tm_mday, h, m, s, 0, 0, -1))
+    if after and at < ref - 60: at += 86400            # completed past midnight
+    if not after and at > ref + 60: at -= 86400
+    return at
+
+
+class LogIndex:
+    def __init__(self, tail_lines=40):
+        self.tail_lines = tail_lines
+        self._entries: dict[str, _Entry] = {}
+        self._lock = threading.Lock()
+        self.bytes_read = 0
+
+    # ── public API ──
+    def last_sync(self, path):
+        """Text after the newest 'Synchronization complete at', or None."""
+        e = self._refresh(path)
+        if e is None: return None
+        if e.partial.startswith(COMPLETE_PREFIX): return _completion_text(e.partial)
+        return e.last_complete
+
+    def last_sync_at(self, path) -> float | None:
+        """Epoch seconds of the newest 'Synchronization complete at' line, or None. The line only
+        carries a clock; the date comes from the dated unison line before it, else the log mtime."""
+        e = self._refresh(path)
+        if e is None: return None
+        if e.partial.startswith(COMPLETE_PREFIX): text, ref = _completion_text(e.partial), e.last_dated
+        elif e.last_complete is None: return None
+        else: text, ref = e.last_complete, e.complete_ref
+        if ref is None: return _completion_epoch(text, e.mtime / 1e9, after=False)
+        return _completion_epoch(text, ref, after=True)
+
+    def tail(self, path, n=None):
+        """Last `n` lines (<= tail_lines) as one string, or None if the log is missing."""
+        e = self._refresh(path)
+        if e is None: return None
+        lines = list(e.tail)
+        if e.partial: lines.append(e.partial)
+        n = self.tail_lines if n is None else min(n, self.tail_lines)
+        return b"".join(lines[-n:]).decode("utf-8", "replace")
+
+    def forget(self, path):
+        with self._lock: self._entries.pop(path, None)
+
+    # ── internals ──
+    def _refresh(self, path):
+        try: st = os.stat(path)
+        except FileNotFoundError:
+            self.forget(path); return None
+        with self._lock:
+            e = self._entries.get(path)
+            if e and e.ino == st.st_ino and e.size == st.st_size and e.mtime == st.st_mtime_ns:
+                return e
+            try:
+                with open(path, "rb") as f:
+                    if e is None or e.ino != st.st_ino or st.st_size < e.offset or not self._anchor_ok(f, e):
+                        e = self._entries[path] = _Entry(self.tail_lines)
+                        self._scan_backwards(f, st.st_size, e)
+                    elif st.st_size > e.offset:
+                        self._scan_forward(f, st.st_size, e)
+                    self._set_anchor(f, e)
+            except FileNotFoundError:
+                self._entries.pop(path, None); return None
+            e.ino, e.size, e.mtime = st.st_ino, st.st_size, st.st_mtime_ns
+            return e
+
+    def _anchor_ok(self, f, e):
+        if not e.anchor: return True
+        f.seek(e.offset - len(e.anchor))
+        return f.read(len(e.anchor)) == e.anchor
+
+    def _set_anchor(self, f, e):
+        n = min(ANCHOR_SIZE, e.offset)
+        f.seek(e.offset - n); e.anchor = f.read(n)
+
+    def _scan_backwards(self, f, size, e):
+        """Reads blocks from EOF until the tail is full and a completion line (and the dated line
+        before it, within MAX_DATE_BLOCKS more blocks) is found."""
+        pos, carry, newest_first, have_partial, extra = size, b"", [], False, 0
+        while pos > 0 and (e.last_complete is None or len(newest_first) < self.tail_lines
+                           or (e.complete_ref is None and extra < MAX_DATE_BLOCKS)):
+            if e.last_complete is not None and len(newest_first) >= self.tail_lines: extra += 1
+            step = min(BLOCK_SIZE, pos); pos -= step
+            f.seek(pos); buf = f.read(step) + carry; self.bytes_read += step
+            parts = buf.split(b"\n")
+            carry = parts.pop(0) if pos > 0 else b""  # head of the block may be mid-line
+            if not have_partial:
+                if not parts: continue                 # no newline seen yet
+                e.partial, have_partial = parts.pop(), True
+            for ln in reversed(parts):
+                if len(newest_first) < self.tail_lines: newest_first.append(ln + b"\n")
+                if e.last_complete is None and ln.startswith(COMPLETE_PREFIX):
+                    e.last_complete = _completion_text(ln)
+                elif (e.last_complete is None or e.complete_ref is None) and (at := _dated(ln)) is not None:
+                    if e.last_dated is None: e.last_dated = at
+                    if e.last_complete is not None: e.complete_ref = at
+        e.tail.extend(reversed(newest_first))
+        e.offset = size
+
+    def _scan_forward(self, f, size, e):
+        """Parses only the bytes appended since the previous scan."""
+        f.seek(e.offset); data = e.partial + f.read(size - e.offset)
+        self.bytes_read += size - e.offset
+        *complete, e.partial = data.split(b"\n")
+        for ln in complete:
+            if ln.startswith(COMPLETE_PREFIX): e.last_complete, e.complete_ref = _completion_text(ln), e.last_dated
+            elif (at := _dated(ln)) is not None: e.last_dated = at
+        e.tail.extend(ln + b"\n" for ln in complete[-self.tail_lines:])
+        e.offset = size
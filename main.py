@@ -1,28 +1,68 @@
 """
-Unison Sync Orchestrator – v 3.18
-• Fix: The individual "Kill" buttons in the Monitoring tab now correctly terminate the entire process
-  group (`os.killpg`) instead of just a single process, ensuring that even complex `unison`
-  tasks are terminated properly.
+Unison Sync Orchestrator – v 3.33
+• New: Resource governor. Syncs started by the scheduler (GUI and sync_all_profiles.sh) run under
+  per-profile/group CPU weight & quota, IO weight and memory caps from governor.json, via cgroup v2
+  (delegated subtree or `systemd-run --user --scope`) or a `nice`/`ionice` fallback, and new jobs are
+  held while the load average or disk busy % (from /proc) is over the configured limits. The
+  Monitoring tab shows the throttle state and each running job's CPU, memory and IO next to the
+  process table.
+• Perf: The crontab is parsed once into a `cronmodel.CronTab` and only re-read (`crontab -l`)
+  when the cron spool's mtime changes, instead of forking from the monitor tab every 5 s and
+  from every script-list refresh. Install/Remove Cron no longer use `shell=True` or substring
+  matching: jobs are matched by the script they run, the schedule is validated (with a preview
+  of its next runs) and the edit is installed in one `crontab -` write. The Monitoring tab shows
+  a 48 h timeline of upcoming runs.
 """
 
-import os, subprocess, threading, time, signal
+import os, subprocess, threading, time, signal, itertools, queue, shlex, sys, fnmatch, argparse
+from datetime import datetime, timedelta
 from dearpygui import dearpygui as dpg
+from daemon import Engine, DaemonClient, DaemonError, SOCKET_PATH
+from outstream import OutputRing, pump
+import instrument
+from prf import Profile, PERF_PREFS, bulk_tune
+from cronmodel import Schedule, CronError
 
 # ─────────────────────────── CONSTANTS ───────────────────────────
 UNISON_DIR   = os.path.expanduser("~/.unison")
 ORCH_DIR     = os.path.expanduser("~/unison_orchestrator")
 DEFAULT_SYNC = os.path.join(ORCH_DIR, "sync_all_profiles.sh")
 DEFAULT_CRON = "0 0 * * *"
+SCHEDULER_PY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scheduler.py")
+DEFAULT_WORKERS = 4
+DEFAULT_FORCE_HOURS = 24
+HISTORY_DB   = os.path.join(ORCH_DIR, "history.sqlite3")
 MONITOR_SECS = 5
 TAIL_LINES   = 40
-EDIT_W, EDIT_H = 650, 470
+EDIT_W, EDIT_H = 650, 620
 LOG_W, LOG_H = 700, 500
+PANEL_H      = 880
+PROFILE_POOL = 24          # row widgets kept alive in the profile panel
+UI_FPS       = 10
+SCRIPT_LOG_LINES = 5000
+SCRIPT_LOG_CHARS = 512 * 1024
+SCRIPT_LOG_DIR   = os.path.join(ORCH_DIR, "logs")
+DIAG_SECS        = 1.0
 
 # App state for the running script
-SCRIPT_RUNNER_STATE = {"process": None, "script_path": None}
-
-os.makedirs(UNISON_DIR, exist_ok=True)
-os.makedirs(ORCH_DIR,    exist_ok=True)
+SCRIPT_RUNNER_STATE = {"process": None, "script_path": None, "output": None, "rendered": -1}
+# daemon.Engine running in this process, or a DaemonClient to a running daemon (same methods); set by main()
+ENGINE = None
+_ENGINE_EVENTS: "queue.SimpleQueue[tuple[str, str | None]]" = queue.SimpleQueue()
+LOG_CHANGES: dict[str, int] = {}   # profile -> log change events seen, keys the log viewer
+# Retained widgets of the Monitoring tab: pid -> {"row", "text", "btn", "label"}
+MONITOR_STATE = {"rows": {}, "cron_version": None, "cron_timeline": None, "log_key": None, "governor": None}
+MONITOR_STATS = {"refreshes": 0, "created": 0, "destroyed": 0, "last_ms": 0.0,
+                 "last_created": 0, "last_destroyed": 0, "cron_writes": 0, "log_writes": 0}
+_MONITOR_LOCK = threading.Lock()
+# Virtualized profile panel: data is swapped in here, widgets are rebound by a UI tick.
+PROFILE_VIEW = {"all": [], "filtered": [], "shown": [], "first": -1, "row_h": 62, "dirty": True, "sync_version": 0,
+                "job_cells": [None] * PROFILE_POOL}
+LAST_SYNC_CACHE: dict[str, str] = {}
+_LAST_SYNC_QUEUE: "queue.PriorityQueue[tuple[int, int, str]]" = queue.PriorityQueue()
+_LAST_SYNC_SEQ = itertools.count()
+LAST_SYNC_BATCH = 200
+DIAG_STATE = {"shown_at": 0.0}
 
 # ─────────────────────────── GENERIC HELPERS ───────────────────────────
 def resolve_script_path(token: str) -> str:
@@ -30,51 +70,70 @@ def resolve_script_path(token: str) -> str:
     return token if os.path.isabs(token) else os.path.join(ORCH_DIR, token)
 
 def cron_scripts_from_crontab():
-    try: text = subprocess.check_output("crontab -l", shell=True, text=True)
-    except subprocess.CalledProcessError: text = ""
-    scripts = []
-    for ln in text.splitlines():
-        if not ln.strip() or ln.lstrip().startswith("#"): continue
-        parts = ln.split()
-        for tok in parts[5:]:
-            if tok.strip('"\'' ).endswith(".sh"):
-                scripts.append(resolve_script_path(tok.strip('"\' ')))
-                break
-    return sorted(set(scripts))
+    return get_crontab()["scripts"]
 
 def load_profiles():
-    return sorted(f[:-4] for f in os.listdir(UNISON_DIR) if f.endswith(".prf"))
+    return ENGINE.list_profiles()
+
+@instrument.timed("last_sync")
+def last_syncs(profiles) -> dict[str, str]:
+    return {p: v or "No Sync History" for p, v in ENGINE.last_syncs(profiles=list(profiles)).items()}
 
 def last_sync(profile):
-    path = os.path.join(UNISON_DIR, f"{profile}.log")
-    if not os.path.exists(path): return "No Sync History"
-    with open(path) as f:
-        for line in reversed(f.readlines()):
-            if line.startswith("Synchronization complete at"):
-                return line.replace("Synchronization complete at","").strip()
-    return "No Sync History"
-
-def get_crontab_text():
-    try: return subprocess.check_output("crontab -l", shell=True, text=True)
-    except subprocess.CalledProcessError: return "(no crontab)"
+    return last_syncs([profile])[profile]
 
+@instrument.timed("crontab.read")
+def get_crontab():
+    return ENGINE.crontab()
+
+@instrument.timed("processes")
 def get_running_unison_processes() -> list[dict]:
     """Returns a list of dicts, each representing a running unison process."""
-    processes = []
-    try:
-        lines = subprocess.check_output("pgrep -fl unison", shell=True, text=True).strip().splitlines()
-        for line in lines:
-            parts = line.split(maxsplit=1)
-            if len(parts) == 2:
-                processes.append({'pid': parts[0], 'cmd': parts[1]})
-    except subprocess.CalledProcessError:
-        pass # No processes found
-    return processes
-
+    return ENGINE.processes()
+
+@instrument.timed("governor")
+def get_governor_status() -> dict:
+    return ENGINE.governor()
+
+def _fmt_elapsed(secs: float) -> str:
+    m, s = divmod(int(secs), 60); h, m = divmod(m, 60)
+    return f"{h}:{m:02d}:{s:02d}"
+
+def format_process(proc: dict) -> str:
+    if "pgid" not in proc: return f"PID: {proc['pid']} | {proc['cmd']}"   # pgrep fallback
+    text = (f"PID: {proc['pid']} | PGID: {proc['pgid']} | {_fmt_elapsed(proc['elapsed'])} | "
+            f"CPU {proc['cpu']:.1f}% | RSS {proc['rss_kb'] / 1024:.1f} MB | {proc['cmd']}")
+    for child in proc.get("children", []):
+        text += f"\n    └ {child['pid']} | CPU {child['cpu']:.1f}% | RSS {child['rss_kb'] / 1024:.1f} MB | {child['cmd']}"
+    return text
+
+def _fmt_mb(n) -> str:
+    return "-" if n is None else f"{n / 1048576:.0f} MB"
+
+def format_governor(gov: dict) -> tuple[str, str]:
+    """(throttle state line, one line per running job) for the Monitoring tab."""
+    disks = ", ".join(f"{d} {b:.0f}%" for d, b in list(gov["disk_busy"].items())[:3]) or "n/a"
+    state = f"THROTTLED: {gov['reason']}" if gov["throttled"] else "admitting"
+    head = (f"{state} | load {gov['load']:.2f} ({gov['load_per_cpu']:.2f}/cpu, max {gov['admission']['max_load_per_cpu']}) | "
+            f"disk busy {disks} (max {gov['admission']['max_disk_busy']:.0f}%) | backend {gov['backend']}")
+    head += "".join(f", scheduler {src['pid']}: {src['backend']}" for src in gov.get("sources", []))
+    lines = []
+    for j in gov["jobs"]:
+        lim = j["limits"]
+        cpu = "-" if j["cpu_pct"] is None else f"{j['cpu_pct']:.0f}%"
+        caps = f"cpu w{lim.get('cpu_weight', 100)}" + (f" ≤{lim['cpu_max']}%" if lim.get("cpu_max") else "")
+        caps += f" io w{lim.get('io_weight', 100)}" + (f" mem ≤{_fmt_mb(lim['memory_max'])}" if lim.get("memory_max") else "")
+        source = "" if j.get("source", "engine") == "engine" else f" ({j['source']})"
+        lines.append(f"{j['profile'] + source:<24} pid {j['pid']:<7} CPU {cpu:>5}  mem {_fmt_mb(j['memory']):>7}  "
+                     f"read {_fmt_mb(j['read_bytes'])} write {_fmt_mb(j['write_bytes'])}  [{caps}]")
+    if gov["backend"] != "pending" and "memory_max" not in gov["enforces"]: lines.append("(memory caps are not enforced by this backend)")
+    return head, "\n".join(lines) or "(no governed jobs running)"
+
+@instrument.timed("tail_log")
 def tail_log(profile):
-    path = os.path.join(UNISON_DIR, f"{profile}.log")
-    if not os.path.exists(path): return "(no log)"
-    with open(path) as f: return "".join(f.readlines()[-TAIL_LINES:]) or "(empty)"
+    text = ENGINE.tail_log(profile=profile)
+    if text is None: return "(no log)"
+    return text or "(empty)"
 
 # ─────────────────────────── FILE-DIALOG HELPERS ───────────────────────────
 def _set_value_from_dialog(sender, app_data, field_tag):
@@ -85,19 +144,29 @@ def pick_directory(field_tag):
     dpg.show_item(FIELD_TO_DIALOG[field_tag])
 
 # ─────────────────────────── PROFILE ACTIONS ───────────────────────────
+JOBS_BY_PROFILE = {}   # profile -> latest job info from ENGINE.jobs()
+
+def describe_job(job) -> str:
+    if job is None: return ""
+    if job["state"] == "queued": return "Queued…"
+    if job["state"] == "running":
+        return f"Running {_fmt_elapsed(job['elapsed'])}" + (f" · {job['progress']}" if job["progress"] else "")
+    if job["rc"] is None: return job["state"].capitalize()
+    return f"{job['state'].capitalize()} (rc {job['rc']}) in {_fmt_elapsed(job['elapsed'])}"
+
 def run_sync(sender, app_data, profile):
-    subprocess.run(["unison", profile, "-batch"])
-    dpg.set_value(f"sync_{profile}", f"Last Sync: {last_sync(profile)}")
+    """Queues a background sync for `profile`, or cancels the one already active."""
+    job = JOBS_BY_PROFILE.get(profile)
+    if job and job["active"]: ENGINE.stop_sync(profile=profile); return
+    JOBS_BY_PROFILE[profile] = ENGINE.start_sync(profile=profile)
 
 def open_profile_editor(sender, app_data, profile):
-    prf = os.path.join(UNISON_DIR, f"{profile}.prf")
-    src = tgt = ""
-    with open(prf) as f:
-        for l in f:
-            if l.startswith("root = "):
-                if not src: src = l[7:].strip()
-                else:       tgt = l[7:].strip()
+    try: prof = Profile.load(os.path.join(UNISON_DIR, f"{profile}.prf"))
+    except FileNotFoundError: prof = Profile()
+    src, tgt = (prof.roots + ["", ""])[:2]
     dpg.set_value("edit_name", profile); dpg.set_value("edit_src",  src); dpg.set_value("edit_tgt",  tgt); dpg.set_value("edit_msg",  "")
+    for key in PERF_PREFS: dpg.set_value(f"edit_pref_{key}", prof.get(key, ""))
+    dpg.set_value("edit_ignore", "\n".join(prof.get_all("ignore")))
     w, h = dpg.get_viewport_client_width(), dpg.get_viewport_client_height()
     dpg.configure_item("edit_win", pos=(max(0, w//2 - EDIT_W//2), max(0, h//2 - EDIT_H//2)), show=True)
 
@@ -105,6 +174,7 @@ def delete_profile(sender, app_data, profile):
     for ext in (".prf", ".log"):
         p = os.path.join(UNISON_DIR, f"{profile}{ext}")
         if os.path.exists(p): os.remove(p)
+    LAST_SYNC_CACHE.pop(profile, None)
     dpg.configure_item("new_msg", default_value=f"Deleted {profile}.", color=[200,40,40])
     refresh_profile_panel()
 
@@ -113,8 +183,7 @@ def save_new_profile():
     name, src, tgt = dpg.get_value("new_name").strip(), dpg.get_value("new_src").strip(), dpg.get_value("new_tgt").strip()
     if not (name and src and tgt):
         dpg.configure_item("new_msg", default_value="All fields required.", color=[255,0,0]); return
-    with open(os.path.join(UNISON_DIR,f"{name}.prf"),"w") as f:
-        f.write(f"root = {src}\nroot = {tgt}\n\nauto = true\nbatch = true\nprefer = newer\nlog = true\nlogfile = {UNISON_DIR}/{name}.log\n")
+    Profile.new(name, src, tgt, UNISON_DIR).save()
     dpg.configure_item("new_msg", default_value="Profile saved.", color=[0,255,0])
     refresh_profile_panel(); refresh_monitor_tab()
 
@@ -122,27 +191,127 @@ def save_profile_edit():
     name, src, tgt = dpg.get_value("edit_name"), dpg.get_value("edit_src").strip(), dpg.get_value("edit_tgt").strip()
     if not (src and tgt):
         dpg.configure_item("edit_msg", default_value="All fields required.", color=[255,0,0]); return
-    with open(os.path.join(UNISON_DIR,f"{name}.prf"),"w") as f:
-        f.write(f"root = {src}\nroot = {tgt}\n\nauto = true\nbatch = true\nprefer = newer\nlog = true\nlogfile = {UNISON_DIR}/{name}.log\n")
+    path = os.path.join(UNISON_DIR, f"{name}.prf")
+    try: prof = Profile.load(path)
+    except FileNotFoundError: prof = Profile.new(name, src, tgt, UNISON_DIR)
+    prof.set_all("root", [src, tgt])
+    for key in PERF_PREFS: prof.set(key, dpg.get_value(f"edit_pref_{key}").strip() or None)
+    prof.set_all("ignore", [ln.strip() for ln in dpg.get_value("edit_ignore").splitlines() if ln.strip()])
+    try: prof.save()
+    except OSError as e:
+        dpg.configure_item("edit_msg", default_value=str(e), color=[255,0,0]); return
     dpg.configure_item("edit_msg", default_value="Profile updated.", color=[0,255,0])
     refresh_profile_panel()
 
+TUNE_CHOICES = ["(unchanged)", "true", "false", "(remove)"]
+
+def _tune_targets():
+    """Profiles matching the glob; None when no glob was entered (use `*` for every profile)."""
+    pattern = dpg.get_value("tune_pattern").strip()
+    return fnmatch.filter(load_profiles(), pattern) if pattern else None
+
+def preview_tuning():
+    names = _tune_targets()
+    if names is None: dpg.configure_item("tune_msg", default_value="Enter a profile glob (* for all).", color=[255,0,0]); return
+    dpg.configure_item("tune_msg", default_value=f"{len(names)} profiles match.", color=[255,255,255])
+
+def apply_bulk_tuning():
+    prefs = {}
+    for key in ("fastcheck", "rsync"):
+        choice = dpg.get_value(f"tune_{key}")
+        if choice != "(unchanged)": prefs[key] = None if choice == "(remove)" else choice
+    for key in ("maxthreads", "copythreshold"):
+        n = dpg.get_value(f"tune_{key}")
+        if n > 0: prefs[key] = n
+    ignores = [ln.strip() for ln in dpg.get_value("tune_ignore").splitlines() if ln.strip()]
+    names = _tune_targets()
+    if names is None: dpg.configure_item("tune_msg", default_value="Enter a profile glob (* for all).", color=[255,0,0]); return
+    changed, errors = bulk_tune(UNISON_DIR, names, prefs, ignores)
+    msg = f"{len(names)} matched, {len(changed)} updated" + (f", {len(errors)} failed: {', '.join(errors)}" if errors else ".")
+    dpg.configure_item("tune_msg", default_value=msg, color=[255,0,0] if errors else [0,255,0])
+
 # ─────────────────────────── PROFILE PANEL ───────────────────────────
+def request_last_sync(profile, priority=1):
+    """Queues `profile` for the background last-sync loader (lower priority runs first)."""
+    _LAST_SYNC_QUEUE.put((priority, next(_LAST_SYNC_SEQ), profile))
+
+def last_sync_loader():
+    """Resolves queued profiles in batches (one engine call each), most urgent first."""
+    while True:
+        batch = [_LAST_SYNC_QUEUE.get()[2]]
+        while len(batch) < LAST_SYNC_BATCH and not _LAST_SYNC_QUEUE.empty(): batch.append(_LAST_SYNC_QUEUE.get()[2])
+        try: values = last_syncs(dict.fromkeys(batch))
+        except (OSError, DaemonError) as e:
+            print(f"Last-sync lookup failed: {e}"); time.sleep(MONITOR_SECS); continue
+        changed = False
+        for profile, value in values.items():
+            if LAST_SYNC_CACHE.get(profile) != value: LAST_SYNC_CACHE[profile] = value; changed = True
+        if changed: PROFILE_VIEW["sync_version"] += 1
+
+@instrument.timed("refresh_profile_panel")
 def refresh_profile_panel():
-    dpg.delete_item("profiles_panel", children_only=True)
-    with dpg.theme() as del_theme:
-        with dpg.theme_component(dpg.mvButton):
-            dpg.add_theme_color(dpg.mvThemeCol_Button, (200,40,40)); dpg.add_theme_color(dpg.mvThemeCol_ButtonHovered, (220,60,60))
-    for profile in load_profiles():
-        with dpg.group(parent="profiles_panel"):
-            dpg.add_text(profile, color=(0,255,255))
-            dpg.add_text(f"Last Sync: {last_sync(profile)}", tag=f"sync_{profile}")
+    """Reloads the profile list; widgets are rebound on the next UI tick."""
+    profiles = load_profiles()
+    PROFILE_VIEW["all"] = profiles
+    for p in profiles:
+        if p not in LAST_SYNC_CACHE: request_last_sync(p)
+    apply_profile_filter()
+
+def apply_profile_filter(sender=None, app_data=None, user_data=None):
+    needle = (dpg.get_value("profile_filter") or "").strip().lower()
+    PROFILE_VIEW["filtered"] = [p for p in PROFILE_VIEW["all"] if needle in p.lower()] if needle else PROFILE_VIEW["all"]
+    PROFILE_VIEW["dirty"] = True
+
+def _sync_profile_viewport():
+    """UI tick: binds the pooled row widgets to the profiles currently scrolled into view."""
+    rows, row_h = PROFILE_VIEW["filtered"], PROFILE_VIEW["row_h"]
+    if dpg.is_item_shown("prof_row_0") and dpg.is_item_shown("prof_row_1"):
+        pitch = dpg.get_item_pos("prof_row_1")[1] - dpg.get_item_pos("prof_row_0")[1]
+        if pitch > 0 and pitch != row_h:
+            PROFILE_VIEW["row_h"] = row_h = pitch; PROFILE_VIEW["dirty"] = True
+    first = max(0, min(int(dpg.get_y_scroll("profiles_panel") // row_h), max(0, len(rows) - PROFILE_POOL)))
+    state = (first, PROFILE_VIEW["sync_version"], id(rows))
+    if not PROFILE_VIEW["dirty"] and state == PROFILE_VIEW["first"]:
+        _update_job_cells(); return
+    PROFILE_VIEW["first"], PROFILE_VIEW["dirty"] = state, False
+    PROFILE_VIEW["shown"] = shown = rows[first:first + PROFILE_POOL]
+    dpg.configure_item("prof_spacer_top", height=first * row_h)
+    dpg.configure_item("prof_spacer_bottom", height=max(0, len(rows) - first - len(shown)) * row_h)
+    dpg.set_value("profile_count", f"{len(rows)} of {len(PROFILE_VIEW['all'])} profiles")
+    for i in range(PROFILE_POOL):
+        if i >= len(shown):
+            dpg.hide_item(f"prof_row_{i}"); continue
+        profile = shown[i]
+        if profile not in LAST_SYNC_CACHE: request_last_sync(profile, priority=0)
+        dpg.set_value(f"prof_name_{i}", profile)
+        dpg.set_value(f"prof_sync_{i}", f"Last Sync: {LAST_SYNC_CACHE.get(profile, '…')}")
+        for btn in ("run", "edit", "del"): dpg.configure_item(f"prof_{btn}_{i}", user_data=profile)
+        dpg.show_item(f"prof_row_{i}")
+    _update_job_cells()
+
+def _update_job_cells():
+    """Job status and Run/Cancel label of visible rows; only touches widgets whose text changed."""
+    cells = PROFILE_VIEW["job_cells"]
+    for i, profile in enumerate(PROFILE_VIEW["shown"]):
+        job = JOBS_BY_PROFILE.get(profile)
+        cell = (describe_job(job), "Cancel" if job and job["active"] else "Run Sync")
+        if cells[i] != cell:
+            dpg.set_value(f"prof_job_{i}", cell[0]); dpg.configure_item(f"prof_run_{i}", label=cell[1]); cells[i] = cell
+
+def _build_profile_rows():
+    dpg.add_spacer(height=0, tag="prof_spacer_top", parent="profiles_panel")
+    for i in range(PROFILE_POOL):
+        with dpg.group(parent="profiles_panel", tag=f"prof_row_{i}", show=False):
+            dpg.add_text("", tag=f"prof_name_{i}", color=(0,255,255))
+            dpg.add_text("", tag=f"prof_sync_{i}")
             with dpg.group(horizontal=True):
-                dpg.add_button(label="Run Sync", width=80, callback=run_sync, user_data=profile)
-                dpg.add_button(label="Edit", width=60, callback=open_profile_editor, user_data=profile)
-                del_btn = dpg.add_button(label="Delete", width=70, callback=delete_profile, user_data=profile)
-                dpg.bind_item_theme(del_btn, del_theme)
+                dpg.add_button(label="Run Sync", width=80, callback=run_sync, tag=f"prof_run_{i}")
+                dpg.add_button(label="Edit", width=60, callback=open_profile_editor, tag=f"prof_edit_{i}")
+                dpg.add_button(label="Delete", width=70, callback=delete_profile, tag=f"prof_del_{i}")
+                dpg.bind_item_theme(f"prof_del_{i}", "del_theme")
+                dpg.add_text("", tag=f"prof_job_{i}", color=(255,200,0))
             dpg.add_separator()
+    dpg.add_spacer(height=0, tag="prof_spacer_bottom", parent="profiles_panel")
 
 # ─────────────────────────── SCRIPT / CRON / LIVE RUN ───────────────────────────
 def refresh_script_combo():
@@ -160,6 +329,9 @@ def load_selected_script(sender=None, app_data=None, user_data=None):
     try:
         with open(resolve_script_path(raw)) as f: dpg.set_value("script_txt", f.read())
     except FileNotFoundError: dpg.set_value("script_txt", "# File not found.\n")
+    job = next((j for j in get_crontab()["jobs"] if j["script"] == resolve_script_path(raw)), None)
+    if job: dpg.set_value("cron_sched", job["schedule"])
+    preview_cron_schedule()
 
 def save_script_changes():
     raw = dpg.get_value("script_combo")
@@ -172,54 +344,78 @@ def save_script_changes():
     except Exception as e: dpg.configure_item("orc_msg", default_value=str(e), color=[255,0,0])
 
 def generate_parallel_script():
+    workers = max(1, dpg.get_value("sched_workers") or DEFAULT_WORKERS)
+    precheck = ""
+    if dpg.get_value("sched_skip_unchanged"):
+        precheck = f" --skip-unchanged --force-every {max(1, dpg.get_value('sched_force_hours'))}"
+    governed = " --governor" if dpg.get_value("sched_governor") else ""
     with open(DEFAULT_SYNC,"w") as f:
-        f.write("#!/bin/bash\n\n# This script runs all unison profiles in parallel.\n\n")
-        for p in load_profiles(): f.write(f'unison "{p}" -batch &\n')
-        f.write("\nwait\necho \"All synchronization tasks complete.\"\n")
+        f.write("#!/bin/bash\n\n# This script runs all unison profiles through the bounded scheduler:\n"
+                f"# at most {workers} at once, one per disk/host, most stale first, with retries.\n"
+                + ("# Profiles whose local roots have not changed since their last run are skipped.\n" if precheck else "")
+                + ("# Jobs run under the limits in governor.json and wait while the machine is loaded.\n" if governed else "")
+                + "\n")
+        f.write(f"{shlex.quote(sys.executable)} {shlex.quote(SCHEDULER_PY)} --unison-dir {shlex.quote(UNISON_DIR)} "
+                f"--workers {workers} --per-device 1 --history {shlex.quote(HISTORY_DB)}{precheck}{governed}\n")
+        f.write("rc=$?\necho \"All synchronization tasks complete (exit code $rc).\"\nexit $rc\n")
     os.chmod(DEFAULT_SYNC,0o755)
     dpg.configure_item("orc_msg", default_value="sync_all_profiles.sh regenerated.", color=[0,255,0])
     refresh_script_combo()
 
+def _fmt_when(epoch: float) -> str:
+    return time.strftime("%a %d %b %H:%M", time.localtime(epoch))
+
+def preview_cron_schedule(sender=None, app_data=None, user_data=None):
+    """Validates the schedule field as it is typed and shows its next runs."""
+    now = datetime.now()
+    try: runs = Schedule.parse(dpg.get_value("cron_sched") or DEFAULT_CRON).runs(now, now + timedelta(days=1830), 3)
+    except ValueError as e: dpg.configure_item("cron_next", default_value=f"Invalid: {e}", color=[255,0,0]); return
+    text = "Next: " + ", ".join(_fmt_when(t.timestamp()) for t in runs) if runs else "Never runs (or only @reboot)"
+    dpg.configure_item("cron_next", default_value=text, color=[150,150,150])
+
+@instrument.timed("crontab.write")
 def install_or_update_cron():
     raw=dpg.get_value("script_combo")
     if not raw: dpg.configure_item("orc_msg", default_value="Select a script first.", color=[255,0,0]); return
-    path=resolve_script_path(raw)
-    new_line = f"{dpg.get_value('cron_sched') or DEFAULT_CRON} {path} >> ~/unison_cron.log 2>&1"
-    cur=subprocess.run("crontab -l",shell=True,text=True,capture_output=True)
-    lines=cur.stdout.splitlines() if cur.returncode==0 else []
-    lines=[ln for ln in lines if path not in ln]; lines.append(new_line)
-    subprocess.run("crontab -",input="\n".join(lines)+"\n", shell=True,text=True)
+    schedule = (dpg.get_value("cron_sched") or DEFAULT_CRON).strip()
+    try:
+        Schedule.parse(schedule)
+        ENGINE.install_cron(script=resolve_script_path(raw), schedule=schedule)
+    except (ValueError, CronError, DaemonError, OSError) as e:
+        dpg.configure_item("orc_msg", default_value=f"Cron not changed: {e}", color=[255,0,0]); return
     dpg.configure_item("orc_msg", default_value="Cron installed/updated.", color=[0,255,0]); refresh_monitor_tab()
 
+@instrument.timed("crontab.write")
 def remove_cron_for_script():
     raw=dpg.get_value("script_combo");
     if not raw: return
-    path=resolve_script_path(raw)
-    cur=subprocess.run("crontab -l",shell=True,text=True,capture_output=True)
-    if cur.returncode!=0: return
-    lines=[ln for ln in cur.stdout.splitlines() if path not in ln]
-    subprocess.run("crontab -",input="\n".join(lines)+"\n", shell=True,text=True)
-    dpg.configure_item("orc_msg", default_value="Cron entry removed.", color=[255,255,0]); refresh_monitor_tab()
+    try: removed = ENGINE.remove_cron(script=resolve_script_path(raw))
+    except (CronError, DaemonError, OSError) as e:
+        dpg.configure_item("orc_msg", default_value=f"Cron not changed: {e}", color=[255,0,0]); return
+    dpg.configure_item("orc_msg", default_value="Cron entry removed." if removed else "No cron entry runs this script.",
+                       color=[255,255,0]); refresh_monitor_tab()
 
+@instrument.timed("script_runner")
 def _execute_script_and_log(script_path: str):
+    out = SCRIPT_RUNNER_STATE["output"]
     try:
         process = subprocess.Popen([script_path], stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
-                                   text=True, bufsize=1, universal_newlines=True, start_new_session=True)
+                                   bufsize=0, start_new_session=True)
         SCRIPT_RUNNER_STATE["process"] = process
-        dpg.set_value("script_log_view", f"--- Running {os.path.basename(script_path)} ---\nPID: {process.pid}\n\n")
-        for line in iter(process.stdout.readline, ''):
-            current_log = dpg.get_value("script_log_view")
-            dpg.set_value("script_log_view", current_log + line)
+        out.write(f"--- Running {os.path.basename(script_path)} ---\nPID: {process.pid}\n\n")
+        pump(process.stdout, out)
+        instrument.count("script_output_chars", out.total_chars)
         ret_code = process.wait()
         final_message = f"\n--- SCRIPT FINISHED (Exit Code: {ret_code}) ---\n"
         if ret_code == -signal.SIGTERM:
             final_message = "\n--- SCRIPT TERMINATED BY USER ---\n"
-        dpg.set_value("script_log_view", dpg.get_value("script_log_view") + final_message)
+        out.write(final_message)
     except Exception as e:
-        dpg.set_value("script_log_view", dpg.get_value("script_log_view") + f"\n--- ERROR ---\n{e}\n")
+        out.write(f"\n--- ERROR ---\n{e}\n")
     finally:
         if SCRIPT_RUNNER_STATE.get("process") and SCRIPT_RUNNER_STATE["process"].stdout:
             SCRIPT_RUNNER_STATE["process"].stdout.close()
+        out.close()
         SCRIPT_RUNNER_STATE["process"] = None
         SCRIPT_RUNNER_STATE["script_path"] = None
         dpg.configure_item("run_script_btn", enabled=True)
@@ -235,6 +431,9 @@ def run_orchestration_script():
     if not os.path.exists(script_path):
         dpg.configure_item("orc_msg", default_value="Script not found.", color=[255,0,0]); return
     dpg.set_value("script_log_view", "")
+    spill = os.path.join(SCRIPT_LOG_DIR, f"{os.path.basename(script_path)}-{time.strftime('%Y%m%d-%H%M%S')}.log")
+    SCRIPT_RUNNER_STATE["output"] = OutputRing(SCRIPT_LOG_LINES, SCRIPT_LOG_CHARS, spill)
+    SCRIPT_RUNNER_STATE["rendered"] = -1
     dpg.configure_item("run_script_btn", enabled=False)
     dpg.show_item("running_script_controls")
     w, h = dpg.get_viewport_client_width(), dpg.get_viewport_client_height()
@@ -243,13 +442,20 @@ def run_orchestration_script():
     threading.Thread(target=_execute_script_and_log, args=(script_path,), daemon=True).start()
 
 def kill_script():
-    proc = SCRIPT_RUNNER_STATE.get("process")
+    proc, out = SCRIPT_RUNNER_STATE.get("process"), SCRIPT_RUNNER_STATE.get("output")
     if proc and proc.poll() is None:
-        dpg.set_value("script_log_view", dpg.get_value("script_log_view") + "\n--- Sending kill signal... ---\n")
+        out.write("\n--- Sending kill signal... ---\n")
         try: os.killpg(os.getpgid(proc.pid), signal.SIGTERM)
         except ProcessLookupError: pass
         except Exception as e:
-            dpg.set_value("script_log_view", dpg.get_value("script_log_view") + f"\n--- ERROR during kill ---\n{e}\n")
+            out.write(f"\n--- ERROR during kill ---\n{e}\n")
+
+def _flush_script_log():
+    """UI tick: pushes the script output ring to the log widget when it has changed."""
+    out = SCRIPT_RUNNER_STATE.get("output")
+    if out is None or out.version == SCRIPT_RUNNER_STATE["rendered"]: return
+    SCRIPT_RUNNER_STATE["rendered"], text = out.snapshot()
+    dpg.set_value("script_log_view", text)
 
 # ─────────────────── MONITORING AND ARBITRARY PROCESS KILL ───────────────────
 def _confirm_kill_callback(sender, app_data, user_data):
@@ -301,119 +507,356 @@ def kill_arbitrary_process(sender, app_data, user_data):
 def monitor_loop():
     while dpg.is_dearpygui_running():
         if dpg.is_item_visible("monitoring_tab"):
-            refresh_monitor_tab()
+            with instrument.span("monitor_loop"): refresh_monitor_tab()
         time.sleep(MONITOR_SECS)
 
+def _refresh_log_view():
+    sel = dpg.get_value("log_combo")
+    if not sel: return
+    key = (sel, LOG_CHANGES.get(sel, 0))
+    if key != MONITOR_STATE["log_key"]:
+        dpg.set_value("log_view", tail_log(sel)); MONITOR_STATE["log_key"] = key; MONITOR_STATS["log_writes"] += 1
+
+def _refresh_cron_view():
+    cron = get_crontab()
+    if cron["version"] != MONITOR_STATE["cron_version"]:
+        dpg.set_value("cron_view", cron["text"]); MONITOR_STATE["cron_version"] = cron["version"]; MONITOR_STATS["cron_writes"] += 1
+    now = time.time()
+    lines = [f"{_fmt_when(t)}  in {_fmt_elapsed(t - now)[:-3]}  {os.path.basename(label) if label.endswith('.sh') else label}"
+             for t, label in cron["upcoming"]]
+    lines += [f"! invalid line: {bad['line'].strip()} ({bad['error']})" for bad in cron["invalid"]]
+    timeline = "\n".join(lines) or "(no runs in the next 48 h)"
+    if timeline != MONITOR_STATE["cron_timeline"]:
+        dpg.set_value("cron_upcoming", timeline); MONITOR_STATE["cron_timeline"] = timeline
+
+def _refresh_governor_view():
+    head, jobs = format_governor(get_governor_status())
+    if (head, jobs) != MONITOR_STATE["governor"]:
+        dpg.configure_item("gov_state", default_value=head, color=(255, 150, 0) if head.startswith("THROTTLED") else (0, 200, 0))
+        dpg.set_value("gov_jobs", jobs); MONITOR_STATE["governor"] = (head, jobs)
+
+def engine_event_loop():
+    """Long-polls the engine's change feed and hands events to the UI pump."""
+    cursor = None
+    while True:
+        try: res = ENGINE.changes(cursor=cursor, timeout=30 if cursor is not None else 0)
+        except (OSError, DaemonError) as e:
+            print(f"Engine change feed failed: {e}"); time.sleep(MONITOR_SECS); continue
+        if res["reset"]: _ENGINE_EVENTS.put(("reset", None))
+        for kind, name in res["events"]: _ENGINE_EVENTS.put((kind, name))
+        cursor = res["cursor"]
+
+def _apply_state_changes():
+    """UI tick: redraws only what the engine reports as changed, and follows active jobs."""
+    kinds, logs = set(), set()
+    while not _ENGINE_EVENTS.empty():
+        kind, name = _ENGINE_EVENTS.get_nowait(); kinds.add(kind)
+        if kind == "log": logs.add(name); LOG_CHANGES[name] = LOG_CHANGES.get(name, 0) + 1
+    if "reset" in kinds:
+        LAST_SYNC_CACHE.clear(); MONITOR_STATE["log_key"] = None
+    if kinds & {"profiles", "reset"}:
+        refresh_profile_panel(); dpg.configure_item("log_combo", items=PROFILE_VIEW["all"])
+    for profile in logs: request_last_sync(profile, priority=0 if profile in PROFILE_VIEW["shown"] else 1)
+    if kinds & {"job", "reset"} or any(j["active"] for j in JOBS_BY_PROFILE.values()):
+        JOBS_BY_PROFILE.update(ENGINE.jobs())
+    if "reset" in kinds or dpg.get_value("log_combo") in logs: _refresh_log_view()
+
+def _reconcile_proc_table(processes) -> tuple[int, int]:
+    """Brings `proc_table` in line with `processes`; returns (widgets created, widgets destroyed)."""
+    rows, created, destroyed = MONITOR_STATE["rows"], 0, 0
+    live = {str(p["pid"]): p for p in processes}
+    for pid in [pid for pid in rows if pid not in live]:
+        dpg.delete_item(rows.pop(pid)["row"]); destroyed += 3
+    for pid, proc in live.items():
+        label, row = format_process(proc), rows.get(pid)
+        if row is None:
+            with dpg.table_row(parent="proc_table") as row_id:
+                text = dpg.add_text(label, wrap=420)
+                btn = dpg.add_button(label="Kill", user_data=proc, callback=kill_arbitrary_process)
+                dpg.bind_item_theme(btn, "kill_theme")
+            rows[pid] = {"row": row_id, "text": text, "btn": btn, "label": label}; created += 3
+        elif row["label"] != label:
+            dpg.set_value(row["text"], label); dpg.configure_item(row["btn"], user_data=proc); row["label"] = label
+    dpg.configure_item("proc_none_row", show=not rows)
+    return created, destroyed
+
+@instrument.timed("refresh_monitor_tab")
 def refresh_monitor_tab():
-    dpg.set_value("cron_view", get_crontab_text())
-    sel=dpg.get_value("log_combo")
-    if sel: dpg.set_value("log_view", tail_log(sel))
-
-    dpg.delete_item("proc_table", children_only=True)
-    dpg.add_table_column(label="Process Details", parent="proc_table")
-    dpg.add_table_column(label="Action", width_fixed=True, width=80, parent="proc_table")
-
-    processes = get_running_unison_processes()
-    if not processes:
-        with dpg.table_row(parent="proc_table"):
-            dpg.add_text("(none)")
-            dpg.add_text("")
+    with _MONITOR_LOCK:
+        t0 = time.perf_counter()
+        _refresh_cron_view()
+        _refresh_log_view()
+
+        created, destroyed = _reconcile_proc_table(get_running_unison_processes())
+        _refresh_governor_view()
+
+        st = MONITOR_STATS
+        st["refreshes"] += 1; st["created"] += created; st["destroyed"] += destroyed
+        st["last_created"], st["last_destroyed"] = created, destroyed
+        st["last_ms"] = (time.perf_counter() - t0) * 1000
+        dpg.set_value("monitor_stats", f"Refresh #{st['refreshes']}: {st['last_ms']:.1f} ms | widgets +{created}/-{destroyed} "
+                                       f"(total +{st['created']}/-{st['destroyed']}) | cron writes {st['cron_writes']}, "
+                                       f"log writes {st['log_writes']}")
+
+# ─────────────────────────── HISTORY ───────────────────────────
+HISTORY_QUERIES = {"Slowest profiles": "slowest", "Failure rate": "failures", "Daily throughput": "throughput"}
+
+# Latest request and its formatted result; the query runs on a worker, a UI tick shows the text.
+HISTORY_VIEW = {"seq": 0, "text": None}
+
+def refresh_history_tab():
+    kind, days = HISTORY_QUERIES[dpg.get_value("hist_query")], dpg.get_value("hist_days")
+    HISTORY_VIEW["seq"] += 1
+    threading.Thread(target=_load_history, args=(HISTORY_VIEW["seq"], kind, time.time() - days * 86400),
+                     daemon=True).start()
+
+def _load_history(seq, kind, since):
+    try: text = _format_history(kind, ENGINE.history(query=kind, since=since))
+    except (OSError, DaemonError) as e: text = f"History query failed: {e}"
+    if seq == HISTORY_VIEW["seq"]: HISTORY_VIEW["text"] = text     # a newer request supersedes this one
+
+def _format_history(kind, rows):
+    if kind == "slowest":
+        lines = [f"{r['profile']:<28} {r['runs']:>5} runs  avg {_fmt_elapsed(r['avg_s'])}  max {_fmt_elapsed(r['max_s'])}"
+                 for r in rows]
+    elif kind == "failures":
+        lines = [f"{r['profile']:<28} {r['runs']:>5} runs  {r['failure_rate'] * 100:5.1f}% failed  {r['conflicts']} conflicts"
+                 for r in rows]
     else:
-        for proc in processes:
-            with dpg.table_row(parent="proc_table"):
-                dpg.add_text(f"PID: {proc['pid']} | {proc['cmd']}")
-                kill_btn = dpg.add_button(label="Kill", user_data=proc, callback=kill_arbitrary_process)
-                dpg.bind_item_theme(kill_btn, "kill_theme")
+        lines = [f"{time.strftime('%Y-%m-%d', time.localtime(r['bucket']))}  {r['runs']:>5} runs  {r['files'] or 0:>7} files  "
+                 f"busy {_fmt_elapsed(r['busy_s'] or 0)}" for r in rows]
+    return "\n".join(lines) or "(no runs recorded)"
+
+def _apply_history():
+    """UI tick: shows the result of the last history query once it has arrived."""
+    if (text := HISTORY_VIEW["text"]) is not None:
+        HISTORY_VIEW["text"] = None; dpg.set_value("hist_view", text)
+
+# ─────────────────────────── DIAGNOSTICS ───────────────────────────
+def toggle_instrumentation(sender, app_data, user_data):
+    instrument.enable(bool(app_data))
+
+def reset_diagnostics():
+    instrument.reset(); DIAG_STATE["shown_at"] = 0.0
+
+def export_diagnostics():
+    path = os.path.join(ORCH_DIR, f"diagnostics-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    try: dpg.configure_item("diag_msg", default_value=f"Exported to {instrument.export(path)}", color=[0,255,0])
+    except OSError as e: dpg.configure_item("diag_msg", default_value=str(e), color=[255,0,0])
+
+def _refresh_diagnostics():
+    """UI tick: redraws the Diagnostics table at most every DIAG_SECS while the tab is visible."""
+    now = time.monotonic()
+    if now - DIAG_STATE["shown_at"] < DIAG_SECS or not dpg.is_item_visible("diagnostics_tab"): return
+    DIAG_STATE["shown_at"] = now
+    snap = instrument.snapshot()
+    frame = snap["operations"].get("frame")
+    dpg.set_value("diag_frame", f"Frame time: p50 {frame['recent_p50_ms']:.1f} ms, p99 {frame['recent_p99_ms']:.1f} ms, "
+                                f"max {frame['max_ms']:.1f} ms over {frame['count']} frames" if frame else
+                                "Frame time: (instrumentation off)" if not snap["enabled"] else "Frame time: (no frames yet)")
+    dpg.set_value("diag_view", instrument.format_table(snap))
+
+# ─────────────────────────── UI PUMP ───────────────────────────
+# Callables run from one background thread at UI_FPS; used to batch widget updates.
+UI_TICKS = [_flush_script_log, _apply_state_changes, _sync_profile_viewport, _apply_history, _refresh_diagnostics]
+
+def ui_pump_loop():
+    names = [f"ui.{tick.__name__.lstrip('_')}" for tick in UI_TICKS]
+    while dpg.is_dearpygui_running():
+        for tick, name in zip(UI_TICKS, names):
+            try:
+                with instrument.span(name): tick()
+            except Exception as e: print(f"UI tick {tick.__name__} failed: {e}")
+        time.sleep(1 / UI_FPS)
 
 # ─────────────────────────── GUI LAYOUT ───────────────────────────
-dpg.create_context()
-dpg.create_viewport(title="Unison Orchestrator v3.18", width=1200, height=980)
-
-with dpg.theme(tag="kill_theme"):
-    with dpg.theme_component(dpg.mvButton):
-        dpg.add_theme_color(dpg.mvThemeCol_Button, (220, 0, 0))
-        dpg.add_theme_color(dpg.mvThemeCol_ButtonHovered, (255, 50, 50))
-
-with dpg.window(label="Unison Orchestrator v3.18", width=1180, height=960):
-    dpg.add_button(label="Refresh Profiles", callback=lambda: refresh_profile_panel())
-    dpg.add_spacer(height=6)
-    with dpg.group(horizontal=True):
-        with dpg.child_window(tag="profiles_panel", width=600, height=880, border=True): pass
-        with dpg.child_window(width=550, height=880, border=True):
-            with dpg.tab_bar():
-                with dpg.tab(label="Create Profile"):
-                    dpg.add_input_text(label="Profile Name", tag="new_name", width=480)
-                    with dpg.group(horizontal=True):
-                        dpg.add_input_text(label="Source Dir", tag="new_src", width=400)
-                        dpg.add_button(label="Browse", callback=lambda: pick_directory("new_src"))
-                    with dpg.group(horizontal=True):
-                        dpg.add_input_text(label="Target Dir", tag="new_tgt", width=400)
-                        dpg.add_button(label="Browse", callback=lambda: pick_directory("new_tgt"))
-                    dpg.add_button(label="Save Profile", callback=save_new_profile)
-                    dpg.add_text("", tag="new_msg")
-
-                with dpg.tab(label="Orchestrator"):
-                    dpg.add_button(label="Generate sync_all_profiles.sh", callback=generate_parallel_script)
-                    dpg.add_separator()
-                    dpg.add_text("Shell scripts referenced in crontab:")
-                    dpg.add_combo([], tag="script_combo", width=380, callback=load_selected_script)
-                    dpg.add_button(label="Refresh List", callback=refresh_script_combo)
-                    dpg.add_input_text(tag="script_txt", multiline=True, width=500, height=260)
-                    with dpg.group(horizontal=True):
-                        dpg.add_button(label="Save Script Changes", callback=save_script_changes)
-                        dpg.add_button(label="Run Script Now", callback=run_orchestration_script, tag="run_script_btn")
-                    with dpg.group(tag="running_script_controls", show=False, horizontal=True):
-                        dpg.add_button(label="Show Log", callback=lambda: dpg.show_item("script_log_win"))
-                        kill_btn = dpg.add_button(label="Kill Running Script", callback=kill_script)
-                        dpg.bind_item_theme(kill_btn, "kill_theme")
-                    dpg.add_separator()
-                    dpg.add_input_text(label="Cron schedule", tag="cron_sched", width=200, default_value=DEFAULT_CRON, hint="min hr dom mon dow")
-                    with dpg.group(horizontal=True):
-                        dpg.add_button(label="Install / Update Cron", callback=install_or_update_cron)
-                        dpg.add_button(label="Remove Cron", callback=remove_cron_for_script)
-                    dpg.add_text("", tag="orc_msg")
-
-                with dpg.tab(label="Monitoring", tag="monitoring_tab"):
-                    dpg.add_text("Cron entries:")
-                    dpg.add_input_text(tag="cron_view", multiline=True, readonly=True, width=500, height=120)
-                    dpg.add_separator()
-                    dpg.add_text("Running Unison Processes:")
-                    with dpg.table(header_row=True, tag="proc_table", resizable=True, policy=dpg.mvTable_SizingStretchProp):
-                        dpg.add_table_column(label="Process Details")
-                        dpg.add_table_column(label="Action", width_fixed=True, width=80)
-                    dpg.add_separator()
-                    dpg.add_text("Log viewer:")
-                    dpg.add_combo(load_profiles(), tag="log_combo", width=250, callback=lambda: refresh_monitor_tab())
-                    dpg.add_input_text(tag="log_view", multiline=True, readonly=True, width=500, height=220)
-
-with dpg.window(label="Confirm Kill", modal=True, show=False, id="confirmation_kill_dialog", no_title_bar=True, pos=(400,400)):
-    dpg.add_text("Are you sure?", tag="kill_confirm_text")
-    dpg.add_separator()
-    with dpg.group(horizontal=True):
-        dpg.add_button(label="OK", width=75, callback=_confirm_kill_callback, id="kill_confirm_ok_btn")
-        dpg.add_button(label="Cancel", width=75, callback=lambda: dpg.configure_item("confirmation_kill_dialog", show=False))
-
-with dpg.window(label="Edit Profile", tag="edit_win", width=EDIT_W, height=EDIT_H, pos=(0,0), show=False):
-    dpg.add_input_text(label="Profile Name", tag="edit_name", width=500, enabled=False)
-    with dpg.group(horizontal=True):
-        dpg.add_input_text(label="Source Dir", tag="edit_src", width=400); dpg.add_button(label="Browse", callback=lambda: pick_directory("edit_src"))
-    with dpg.group(horizontal=True):
-        dpg.add_input_text(label="Target Dir", tag="edit_tgt", width=400); dpg.add_button(label="Browse", callback=lambda: pick_directory("edit_tgt"))
-    dpg.add_button(label="Save Changes", callback=save_profile_edit)
-    dpg.add_text("", tag="edit_msg")
-with dpg.window(label="Script Output", tag="script_log_win", width=LOG_W, height=LOG_H, show=False, modal=False, no_close=True):
-    dpg.add_input_text(tag="script_log_view", multiline=True, readonly=True, width=-1, height=-40)
-    dpg.add_button(label="Hide Log", tag="log_win_close_btn", width=-1, callback=lambda: dpg.hide_item("script_log_win"))
-with dpg.file_dialog(directory_selector=True, show=False, tag="dlg_new_src", callback=lambda s,a,u: _set_value_from_dialog(s,a,"new_src")): dpg.add_file_extension(".*")
-with dpg.file_dialog(directory_selector=True, show=False, tag="dlg_new_tgt", callback=lambda s,a,u: _set_value_from_dialog(s,a,"new_tgt")): dpg.add_file_extension(".*")
-with dpg.file_dialog(directory_selector=True, show=False, tag="dlg_edit_src", callback=lambda s,a,u: _set_value_from_dialog(s,a,"edit_src")): dpg.add_file_extension(".*")
-with dpg.file_dialog(directory_selector=True, show=False, tag="dlg_edit_tgt", callback=lambda s,a,u: _set_value_from_dialog(s,a,"edit_tgt")): dpg.add_file_extension(".*")
+def build_gui():
+    """Creates every window, theme and dialog; needs a DearPyGui context and ENGINE."""
+    with dpg.theme(tag="kill_theme"):
+        with dpg.theme_component(dpg.mvButton):
+            dpg.add_theme_color(dpg.mvThemeCol_Button, (220, 0, 0))
+            dpg.add_theme_color(dpg.mvThemeCol_ButtonHovered, (255, 50, 50))
+
+    with dpg.theme(tag="del_theme"):
+        with dpg.theme_component(dpg.mvButton):
+            dpg.add_theme_color(dpg.mvThemeCol_Button, (200,40,40)); dpg.add_theme_color(dpg.mvThemeCol_ButtonHovered, (220,60,60))
+
+    with dpg.window(label="Unison Orchestrator v3.33", width=1180, height=960):
+        with dpg.group(horizontal=True):
+            dpg.add_button(label="Refresh Profiles", callback=lambda: (ENGINE.reload(), refresh_profile_panel()))
+            dpg.add_input_text(tag="profile_filter", hint="Filter profiles", width=300, callback=apply_profile_filter)
+            dpg.add_text("", tag="profile_count")
+        dpg.add_spacer(height=6)
+        with dpg.group(horizontal=True):
+            with dpg.child_window(tag="profiles_panel", width=600, height=PANEL_H, border=True): _build_profile_rows()
+            with dpg.child_window(width=550, height=PANEL_H, border=True):
+                with dpg.tab_bar():
+                    with dpg.tab(label="Create Profile"):
+                        dpg.add_input_text(label="Profile Name", tag="new_name", width=480)
+                        with dpg.group(horizontal=True):
+                            dpg.add_input_text(label="Source Dir", tag="new_src", width=400)
+                            dpg.add_button(label="Browse", callback=lambda: pick_directory("new_src"))
+                        with dpg.group(horizontal=True):
+                            dpg.add_input_text(label="Target Dir", tag="new_tgt", width=400)
+                            dpg.add_button(label="Browse", callback=lambda: pick_directory("new_tgt"))
+                        dpg.add_button(label="Save Profile", callback=save_new_profile)
+                        dpg.add_text("", tag="new_msg")
+
+                    with dpg.tab(label="Orchestrator"):
+                        with dpg.group(horizontal=True):
+                            dpg.add_button(label="Generate sync_all_profiles.sh", callback=generate_parallel_script)
+                            dpg.add_input_int(label="Max parallel", tag="sched_workers", default_value=DEFAULT_WORKERS,
+                                              min_value=1, min_clamped=True, width=100)
+                        with dpg.group(horizontal=True):
+                            dpg.add_checkbox(label="Skip unchanged profiles", tag="sched_skip_unchanged", default_value=True)
+                            dpg.add_input_int(label="full run every (h)", tag="sched_force_hours", default_value=DEFAULT_FORCE_HOURS,
+                                              min_value=1, min_clamped=True, width=100)
+                        dpg.add_checkbox(label="Resource governor (CPU/IO/memory limits, hold new syncs while the machine is busy)",
+                                         tag="sched_governor", default_value=True)
+                        dpg.add_separator()
+                        dpg.add_text("Shell scripts referenced in crontab:")
+                        dpg.add_combo([], tag="script_combo", width=380, callback=load_selected_script)
+                        dpg.add_button(label="Refresh List", callback=refresh_script_combo)
+                        dpg.add_input_text(tag="script_txt", multiline=True, width=500, height=260)
+                        with dpg.group(horizontal=True):
+                            dpg.add_button(label="Save Script Changes", callback=save_script_changes)
+                            dpg.add_button(label="Run Script Now", callback=run_orchestration_script, tag="run_script_btn")
+                        with dpg.group(tag="running_script_controls", show=False, horizontal=True):
+                            dpg.add_button(label="Show Log", callback=lambda: dpg.show_item("script_log_win"))
+                            kill_btn = dpg.add_button(label="Kill Running Script", callback=kill_script)
+                            dpg.bind_item_theme(kill_btn, "kill_theme")
+                        dpg.add_separator()
+                        dpg.add_input_text(label="Cron schedule", tag="cron_sched", width=200, default_value=DEFAULT_CRON, hint="min hr dom mon dow",
+                                           callback=preview_cron_schedule)
+                        dpg.add_text("", tag="cron_next")
+                        with dpg.group(horizontal=True):
+                            dpg.add_button(label="Install / Update Cron", callback=install_or_update_cron)
+                            dpg.add_button(label="Remove Cron", callback=remove_cron_for_script)
+                        dpg.add_text("", tag="orc_msg")
+
+                    with dpg.tab(label="Tuning"):
+                        dpg.add_text("Apply performance settings to many profiles (atomic, other options kept):")
+                        with dpg.group(horizontal=True):
+                            dpg.add_input_text(label="Profiles (glob)", tag="tune_pattern", hint="e.g. work-* or *", width=250)
+                            dpg.add_button(label="Preview", callback=preview_tuning)
+                        dpg.add_combo(TUNE_CHOICES, label="fastcheck", tag="tune_fastcheck", default_value="(unchanged)", width=150)
+                        dpg.add_combo(TUNE_CHOICES, label="rsync", tag="tune_rsync", default_value="(unchanged)", width=150)
+                        dpg.add_input_int(label="maxthreads (0 = unchanged)", tag="tune_maxthreads", default_value=0, min_value=0, min_clamped=True, width=150)
+                        dpg.add_input_int(label="copythreshold KB (0 = unchanged)", tag="tune_copythreshold", default_value=0, min_value=0, min_clamped=True, width=150)
+                        # multiline inputs draw no hint, so the examples go in the label
+                        dpg.add_text("Ignore patterns to add, one per line (e.g. Name *.o, Name node_modules):")
+                        dpg.add_input_text(tag="tune_ignore", multiline=True, width=500, height=120)
+                        dpg.add_button(label="Apply to Matching Profiles", callback=apply_bulk_tuning)
+                        dpg.add_text("", tag="tune_msg")
+
+                    with dpg.tab(label="History"):
+                        with dpg.group(horizontal=True):
+                            dpg.add_combo(list(HISTORY_QUERIES), tag="hist_query", default_value="Slowest profiles", width=180,
+                                          callback=lambda: refresh_history_tab())
+                            dpg.add_input_int(label="days", tag="hist_days", default_value=30, min_value=1, min_clamped=True,
+                                              width=100, callback=lambda: refresh_history_tab())
+                            dpg.add_button(label="Refresh", callback=lambda: refresh_history_tab())
+                        dpg.add_input_text(tag="hist_view", multiline=True, readonly=True, width=500, height=700)
+
+                    with dpg.tab(label="Diagnostics", tag="diagnostics_tab"):
+                        with dpg.group(horizontal=True):
+                            dpg.add_checkbox(label="Instrumentation", tag="diag_enabled", default_value=instrument.ENABLED,
+                                             callback=toggle_instrumentation)
+                            dpg.add_button(label="Reset", callback=reset_diagnostics)
+                            dpg.add_button(label="Export JSON", callback=export_diagnostics)
+                        dpg.add_text("", tag="diag_frame")
+                        dpg.add_input_text(tag="diag_view", multiline=True, readonly=True, width=520, height=680)
+                        dpg.add_text("", tag="diag_msg")
+
+                    with dpg.tab(label="Monitoring", tag="monitoring_tab"):
+                        dpg.add_text("Cron entries:")
+                        dpg.add_input_text(tag="cron_view", multiline=True, readonly=True, width=500, height=120)
+                        dpg.add_text("Upcoming runs (48 h):")
+                        dpg.add_input_text(tag="cron_upcoming", multiline=True, readonly=True, width=500, height=90)
+                        dpg.add_separator()
+                        dpg.add_text("Running Unison Processes:")
+                        with dpg.table(header_row=True, tag="proc_table", resizable=True, policy=dpg.mvTable_SizingStretchProp):
+                            dpg.add_table_column(label="Process Details")
+                            dpg.add_table_column(label="Action", width_fixed=True, width=80)
+                            with dpg.table_row(tag="proc_none_row"):
+                                dpg.add_text("(none)")
+                                dpg.add_text("")
+                        dpg.add_text("Resource governor:")
+                        dpg.add_text("", tag="gov_state")
+                        dpg.add_input_text(tag="gov_jobs", multiline=True, readonly=True, width=500, height=90)
+                        dpg.add_text("", tag="monitor_stats", color=(150,150,150))
+                        dpg.add_separator()
+                        dpg.add_text("Log viewer:")
+                        dpg.add_combo(load_profiles(), tag="log_combo", width=250, callback=lambda: refresh_monitor_tab())
+                        dpg.add_input_text(tag="log_view", multiline=True, readonly=True, width=500, height=220)
+
+    with dpg.window(label="Confirm Kill", modal=True, show=False, id="confirmation_kill_dialog", no_title_bar=True, pos=(400,400)):
+        dpg.add_text("Are you sure?", tag="kill_confirm_text")
+        dpg.add_separator()
+        with dpg.group(horizontal=True):
+            dpg.add_button(label="OK", width=75, callback=_confirm_kill_callback, id="kill_confirm_ok_btn")
+            dpg.add_button(label="Cancel", width=75, callback=lambda: dpg.configure_item("confirmation_kill_dialog", show=False))
+
+    with dpg.window(label="Edit Profile", tag="edit_win", width=EDIT_W, height=EDIT_H, pos=(0,0), show=False):
+        dpg.add_input_text(label="Profile Name", tag="edit_name", width=500, enabled=False)
+        with dpg.group(horizontal=True):
+            dpg.add_input_text(label="Source Dir", tag="edit_src", width=400); dpg.add_button(label="Browse", callback=lambda: pick_directory("edit_src"))
+        with dpg.group(horizontal=True):
+            dpg.add_input_text(label="Target Dir", tag="edit_tgt", width=400); dpg.add_button(label="Browse", callback=lambda: pick_directory("edit_tgt"))
+        dpg.add_separator()
+        dpg.add_text("Performance (blank = unison default):")
+        for key in PERF_PREFS: dpg.add_input_text(label=key, tag=f"edit_pref_{key}", width=300)
+        dpg.add_text("Ignore patterns (one per line):")
+        dpg.add_input_text(tag="edit_ignore", multiline=True, width=500, height=100)
+        dpg.add_button(label="Save Changes", callback=save_profile_edit)
+        dpg.add_text("", tag="edit_msg")
+    with dpg.window(label="Script Output", tag="script_log_win", width=LOG_W, height=LOG_H, show=False, modal=False, no_close=True):
+        dpg.add_input_text(tag="script_log_view", multiline=True, readonly=True, width=-1, height=-40)
+        dpg.add_button(label="Hide Log", tag="log_win_close_btn", width=-1, callback=lambda: dpg.hide_item("script_log_win"))
+    with dpg.file_dialog(directory_selector=True, show=False, tag="dlg_new_src", callback=lambda s,a,u: _set_value_from_dialog(s,a,"new_src")): dpg.add_file_extension(".*")
+    with dpg.file_dialog(directory_selector=True, show=False, tag="dlg_new_tgt", callback=lambda s,a,u: _set_value_from_dialog(s,a,"new_tgt")): dpg.add_file_extension(".*")
+    with dpg.file_dialog(directory_selector=True, show=False, tag="dlg_edit_src", callback=lambda s,a,u: _set_value_from_dialog(s,a,"edit_src")): dpg.add_file_extension(".*")
+    with dpg.file_dialog(directory_selector=True, show=False, tag="dlg_edit_tgt", callback=lambda s,a,u: _set_value_from_dialog(s,a,"edit_tgt")): dpg.add_file_extension(".*")
 
 # ───────────────────────── STARTUP ─────────────────────────
-refresh_profile_panel()
-refresh_script_combo()
-dpg.setup_dearpygui()
-dpg.show_viewport()
-threading.Thread(target=monitor_loop, daemon=True).start()
-dpg.start_dearpygui()
-dpg.destroy_context()
\ No newline at end of file
+def connect_engine(mode="auto", socket_path=SOCKET_PATH):
+    """A client of the running daemon, or (auto with no daemon, local) an engine in this process."""
+    if mode != "local":
+        try: return DaemonClient(socket_path)
+        except OSError:
+            if mode == "daemon": raise
+    return Engine(UNISON_DIR, ORCH_DIR, HISTORY_DB, workers=DEFAULT_WORKERS, tail_lines=TAIL_LINES).start()
+
+def main(argv=None):
+    global ENGINE
+    ap = argparse.ArgumentParser(description="Unison Sync Orchestrator GUI")
+    ap.add_argument("--engine", choices=["auto", "daemon", "local"], default="auto",
+                    help="auto: attach to the daemon if one is listening, else run the engine in-process")
+    ap.add_argument("--socket", default=SOCKET_PATH, help="daemon socket (see daemon.py)")
+    ap.add_argument("--instrument", action="store_true", default=bool(os.environ.get("UNISON_ORCH_INSTRUMENT")),
+                    help="start with timing instrumentation on (Diagnostics tab)")
+    args = ap.parse_args(argv)
+    instrument.enable(args.instrument)
+    os.makedirs(UNISON_DIR, exist_ok=True)
+    os.makedirs(ORCH_DIR,    exist_ok=True)
+    try: ENGINE = connect_engine(args.engine, args.socket)
+    except ValueError as e: print(f"Cannot start engine: {e}", file=sys.stderr); return 1
+    instrument.gauge("log_bytes_read", lambda: ENGINE.status()["log_bytes_read"])
+
+    dpg.create_context()
+    dpg.create_viewport(title="Unison Orchestrator v3.33", width=1200, height=980)
+    build_gui()
+    threading.Thread(target=last_sync_loader, daemon=True).start()
+    threading.Thread(target=engine_event_loop, daemon=True).start()
+    refresh_profile_panel()
+    refresh_script_combo()
+    dpg.setup_dearpygui()
+    dpg.show_viewport()
+    threading.Thread(target=monitor_loop, daemon=True).start()
+    threading.Thread(target=ui_pump_loop, daemon=True).start()
+    while dpg.is_dearpygui_running():      # start_dearpygui(), with each frame timed
+        with instrument.span("frame"): dpg.render_dearpygui_frame()
+    dpg.destroy_context()
+
+if __name__ == "__main__":
+    sys.exit(main())
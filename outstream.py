@@ -0,0 +1,75 @@
+"""
+Bounded output buffer for long-running scripts.
+
+A reader thread pushes raw chunks from a subprocess pipe into an `OutputRing`.
+The ring keeps only the newest `max_lines` lines / `max_chars` characters in
+memory and spills the complete output to a file on disk, so memory stays flat
+and the per-chunk cost is constant however long the script runs. The GUI polls
+`version` and renders `snapshot()` at a fixed frame-rate instead of per line.
+A line that never ends (e.g. a progress bar redrawn with '\r') is capped at
+`max_chars`, keeping its newest characters; `pump` turns '\r' into line breaks.
+"""
+
+import codecs, os, threading
+from collections import deque
+
+READ_CHUNK = 64 * 1024
+
+
+class OutputRing:
+    def __init__(self, max_lines=5000, max_chars=512 * 1024, spill_path=None):
+        self.max_lines, self.max_chars = max_lines, max_chars
+        self.spill_path = spill_path
+        self._lines: deque[str] = deque()
+        self._chars = 0
+        self._partial = ""
+        self._lock = threading.Lock()
+        self._spill = None
+        if spill_path:
+            os.makedirs(os.path.dirname(spill_path), exist_ok=True)
+            self._spill = open(spill_path, "w", encoding="utf-8")
+        self.version = 0        # bumped on every write; renderers compare against it
+        self.dropped = 0        # lines evicted from memory (still in the spill file)
+        self.total_chars = 0
+
+    def write(self, text: str):
+        if not text: return
+        with self._lock:
+            if self._spill: self._spill.write(text)
+            self.total_chars += len(text)
+            first, *rest = text.split("\n")
+            if rest: done, self._partial = [self._partial + first, *rest[:-1]], rest[-1]
+            else: done, self._partial = [], self._partial + first
+            if len(self._partial) > self.max_chars: self._partial = self._partial[-self.max_chars:]
+            for ln in done[-self.max_lines:]:
+                self._lines.append(ln); self._chars += len(ln) + 1
+            self.dropped += max(0, len(done) - self.max_lines)
+            while self._lines and (len(self._lines) > self.max_lines or self._chars > self.max_chars):
+                self._chars -= len(self._lines.popleft()) + 1; self.dropped += 1
+            self.version += 1
+
+    def snapshot(self) -> tuple[int, str]:
+        """(version, text) of what is currently held in memory."""
+        with self._lock:
+            head = ""
+            if self.dropped:
+                where = f" (full output: {self.spill_path})" if self.spill_path else ""
+                head = f"[... {self.dropped} earlier lines not shown{where} ...]\n"
+            body = "\n".join(self._lines)
+            if self._lines: body += "\n"
+            return self.version, head + body + self._partial
+
+    def close(self):
+        with self._lock:
+            if self._spill: self._spill.close(); self._spill = None
+
+
+def pump(stream, ring: OutputRing):
+    """Copies a binary pipe into `ring` in raw chunks until EOF; '\r' redraws become separate lines."""
+    decoder = codecs.getincrementaldecoder("utf-8")("replace")
+    fd = stream.fileno()
+    while True:
+        chunk = os.read(fd, READ_CHUNK)
+        if not chunk: break
+        ring.write(decoder.decode(chunk).replace("\r\n", "\n").replace("\r", "\n"))
+    ring.write(decoder.decode(b"", final=True))
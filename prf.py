@@ -0,0 +1,169 @@
+"""
+Unison profile (.prf) model.
+
+`Profile` parses every line of a profile - preferences, `include` / `include?` /
+`source` directives, comments and blank lines - and writes it back unchanged
+except for the preferences that were edited, so hand-tuned options survive a
+save from the GUI. Writes are atomic (temp file in the same directory, then
+`os.replace`).
+
+Bulk tuning from the shell:
+
+    python prf.py tune 'photos-*' --set fastcheck=true --set maxthreads=8 --ignore 'Name *.o'
+"""
+
+import argparse, fnmatch, os, sys
+from fsutil import atomic_write
+
+UNISON_DIR = os.path.expanduser("~/.unison")
+
+# Preferences exposed by the editor and the bulk-tune tab
+PERF_PREFS = ("fastcheck", "maxthreads", "rsync", "copythreshold", "copyprog", "copyprogrest")
+INCLUDE_DIRECTIVES = ("include?", "include", "source")
+
+
+class Line:
+    __slots__ = ("raw", "key", "value", "directive")
+
+    def __init__(self, raw, key=None, value=None, directive=None):
+        self.raw, self.key, self.value, self.directive = raw, key, value, directive
+
+    @classmethod
+    def parse(cls, raw):
+        text = raw.strip()
+        if not text or text.startswith("#"): return cls(raw)
+        for d in INCLUDE_DIRECTIVES:
+            if text.startswith(d + " ") or text.startswith(d + "\t"):
+                return cls(raw, directive=d, value=text[len(d):].strip())
+        key, sep, value = text.partition("=")
+        if not sep: return cls(raw)        # not a preference; kept verbatim
+        return cls(raw, key.strip(), value.strip())
+
+    def render(self):
+        return self.raw if self.raw is not None else f"{self.key} = {self.value}\n"
+
+
+class Profile:
+    def __init__(self, lines=None, path=None):
+        self.lines: list[Line] = lines or []
+        self.path = path
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f: return cls([Line.parse(ln) for ln in f], path)
+
+    @classmethod
+    def new(cls, name, src, tgt, unison_dir=UNISON_DIR):
+        """The template `save_new_profile()` has always written."""
+        text = (f"root = {src}\nroot = {tgt}\n\nauto = true\nbatch = true\nprefer = newer\nlog = true\n"
+                f"logfile = {unison_dir}/{name}.log\n")
+        return cls([Line.parse(ln) for ln in text.splitlines(keepends=True)], os.path.join(unison_dir, f"{name}.prf"))
+
+    # ── reading ──
+    def get_all(self, key) -> list[str]:
+        return [ln.value for ln in self.lines if ln.key == key]
+
+    def get(self, key, default=None):
+        vals = self.get_all(key)
+        return vals[-1] if vals else default   # unison: the last setting of a single-valued pref wins
+
+    @property
+    def roots(self) -> list[str]:
+        return self.get_all("root")
+
+    @property
+    def includes(self) -> list[tuple[str, str]]:
+        return [(ln.directive, ln.value) for ln in self.lines if ln.directive]
+
+    def options(self) -> dict[str, list[str]]:
+        out = {}
+        for ln in self.lines:
+            if ln.key and ln.key != "root": out.setdefault(ln.key, []).append(ln.value)
+        return out
+
+    # ── editing ──
+    def set(self, key, value):
+        """Sets a single-valued pref in place (first occurrence), dropping duplicates; None removes it."""
+        if value is None: return self.remove(key)
+        value, kept = str(value), False
+        for ln in list(self.lines):
+            if ln.key != key: continue
+            if kept: self.lines.remove(ln); continue
+            if ln.value != value: ln.value, ln.raw = value, None
+            kept = True
+        if not kept: self._append(Line(None, key, value))
+
+    def set_all(self, key, values):
+        """Replaces every value of a multi-valued pref, reusing existing lines where possible."""
+        values, slots = list(values), [ln for ln in self.lines if ln.key == key]
+        for ln, v in zip(slots, values):
+            if ln.value != v: ln.value, ln.raw = v, None
+        for ln in slots[len(values):]: self.lines.remove(ln)
+        for v in values[len(slots):]: self._append(Line(None, key, v))
+
+    def add(self, key, value):
+        if value not in self.get_all(key): self._append(Line(None, key, value))
+
+    def remove(self, key, value=None):
+        self.lines = [ln for ln in self.lines if not (ln.key == key and (value is None or ln.value == value))]
+
+    def _append(self, line):
+        # keep new settings after the last pref with the same key, else at the end
+        idx = max((i for i, ln in enumerate(self.lines) if ln.key == line.key), default=None)
+        if idx is None:
+            if self.lines and not self.lines[-1].render().endswith("\n"): self.lines[-1].raw = self.lines[-1].render() + "\n"
+            self.lines.append(line)
+        else: self.lines.insert(idx + 1, line)
+
+    # ── writing ──
+    def render(self) -> str:
+        return "".join(ln.render() for ln in self.lines)
+
+    def save(self, path=None):
+        self.path = atomic_write(path or self.path, self.render(), keep_mode=True)
+
+
+def apply_tuning(path, prefs: dict, ignores=()) -> bool:
+    """Sets `prefs` (None removes) and adds `ignores` to one profile; returns True if it changed."""
+    prof = Profile.load(path)
+    before = prof.render()
+    for key, value in prefs.items(): prof.set(key, value)
+    for pattern in ignores: prof.add("ignore", pattern)
+    if prof.render() == before: return False
+    prof.save(); return True
+
+
+def bulk_tune(unison_dir, names, prefs, ignores=()) -> tuple[list[str], dict[str, str]]:
+    """Applies the same tuning to many profiles; returns (changed, {name: error})."""
+    changed, errors = [], {}
+    for name in names:
+        try:
+            if apply_tuning(os.path.join(unison_dir, f"{name}.prf"), prefs, ignores): changed.append(name)
+        except OSError as e: errors[name] = str(e)
+    return changed, errors
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    t = sub.add_parser("tune", help="apply settings to every profile matching a glob")
+    t.add_argument("pattern", help="profile name glob, e.g. 'backup-*'")
+    t.add_argument("--set", action="append", default=[], metavar="KEY=VALUE", help="KEY= (empty) removes the pref")
+    t.add_argument("--ignore", action="append", default=[], metavar="PATTERN", help="ignore pattern to add")
+    t.add_argument("--unison-dir", default=UNISON_DIR)
+    args = ap.parse_args(argv)
+    prefs = {}
+    for item in args.set:
+        key, sep, value = item.partition("=")
+        if not sep: ap.error(f"--set expects KEY=VALUE, got {item!r}")
+        prefs[key.strip()] = value.strip() or None
+    from scheduler import list_profiles              # scheduler imports this module
+    names = fnmatch.filter(list_profiles(args.unison_dir), args.pattern)
+    changed, errors = bulk_tune(args.unison_dir, names, prefs, args.ignore)
+    print(f"{len(names)} matched, {len(changed)} changed, {len(errors)} failed")
+    for name, err in errors.items(): print(f"  {name}: {err}", file=sys.stderr)
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
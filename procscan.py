@@ -0,0 +1,110 @@
+"""
+/proc-based process scanner for the Monitoring tab.
+
+Replaces forking `sh -c "pgrep -fl unison"` on every monitor tick. Each scan
+reads `/proc/<pid>/stat` for every process (needed for start time, pgid and CPU
+ticks); `cmdline` is only read the first time a (pid, start time, comm) triple is
+seen and the parsed argv is cached, so unchanged processes are never re-parsed.
+`comm` is part of the key because exec() keeps the pid and start time: a shell or
+fork scanned before it exec's unison must be re-read to be listed.
+Resident memory comes from the same `stat` read (field 24), so matching
+processes cost no extra opens.
+"""
+
+import os, subprocess, time
+
+CLK_TCK   = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+PAGE_KB   = (os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096) // 1024
+
+
+class _Static:
+    __slots__ = ("start", "comm", "argv", "cmd", "match")
+
+    def __init__(self, start, comm, argv, match):
+        self.start, self.comm, self.argv, self.match = start, comm, argv, match
+        self.cmd = " ".join(argv)
+
+
+def _read_stat(proc_root, pid):
+    """(ppid, pgid, cpu ticks, start ticks, rss pages, comm) from /proc/<pid>/stat, or None if gone."""
+    try:
+        with open(f"{proc_root}/{pid}/stat", "rb") as f: data = f.read()
+    except (FileNotFoundError, ProcessLookupError, PermissionError): return None
+    end = data.rfind(b")")
+    rest = data[end + 2:].split()   # comm may contain spaces and ')'
+    # rest[0] is field 3 (state) of proc(5)
+    return int(rest[1]), int(rest[2]), int(rest[11]) + int(rest[12]), int(rest[19]), int(rest[21]), data[data.find(b"(") + 1:end]
+
+
+def _read_cmdline(proc_root, pid):
+    try:
+        with open(f"{proc_root}/{pid}/cmdline", "rb") as f: raw = f.read()
+    except (FileNotFoundError, ProcessLookupError, PermissionError): return None
+    return [a.decode("utf-8", "replace") for a in raw.rstrip(b"\0").split(b"\0")] if raw else []
+
+
+class ProcScanner:
+    def __init__(self, pattern="unison", proc_root="/proc"):
+        self.pattern, self.proc_root = pattern, proc_root
+        self._static: dict[int, _Static] = {}
+        self._cpu: dict[int, tuple[int, float]] = {}   # pid -> (cpu ticks, monotonic time) at last scan
+        self._self = os.getpid()
+        self.cmdline_reads = 0
+
+    @staticmethod
+    def available(proc_root="/proc"):
+        return os.path.exists(f"{proc_root}/self/stat")
+
+    def scan(self) -> list[dict]:
+        """One dict per matching process, with its process-group members under 'children'."""
+        now = time.monotonic()
+        with open(f"{self.proc_root}/uptime") as f: uptime = float(f.read().split()[0])
+        procs, static = {}, {}
+        for name in os.listdir(self.proc_root):
+            if not name.isdigit(): continue
+            pid = int(name)
+            st = _read_stat(self.proc_root, pid)
+            if st is None: continue
+            info = self._static.get(pid)
+            if info is None or info.start != st[3] or info.comm != st[5]:
+                argv = _read_cmdline(self.proc_root, pid)
+                if argv is None: continue
+                self.cmdline_reads += 1
+                info = _Static(st[3], st[5], argv, pid != self._self and self.pattern in " ".join(argv))
+            procs[pid], static[pid] = st, info
+        self._static = static
+
+        def describe(pid):
+            ppid, pgid, ticks, start, rss, _ = procs[pid]
+            prev = self._cpu.get(pid)
+            if prev and now > prev[1]: cpu = 100.0 * (ticks - prev[0]) / CLK_TCK / (now - prev[1])
+            else: cpu = 100.0 * ticks / CLK_TCK / max(uptime - start / CLK_TCK, 1e-3)
+            return {"pid": pid, "cmd": static[pid].cmd, "argv": static[pid].argv, "ppid": ppid, "pgid": pgid,
+                    "elapsed": max(0.0, uptime - start / CLK_TCK), "cpu": cpu,
+                    "rss_kb": rss * PAGE_KB}
+
+        matched = sorted(p for p, i in static.items() if i.match)
+        groups: dict[int, list[int]] = {}
+        for pid, st in procs.items(): groups.setdefault(st[1], []).append(pid)
+        out = []
+        for pid in matched:
+            row = describe(pid)
+            members = groups.get(pid, []) if procs[pid][1] == pid else []   # only group leaders own children
+            row["children"] = [describe(c) for c in sorted(members) if c != pid and not static[c].match]
+            out.append(row)
+        self._cpu = {pid: (st[2], now) for pid, st in procs.items()}
+        return out
+
+
+def pgrep_processes(pattern="unison") -> list[dict]:
+    """Fallback for systems without /proc: the original `pgrep -fl` path."""
+    processes = []
+    try:
+        lines = subprocess.check_output(f"pgrep -fl {pattern}", shell=True, text=True).strip().splitlines()
+        for line in lines:
+            parts = line.split(maxsplit=1)
+            if len(parts) == 2:
+                processes.append({'pid': parts[0], 'cmd': parts[1]})
+    except subprocess.CalledProcessError:
+        pass # No processes found
+    return processes
@@ -0,0 +1,365 @@
+"""
+Bounded-concurrency sync scheduler.
+
+Replaces the generated "one `unison p -batch &` per profile, then `wait`" script.
+Profiles are queued most-stale first (no history, then oldest successful sync), run on a
+fixed-size worker pool, and never run concurrently with another profile that
+touches the same local device or remote host (up to `per_device` at a time).
+Runs that fail with a retryable exit code are re-queued with exponential backoff; a
+unison killed by a signal (other than a cancel) counts as failed.
+
+Every unison is started in its own process group so a job can be cancelled with
+`os.killpg`. With `capture_output=True` (the GUI) output is read into a small
+per-job `OutputRing` and parsed into a live progress string instead of being
+inherited by the caller.
+
+With `--skip-unchanged` a `changescan.ChangeScanner` pre-check runs first and
+only profiles whose local roots changed since their last successful run (or that
+have not run for `--force-every` hours) are queued.
+
+With a `governor.Governor` (`--governor`) each unison is started under its
+profile's CPU / IO / memory limits, and a job that could otherwise start waits
+while the governor reports the machine too loaded (load average, disk busy %). The
+CLI publishes the governor's status while it runs, for the Monitoring tab.
+
+Headless use (what the generated sync_all_profiles.sh calls from cron):
+
+    python scheduler.py [--workers 4] [--per-device 1] [--retries 2] [--backoff 30] [--json FILE]
+                        [--history DB] [--skip-unchanged [--force-every 24]]
+                        [--governor [--governor-config FILE]] [profile ...]
+"""
+
+import argparse, codecs, json, os, re, signal, subprocess, sys, threading, time
+
+from logindex import LogIndex
+from outstream import OutputRing, READ_CHUNK
+from prf import Profile
+
+UNISON_DIR = os.path.expanduser("~/.unison")
+JOB_OUTPUT_LINES = 200
+_PERCENT = re.compile(r"(\d{1,3})%")
+
+
+def retryable(rc: int) -> bool:
+    # unison: 0 ok, 1 some files skipped, 2 non-fatal failures, 3 fatal error
+    return rc >= 2
+
+
+def succeeded(rc: int) -> bool:
+    # rc < 0: killed by a signal (OOM killer, shutdown, ...) before unison could finish
+    return 0 <= rc < 2
+
+
+# ─────────────────────────── PROFILE HELPERS ───────────────────────────
+def list_profiles(unison_dir=UNISON_DIR):
+    return sorted(f[:-4] for f in os.listdir(unison_dir) if f.endswith(".prf"))
+
+
+def profile_roots(unison_dir, profile) -> list[str]:
+    try: return Profile.load(os.path.join(unison_dir, f"{profile}.prf")).roots
+    except FileNotFoundError: return []
+
+
+def device_key(root: str) -> str:
+    """'host:<name>' for remote roots, 'dev:<st_dev>' for local ones."""
+    if "://" in root:
+        host = root.split("://", 1)[1].split("/", 1)[0]
+        return f"host:{host.rsplit('@', 1)[-1].split(':', 1)[0]}"
+    path = os.path.abspath(os.path.expanduser(root))
+    while True:
+        try: return f"dev:{os.stat(path).st_dev}"
+        except FileNotFoundError:
+            parent = os.path.dirname(path)
+            if parent == path: return f"path:{root}"
+            path = parent
+
+
+# ─────────────────────────── SCHEDULER ───────────────────────────
+class Job:
+    def __init__(self, profile, devices, staleness):
+        self.profile, self.devices, self.staleness = profile, devices, staleness
+        self.state = "queued"           # queued -> running -> done | failed | cancelled
+        self.attempts = 0
+        self.rc = None
+        self.not_before = 0.0
+        self.started = self.finished = None
+        self.durations: list[float] = []
+        self.proc = None
+        self.output = None
+        self.progress = ""
+        self.percent = None
+        self.files_done = 0
+        self.cancelled = False
+        self.held = False               # the governor has held this job back at least once
+
+    @property
+    def active(self):
+        return self.state in ("queued", "running")
+
+    def elapsed(self) -> float:
+        if self.started is None: return 0.0
+        return (time.time() if self.state == "running" else self.finished or time.time()) - self.started
+
+    def _parse(self, line: str):
+        if line.startswith("[END]"): self.files_done += 1
+        if m := _PERCENT.search(line): self.percent = int(m.group(1))
+        parts = [f"{self.percent}%"] if self.percent is not None else []
+        if self.files_done: parts.append(f"{self.files_done} files")
+        self.progress = " · ".join(parts)
+
+    def summary(self) -> dict:
+        return {"profile": self.profile, "state": self.state, "rc": self.rc, "attempts": self.attempts,
+                "durations": [round(d, 3) for d in self.durations],
+                "total_s": round(sum(self.durations), 3)}
+
+
+class SyncScheduler:
+    def __init__(self, unison_dir=UNISON_DIR, workers=4, per_device=1, retries=2, backoff=30.0,
+                 unison="unison", log_index=None, on_event=None, capture_output=False, governor=None):
+        self.unison_dir, self.workers, self.per_device = unison_dir, max(1, workers), max(1, per_device)
+        self.retries, self.backoff, self.unison = retries, backoff, unison
+        self.capture_output, self.governor = capture_output, governor
+        self.held_jobs = 0              # jobs the governor made wait at least once
+        self.log_index = log_index or LogIndex(tail_lines=1)
+        self.on_event = on_event or (lambda event, job: None)
+        self.jobs: list[Job] = []
+        self._pending: list[Job] = []
+        self._busy: dict[str, int] = {}
+        self._running = 0
+        self._cond = threading.Condition()
+        self._threads: list[threading.Thread] = []
+        self._stopping = False
+
+    # ── queueing ──
+    def staleness(self, profile) -> tuple:
+        """Sort key: profiles without any completed sync first, then oldest successful sync
+        (not the log mtime, which failed and aborted runs also bump)."""
+        at = self.log_index.last_sync_at(os.path.join(self.unison_dir, f"{profile}.log"))
+        return (0, 0.0) if at is None else (1, at)
+
+    def submit(self, profiles) -> list[Job]:
+        new = [Job(p, {device_key(r) for r in profile_roots(self.unison_dir, p)}, self.staleness(p)) for p in profiles]
+        with self._cond:
+            self.jobs.extend(new); self._pending.extend(new)
+            self._pending.sort(key=lambda j: j.staleness)
+            self._cond.notify_all()
+        for job in new: self._emit("queued", job)
+        return new
+
+    def start(self):
+        for _ in range(self.workers - len(self._threads)):
+            t = threading.Thread(target=self._worker, daemon=True); t.start(); self._threads.append(t)
+        return self
+
+    def wait(self):
+        """Blocks until every submitted job has finished (including retries)."""
+        with self._cond:
+            while self._pending or self._running: self._cond.wait()
+
+    def stop(self):
+        with self._cond: self._stopping = True; self._cond.notify_all()
+
+    def cancel(self, job):
+        """Drops a queued job, or SIGTERMs the process group of a running one."""
+        with self._cond:
+            job.cancelled = True
+            dequeued = job in self._pending
+            if dequeued:
+                self._pending.remove(job); job.state = "cancelled"; self._cond.notify_all()
+            proc = job.proc
+        if dequeued: self._emit("cancelled", job)
+        elif proc and proc.poll() is None:
+            try: os.killpg(proc.pid, signal.SIGTERM)
+            except ProcessLookupError: pass
+
+    def cancel_all(self):
+        for job in list(self.jobs):
+            if job.active: self.cancel(job)
+
+    # ── workers ──
+    def _take(self) -> Job | None:
+        with self._cond:
+            while not self._stopping:
+                now, wake, held = time.monotonic(), None, False
+                for job in self._pending:
+                    if job.not_before > now:
+                        wake = min(wake or job.not_before, job.not_before); continue
+                    if all(self._busy.get(d, 0) < self.per_device for d in job.devices):
+                        if self.governor and not self.governor.admit(self._running, job.devices):
+                            if not job.held: job.held = True; self.held_jobs += 1
+                            wake, held = now + self.governor.recheck, True; break
+                        self._pending.remove(job); self._running += 1
+                        for d in job.devices: self._busy[d] = self._busy.get(d, 0) + 1
+                        return job
+                if self.governor and not held: self.governor.clear()   # nothing is being held back any more
+                self._cond.wait(None if wake is None else wake - now)
+        return None
+
+    def _release(self, job, retry):
+        with self._cond:
+            self._running -= 1
+            for d in job.devices: self._busy[d] -= 1
+            if retry:
+                job.state, job.not_before = "queued", time.monotonic() + self.backoff * 2 ** (job.attempts - 1)
+                self._pending.append(job); self._pending.sort(key=lambda j: j.staleness)
+            self._cond.notify_all()
+
+    def _emit(self, event, job):
+        # a listener bug must not kill the worker: the jobs behind it would stay queued forever
+        try: self.on_event(event, job)
+        except Exception as e: print(f"[{job.profile}] {event} listener failed: {e!r}", file=sys.stderr)
+
+    def _worker(self):
+        while (job := self._take()) is not None:
+            job.state, job.attempts, job.started = "running", job.attempts + 1, time.time()
+            self._emit("started", job)
+            t0, retry = time.monotonic(), False
+            try:
+                try: job.rc = self._run(job)
+                except OSError as e:
+                    print(f"[{job.profile}] failed to start unison: {e}", file=sys.stderr); job.rc = 127
+                except Exception as e:           # a dead worker would leak its device slots and hang wait()
+                    print(f"[{job.profile}] job failed: {e!r}", file=sys.stderr); job.rc = 127
+                job.durations.append(time.monotonic() - t0); job.finished = time.time(); job.proc = None
+                retry = retryable(job.rc) and job.attempts <= self.retries and not job.cancelled
+                if not retry: job.state = "cancelled" if job.cancelled else "done" if succeeded(job.rc) else "failed"
+                self._emit("retry" if retry else job.state, job)
+            finally:
+                self._release(job, retry)
+
+    def _run(self, job) -> int:
+        cmd = [self.unison, job.profile, "-batch"]
+        if self.governor is None: return self._spawn(job, cmd)
+        try: return self._spawn(job, self.governor.command(job, cmd))
+        finally: self.governor.release(job)
+
+    def _started(self, job):
+        if self.governor: self.governor.attach(job, job.proc.pid)
+        if job.cancelled: self.cancel(job)   # cancelled between _take() and Popen
+
+    def _spawn(self, job, cmd) -> int:
+        if not self.capture_output:
+            job.proc = subprocess.Popen(cmd, start_new_session=True)
+            self._started(job)
+            return job.proc.wait()
+        job.output, job.files_done, job.percent, job.progress = OutputRing(max_lines=JOB_OUTPUT_LINES), 0, None, ""
+        job.proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                    stdin=subprocess.DEVNULL, start_new_session=True)
+        self._started(job)
+        fd, partial = job.proc.stdout.fileno(), ""
+        decoder = codecs.getincrementaldecoder("utf-8")("replace")   # a character may straddle two reads
+        try:
+            while chunk := os.read(fd, READ_CHUNK):
+                # unison redraws its progress line with '\r'
+                text = decoder.decode(chunk).replace("\r", "\n")
+                job.output.write(text)
+                *lines, partial = (partial + text).split("\n")
+                for ln in lines: job._parse(ln)
+            if tail := decoder.decode(b"", final=True): job.output.write(tail)
+        finally:
+            job.proc.stdout.close()
+        return job.proc.wait()
+
+    # ── reporting ──
+    def summary(self) -> dict:
+        jobs = [j.summary() for j in self.jobs]
+        return {"jobs": jobs, "ok": sum(j["state"] == "done" for j in jobs),
+                "failed": sum(j["state"] == "failed" for j in jobs),
+                "cancelled": sum(j["state"] == "cancelled" for j in jobs),
+                "busy_s": round(sum(j["total_s"] for j in jobs), 3)}
+
+
+# ─────────────────────────── CLI ───────────────────────────
+def _print_event(event, job):
+    if event == "started": print(f"[start] {job.profile} (attempt {job.attempts})", flush=True)
+    elif event in ("done", "failed", "retry", "cancelled") and job.durations:
+        print(f"[{event}] {job.profile} rc={job.rc} in {job.durations[-1]:.1f}s", flush=True)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("profiles", nargs="*", help="profiles to sync (default: every .prf in --unison-dir)")
+    ap.add_argument("--unison-dir", default=UNISON_DIR)
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--per-device", type=int, default=1, help="max concurrent syncs per disk/host")
+    ap.add_argument("--retries", type=int, default=2)
+    ap.add_argument("--backoff", type=float, default=30.0, help="seconds before the first retry (doubles each time)")
+    ap.add_argument("--unison", default="unison", help="unison executable")
+    ap.add_argument("--json", metavar="FILE", help="also write the run summary as JSON")
+    ap.add_argument("--history", metavar="DB", help="record every attempt in this sync history database")
+    ap.add_argument("--skip-unchanged", action="store_true", help="pre-scan local roots; only run profiles with changes")
+    ap.add_argument("--force-every", type=float, default=24.0, metavar="HOURS",
+                    help="with --skip-unchanged: run every profile at least this often")
+    ap.add_argument("--scan-cache", metavar="FILE", help="snapshot cache for --skip-unchanged")
+    ap.add_argument("--governor", action="store_true",
+                    help="run jobs under CPU/IO/memory limits and hold new ones while the machine is loaded")
+    ap.add_argument("--governor-config", metavar="FILE", help="limits and admission thresholds for --governor")
+    args = ap.parse_args(argv)
+
+    listeners = [_print_event]
+    if args.history:
+        from history import SyncHistory
+        hist = SyncHistory(args.history, args.unison_dir)
+        def record(event, job):
+            if event in ("done", "failed", "retry", "cancelled") and job.finished:
+                hist.record_job(job.profile, job.started, job.finished, job.rc)
+        listeners.append(record)
+    t0 = time.monotonic()
+    profiles, skipped, scanner = args.profiles or list_profiles(args.unison_dir), [], None
+    if args.skip_unchanged:
+        from changescan import ChangeScanner, CACHE_PATH
+        scanner = ChangeScanner(args.scan_cache or CACHE_PATH, args.force_every * 3600)
+        plan = scanner.plan(args.unison_dir, profiles)
+        skipped, profiles = [p for p in profiles if plan[p] is None], [p for p in profiles if plan[p] is not None]
+        print(f"[precheck] {len(profiles)} to run, {len(skipped)} unchanged "
+              f"({scanner.stats['entries']} entries scanned in {scanner.stats['scan_s']:.1f}s)", flush=True)
+        def commit(event, job):
+            # rc 1 means unison skipped files: don't record them as synced
+            if event == "done" and job.rc == 0: scanner.commit(job.profile, job.durations[-1])
+        listeners.append(commit)
+
+    gov = None
+    if args.governor:
+        from governor import Governor, CONFIG_PATH, publish_loop
+        try: gov = Governor(args.governor_config or CONFIG_PATH)
+        except ValueError as e: print(f"Invalid governor config: {e}", file=sys.stderr); return 2
+        print(f"[governor] {gov.backend.name} backend, admitting while load/cpu < {gov.admission['max_load_per_cpu']} "
+              f"and disks < {gov.admission['max_disk_busy']:.0f}% busy", flush=True)
+
+    def on_event(event, job):
+        for fn in listeners: fn(event, job)
+    sched = SyncScheduler(args.unison_dir, args.workers, args.per_device, args.retries, args.backoff,
+                          args.unison, on_event=on_event, governor=gov)
+    sched.submit(profiles)
+    stop_publishing = threading.Event()
+    if gov:                                 # lets the GUI/daemon show these jobs and the throttle state
+        publisher = threading.Thread(target=publish_loop, args=(gov, stop_publishing), daemon=True); publisher.start()
+    try: sched.start().wait()
+    except KeyboardInterrupt:
+        sched.cancel_all(); sched.wait()
+    sched.stop()
+    if gov: stop_publishing.set(); publisher.join()
+    summary = sched.summary(); summary["wall_s"] = round(time.monotonic() - t0, 3)
+    if scanner:
+        scanner.save()
+        summary["precheck"] = {"run": len(profiles), "skipped": skipped, "scan_s": round(scanner.stats["scan_s"], 3),
+                               "saved_s": round(scanner.estimated_saving(skipped), 3)}
+    if gov: summary["governor"] = {"backend": gov.backend.name, "held_jobs": sched.held_jobs}
+
+    print(f"\n{'profile':<30} {'rc':>4} {'tries':>5} {'seconds':>9}")
+    for j in summary["jobs"]:
+        print(f"{j['profile']:<30} {str(j['rc']):>4} {j['attempts']:>5} {j['total_s']:>9.1f}")
+    print(f"{summary['ok']} ok, {summary['failed']} failed, {summary['cancelled']} cancelled, "
+          f"{summary['wall_s']:.1f}s wall, {summary['busy_s']:.1f}s busy")
+    if pre := summary.get("precheck"):
+        print(f"precheck: {pre['run']} run, {len(pre['skipped'])} skipped as unchanged, {pre['scan_s']:.1f}s scanning, "
+              f"~{pre['saved_s']:.1f}s of unison saved (by their last runs)")
+    if g := summary.get("governor"):
+        print(f"governor: {g['backend']} backend, {g['held_jobs']} job(s) held back for load")
+    if args.json:
+        with open(args.json, "w") as f: json.dump(summary, f, indent=2)
+    return 0 if not (summary["failed"] or summary["cancelled"]) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
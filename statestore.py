@@ -0,0 +1,174 @@
+"""
+In-memory state store for profiles, log stats and the crontab.
+
+The GUI used to re-list `~/.unison`, re-open `.prf` files and re-run `crontab -l`
+on every refresh. `StateStore` keeps all of that in memory and is kept current
+by a filesystem watcher on the unison and orchestrator directories: inotify
+through ctypes where available, otherwise a scandir-based poller. Readers compare
+the per-category `versions` counters to decide whether anything needs redrawing,
+or set `listener(kind, name)` to be told about each change as it happens.
+
+The crontab is held by a `cronmodel.CronManager`, which re-runs `crontab -l`
+only when the cron spool changes (or every `CRON_RECHECK_SECS` when the spool
+cannot be seen) and applies our edits as one atomic `crontab -`.
+"""
+
+import ctypes, ctypes.util, os, struct, threading, time
+
+from cronmodel import CronManager, default_resolve
+from prf import Profile
+
+POLL_SECS = 2.0
+
+IN_MODIFY, IN_ATTRIB, IN_CLOSE_WRITE = 0x002, 0x004, 0x008
+IN_MOVED_FROM, IN_MOVED_TO, IN_CREATE, IN_DELETE = 0x040, 0x080, 0x100, 0x200
+IN_Q_OVERFLOW = 0x4000
+WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+_EVENT = struct.Struct("iIII")
+
+
+# ─────────────────────────── WATCHERS ───────────────────────────
+class InotifyWatcher:
+    """Calls `callback(directory, name)` for every change inside the watched directories."""
+
+    def __init__(self, dirs, callback):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._fd = libc.inotify_init1(os.O_CLOEXEC)
+        if self._fd < 0: raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._dirs, self._callback = {}, callback
+        for d in dirs:
+            wd = libc.inotify_add_watch(self._fd, os.fsencode(d), WATCH_MASK)
+            if wd < 0: raise OSError(ctypes.get_errno(), f"inotify_add_watch({d}) failed")
+            self._dirs[wd] = d
+
+    def run(self):
+        while True:
+            buf, pos = os.read(self._fd, 64 * 1024), 0
+            while pos < len(buf):
+                wd, mask, _, length = _EVENT.unpack_from(buf, pos); pos += _EVENT.size
+                name = buf[pos:pos + length].rstrip(b"\0").decode("utf-8", "replace"); pos += length
+                if mask & IN_Q_OVERFLOW:
+                    for d in self._dirs.values(): self._callback(d, None)
+                elif wd in self._dirs: self._callback(self._dirs[wd], name)
+
+
+class PollingWatcher:
+    """Fallback: diffs (mtime, size) of every entry in the watched directories every POLL_SECS."""
+
+    def __init__(self, dirs, callback, interval=POLL_SECS):
+        self._dirs, self._callback, self._interval = list(dirs), callback, interval
+        self._snap = {d: self._scan(d) for d in self._dirs}
+
+    @staticmethod
+    def _scan(d):
+        snap = {}
+        try: entries = list(os.scandir(d))
+        except FileNotFoundError: return snap
+        for e in entries:
+            try: st = e.stat()
+            except OSError: continue               # removed since the listing; the next scan reports it gone
+            snap[e.name] = (st.st_mtime_ns, st.st_size)
+        return snap
+
+    def run(self):
+        while True:
+            time.sleep(self._interval)
+            for d in self._dirs:
+                new, old = self._scan(d), self._snap[d]
+                for name in new.keys() | old.keys():
+                    if new.get(name) != old.get(name): self._callback(d, name)
+                self._snap[d] = new
+
+
+# ─────────────────────────── STORE ───────────────────────────
+class StateStore:
+    def __init__(self, unison_dir, orch_dir):
+        self.unison_dir, self.orch_dir = unison_dir, orch_dir
+        self._lock = threading.Lock()
+        self._profiles: dict[str, Profile | None] = {}   # None = not parsed since last change
+        self._logs: dict[str, tuple[int, int]] = {}
+        self._changed_logs: set[str] = set()
+        self.cron = CronManager(resolve=lambda token: default_resolve(token, orch_dir))
+        self.versions = {"profiles": 0, "logs": 0, "scripts": 0, "crontab": 0}
+        self.watcher_kind = None
+        self.listener = None      # called as listener(kind, name) outside the lock
+        self.reload()
+
+    # ── readers ──
+    def profiles(self) -> list[str]:
+        with self._lock: return sorted(self._profiles)
+
+    def profile(self, name) -> Profile | None:
+        """Parsed profile (cached until the file changes), or None if it does not exist."""
+        with self._lock:
+            if name not in self._profiles: return None
+            if self._profiles[name] is None: self._profiles[name] = self._parse(name)
+            return self._profiles[name]
+
+    def log_stat(self, name):
+        with self._lock: return self._logs.get(name)
+
+    def drain_changed_logs(self) -> set[str]:
+        with self._lock:
+            changed, self._changed_logs = self._changed_logs, set()
+            return changed
+
+    def crontab_text(self) -> str:
+        text = self.cron.read().render()
+        self.versions["crontab"] = self.cron.version
+        return text or "(no crontab)"
+
+    def invalidate_crontab(self):
+        self.cron.invalidate()
+
+    # ── watching ──
+    def start(self):
+        dirs = [self.unison_dir, self.orch_dir]
+        try: watcher, self.watcher_kind = InotifyWatcher(dirs, self._on_change), "inotify"
+        except (OSError, AttributeError): watcher, self.watcher_kind = PollingWatcher(dirs, self._on_change), "polling"
+        threading.Thread(target=watcher.run, daemon=True).start()
+        return self
+
+    def _on_change(self, directory, name):
+        kind = self._apply_change(directory, name)
+        if kind and self.listener: self.listener(kind, name and os.path.splitext(name)[0])
+
+    def _apply_change(self, directory, name):
+        if directory == self.orch_dir:
+            with self._lock: self.versions["scripts"] += 1
+            return "scripts"
+        if name is None: self.reload(); return "reset"   # inotify queue overflow
+        stem, ext = os.path.splitext(name)
+        with self._lock:
+            if ext == ".prf":
+                exists = os.path.exists(os.path.join(self.unison_dir, name))
+                if exists: self._profiles[stem] = None   # re-parsed lazily on next read
+                else: self._profiles.pop(stem, None)
+                self.versions["profiles"] += 1
+                return "profiles"
+            elif ext == ".log":
+                try: st = os.stat(os.path.join(self.unison_dir, name)); self._logs[stem] = (st.st_mtime_ns, st.st_size)
+                except FileNotFoundError: self._logs.pop(stem, None)
+                self._changed_logs.add(stem); self.versions["logs"] += 1
+                return "log"
+        return None
+
+    def _parse(self, name):
+        path = os.path.join(self.unison_dir, f"{name}.prf")
+        try: return Profile.load(path)
+        except FileNotFoundError: return Profile(path=path)
+
+    def reload(self):
+        """Full rescan of the unison directory (startup, queue overflow, manual refresh)."""
+        profiles, logs = {}, {}
+        for e in os.scandir(self.unison_dir):
+            stem, ext = os.path.splitext(e.name)
+            if ext == ".prf": profiles[stem] = None
+            elif ext == ".log":
+                try: st = e.stat()
+                except OSError: continue           # rotated away mid-scan
+                logs[stem] = (st.st_mtime_ns, st.st_size)
+        with self._lock:
+            self._profiles, self._logs = profiles, logs
+            self._changed_logs |= set(logs)
+            for k in ("profiles", "logs"): self.versions[k] += 1
@@ -0,0 +1,56 @@
+import datetime as dt
+
+import pytest
+
+from cronmodel import Schedule
+
+
+def at(*args):
+    return dt.datetime(*args)
+
+
+def test_next_after_is_strictly_after():
+    s = Schedule.parse("30 2 * * *")
+    assert s.next_after(at(2026, 10, 17, 2, 29, 59)) == at(2026, 10, 17, 2, 30)
+    assert s.next_after(at(2026, 10, 17, 2, 30)) == at(2026, 10, 18, 2, 30)
+
+
+def test_next_after_rolls_over_hours_days_and_weekends():
+    s = Schedule.parse("*/15 9-17 * * mon-fri")
+    assert s.next_after(at(2026, 10, 14, 9, 0)) == at(2026, 10, 14, 9, 15)
+    assert s.next_after(at(2026, 10, 14, 17, 45)) == at(2026, 10, 15, 9, 0)
+    assert s.next_after(at(2026, 10, 16, 17, 50)) == at(2026, 10, 19, 9, 0)      # Friday evening -> Monday
+
+
+def test_next_after_rolls_over_months_and_years():
+    assert Schedule.parse("0 0 1 */3 *").next_after(at(2026, 10, 17)) == at(2027, 1, 1)
+    assert Schedule.parse("@yearly").next_after(at(2026, 12, 31, 23, 59)) == at(2027, 1, 1)
+    assert Schedule.parse("0 12 29 2 *").next_after(at(2026, 3, 1)) == at(2028, 2, 29, 12, 0)
+
+
+def test_restricted_dom_and_dow_match_either():
+    # 13th of the month OR any Friday
+    runs = Schedule.parse("0 0 13 * fri").runs(at(2026, 10, 1), at(2026, 10, 31))
+    assert [t.day for t in runs] == [2, 9, 13, 16, 23, 30]
+
+
+def test_one_restricted_day_field_must_match():
+    assert [t.day for t in Schedule.parse("0 0 * * 0").runs(at(2026, 10, 1), at(2026, 10, 31))] == [4, 11, 18, 25]
+    assert [t.day for t in Schedule.parse("0 0 13 * *").runs(at(2026, 10, 1), at(2026, 12, 31))] == [13, 13, 13]
+    # a day field starting with '*' counts as unrestricted, as in Vixie cron: both must match
+    assert [t.day for t in Schedule.parse("0 0 */2 * sun").runs(at(2026, 10, 1), at(2026, 10, 31))] == [11, 25]
+
+
+def test_sunday_is_0_or_7():
+    assert Schedule.parse("0 0 * * 7").next_after(at(2026, 10, 17)) == at(2026, 10, 18)
+
+
+def test_no_next_run():
+    assert Schedule.parse("@reboot").next_after(at(2026, 10, 17)) is None
+    assert Schedule.parse("0 0 31 2 *").next_after(at(2026, 10, 17)) is None
+
+
+@pytest.mark.parametrize("text", ["* * * *", "60 * * * *", "* * 0 * *", "*/0 * * * *", "* * * foo *", "5-1 * * * *"])
+def test_invalid_expressions(text):
+    with pytest.raises(ValueError):
+        Schedule.parse(text)
@@ -0,0 +1,101 @@
+import os, threading, time
+
+from history import SyncHistory, _epoch
+
+DAY = "17 Oct 2026"
+
+
+def run(start, end, files=1, failed=0, conflicts=0):
+    return (f"UNISON 2.53.3 started propagating changes at {start}.00 on {DAY}\n"
+            + "[CONFLICT] 1 of 1: changed on both sides: a  <-?-> a\n" * conflicts +
+            f"UNISON 2.53.3 finished propagating changes at {end}.00 on {DAY}\n"
+            f"Synchronization complete at {end}  ({files} items transferred, 0 skipped, {failed} failed)\n")
+
+
+def rows(hist):
+    return hist._query("SELECT profile, source, started, ended, duration, files, failed, conflicts, exit_code"
+                       " FROM runs ORDER BY ended", ())
+
+
+def test_ingest_parses_runs(tmp_path):
+    (tmp_path / "p.log").write_text(run("09:00:00", "09:00:30", files=3) + run("10:00:00", "10:02:00", failed=1, conflicts=2))
+    hist = SyncHistory(str(tmp_path / "h.db"), str(tmp_path))
+    assert hist.ingest("p") == 2
+    first, second = rows(hist)
+    assert first["started"] == _epoch(DAY, "09:00:00") and first["duration"] == 30 and first["files"] == 3
+    assert second["failed"] == 1 and second["conflicts"] == 2 and second["duration"] == 120
+    assert {r["source"] for r in (first, second)} == {"log"}
+
+
+def test_ingest_is_incremental(tmp_path):
+    log = tmp_path / "p.log"
+    log.write_text(run("09:00:00", "09:00:30"))
+    hist = SyncHistory(str(tmp_path / "h.db"), str(tmp_path))
+    assert hist.ingest("p") == 1
+    assert hist.ingest("p") == 0
+    with open(log, "a") as f: f.write(run("10:00:00", "10:00:10")[:-40])       # run still being written
+    assert hist.ingest("p") == 0
+    with open(log, "a") as f: f.write(run("10:00:00", "10:00:10")[-40:])
+    assert hist.ingest("p") == 1
+    assert len(rows(hist)) == 2
+
+
+def test_ingest_restarts_after_rotation(tmp_path):
+    log = tmp_path / "p.log"
+    log.write_text(run("09:00:00", "09:00:30") + run("10:00:00", "10:00:30"))
+    hist = SyncHistory(str(tmp_path / "h.db"), str(tmp_path))
+    hist.ingest("p")
+    os.rename(log, tmp_path / "p.log.1")
+    log.write_text(run("11:00:00", "11:00:30"))
+    assert hist.ingest("p") == 1
+    assert len(rows(hist)) == 3
+
+
+def test_ingest_missing_log(tmp_path):
+    assert SyncHistory(str(tmp_path / "h.db"), str(tmp_path)).ingest("none") == 0
+
+
+def test_shared_database_ingests_once(tmp_path):
+    (tmp_path / "p.log").write_text("".join(run(f"09:{m:02d}:00", f"09:{m:02d}:30") for m in range(50)))
+    db = str(tmp_path / "h.db")
+    histories = [SyncHistory(db, str(tmp_path)) for _ in range(4)]
+    barrier = threading.Barrier(len(histories))
+    def ingest(hist): barrier.wait(); hist.ingest("p")
+    threads = [threading.Thread(target=ingest, args=(h,)) for h in histories]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    assert len(rows(SyncHistory(db, str(tmp_path)))) == 50
+
+
+def test_record_job_attaches_exit_code(tmp_path):
+    (tmp_path / "p.log").write_text(run("09:00:00", "09:00:30"))
+    hist = SyncHistory(str(tmp_path / "h.db"), str(tmp_path))
+    hist.record_job("p", _epoch(DAY, "09:00:00"), _epoch(DAY, "09:00:31"), 1)
+    hist.record_job("q", _epoch(DAY, "09:05:00"), _epoch(DAY, "09:05:01"), -9)     # killed before logging
+    p, q = rows(hist)
+    assert (p["source"], p["exit_code"]) == ("log", 1)
+    assert (q["profile"], q["source"], q["exit_code"]) == ("q", "scheduler", -9)
+
+
+def test_trend_queries(tmp_path):
+    (tmp_path / "p.log").write_text(run("09:00:00", "09:00:30") + run("10:00:00", "10:01:30", failed=1))
+    hist = SyncHistory(str(tmp_path / "h.db"), str(tmp_path))
+    hist.ingest("p")
+    hist.record_job("q", _epoch(DAY, "09:05:00"), _epoch(DAY, "09:05:10"), -15)
+    hist.record_job("r", _epoch(DAY, "09:06:00"), _epoch(DAY, "09:06:20"), 0)
+    since = _epoch(DAY, "08:00:00")
+    assert [(r["profile"], r["runs"], r["avg_s"], r["max_s"]) for r in hist.slowest_profiles(since)] == \
+        [("p", 2, 60.0, 90.0), ("r", 1, 20.0, 20.0), ("q", 1, 10.0, 10.0)]
+    assert {r["profile"]: r["failure_rate"] for r in hist.failure_rate(since)} == {"q": 1.0, "p": 0.5, "r": 0.0}
+    assert sum(r["runs"] for r in hist.throughput(since)) == 4
+    assert hist.slowest_profiles(_epoch(DAY, "10:01:00")) == \
+        [{"profile": "p", "runs": 1, "avg_s": 90.0, "max_s": 90.0}]
+
+
+def test_rollup_is_backfilled_for_an_older_database(tmp_path):
+    db = str(tmp_path / "h.db")
+    hist = SyncHistory(db, str(tmp_path))
+    hist._db.execute("INSERT INTO runs(profile, source, ended, duration) VALUES ('p', 'log', ?, 5)", (time.time(),))
+    hist._db.commit()
+    hist._db.executescript("DROP TRIGGER runs_daily_insert; DROP TRIGGER runs_daily_exit_code; DROP TABLE daily")
+    assert SyncHistory(db, str(tmp_path)).slowest_profiles(time.time() - 3 * 86400)[0]["runs"] == 1
@@ -0,0 +1,93 @@
+import os
+
+import logindex
+from logindex import LogIndex
+
+
+def run(clock, n=1, day="17 Oct 2026"):
+    return (f"UNISON 2.53.3 started propagating changes at {clock}.00 on {day}\n"
+            f"[BGN] Updating file a\n"
+            f"UNISON 2.53.3 finished propagating changes at {clock}.50 on {day}\n"
+            f"Synchronization complete at {clock}  ({n} item transferred, 0 skipped, 0 failed)\n")
+
+
+def test_first_scan_finds_last_completion_and_tail(tmp_path):
+    path = tmp_path / "p.log"
+    path.write_text(run("09:00:00") + run("10:00:00", 2) + "partial line")
+    idx = LogIndex(tail_lines=3)
+    assert idx.last_sync(str(path)) == "10:00:00  (2 item transferred, 0 skipped, 0 failed)"
+    assert idx.tail(str(path)).splitlines()[-1] == "partial line"
+    assert len(idx.tail(str(path)).splitlines()) == 3
+
+
+def test_append_parses_only_new_bytes(tmp_path):
+    path = tmp_path / "p.log"
+    path.write_text(run("09:00:00"))
+    idx = LogIndex()
+    assert idx.last_sync(str(path)).startswith("09:00:00")
+    before, extra = idx.bytes_read, run("11:30:00")
+    with open(path, "a") as f: f.write(extra)
+    assert idx.last_sync(str(path)).startswith("11:30:00")
+    assert idx.bytes_read - before == len(extra)
+
+
+def test_completion_without_newline_counts(tmp_path):
+    path = tmp_path / "p.log"
+    path.write_text(run("09:00:00"))
+    idx = LogIndex()
+    idx.last_sync(str(path))
+    with open(path, "a") as f: f.write("Synchronization complete at 09:05:00  (0 items transferred, 0 skipped, 0 failed)")
+    assert idx.last_sync(str(path)).startswith("09:05:00")
+
+
+def test_truncate_rescans(tmp_path):
+    path = tmp_path / "p.log"
+    path.write_text(run("09:00:00") + run("10:00:00"))
+    idx = LogIndex()
+    assert idx.last_sync(str(path)).startswith("10:00:00")
+    with open(path, "w") as f: f.write("no runs yet\n")                  # same inode, shorter
+    assert idx.last_sync(str(path)) is None
+    assert idx.tail(str(path)) == "no runs yet\n"
+
+
+def test_truncate_then_regrow_past_offset_rescans(tmp_path):
+    path = tmp_path / "p.log"
+    path.write_text(run("09:00:00"))
+    idx = LogIndex()
+    idx.last_sync(str(path))
+    ino = os.stat(path).st_ino
+    with open(path, "w") as f: f.write(run("13:00:00") + run("14:00:00"))   # longer, old bytes gone
+    assert os.stat(path).st_ino == ino
+    assert idx.last_sync(str(path)).startswith("14:00:00")
+
+
+def test_rotation_rescans(tmp_path):
+    path = tmp_path / "p.log"
+    path.write_text(run("09:00:00") + run("10:00:00"))
+    idx = LogIndex()
+    idx.last_sync(str(path))
+    os.rename(path, tmp_path / "p.log.1")
+    path.write_text(run("12:00:00") + "x" * 400 + "\n")                    # new inode, larger file
+    assert idx.last_sync(str(path)).startswith("12:00:00")
+
+
+def test_missing_log(tmp_path):
+    idx = LogIndex()
+    assert idx.last_sync(str(tmp_path / "none.log")) is None
+    assert idx.tail(str(tmp_path / "none.log")) is None
+
+
+def test_last_sync_at_uses_dated_line(tmp_path):
+    path = tmp_path / "p.log"
+    path.write_text(run("23:59:00")[:-1].replace("complete at 23:59:00", "complete at 00:01:00") + "\n")
+    at = LogIndex().last_sync_at(str(path))
+    assert at == logindex._dated(b"propagating changes at 00:01:00 on 18 Oct 2026")    # completed past midnight
+
+
+def test_backwards_scan_crosses_blocks(tmp_path, monkeypatch):
+    monkeypatch.setattr(logindex, "BLOCK_SIZE", 64)
+    path = tmp_path / "p.log"
+    path.write_text(run("08:00:00") + "".join(f"noise line {i}\n" for i in range(50)))
+    idx = LogIndex(tail_lines=5)
+    assert idx.last_sync(str(path)).startswith("08:00:00")
+    assert idx.tail(str(path)).splitlines() == [f"noise line {i}" for i in range(45, 50)]
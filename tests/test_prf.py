@@ -0,0 +1,85 @@
+import os
+
+from prf import Profile, apply_tuning
+
+TEXT = """# work laptop <-> NAS
+root = /home/me/work
+root = ssh://nas//srv/work
+
+include common
+include? local-overrides
+ignore = Name *.o
+ignore = Name .git
+fastcheck = false
+  maxthreads=4
+not a preference line
+logfile = /home/me/.unison/work.log"""          # no trailing newline
+
+
+def write(tmp_path, text=TEXT, name="work.prf"):
+    path = tmp_path / name
+    path.write_text(text)
+    return str(path)
+
+
+def test_load_save_is_byte_identical(tmp_path):
+    path = write(tmp_path)
+    prof = Profile.load(path)
+    assert prof.render() == TEXT
+    prof.save()
+    assert open(path).read() == TEXT
+
+
+def test_parsed_fields(tmp_path):
+    prof = Profile.load(write(tmp_path))
+    assert prof.roots == ["/home/me/work", "ssh://nas//srv/work"]
+    assert prof.includes == [("include", "common"), ("include?", "local-overrides")]
+    assert prof.get_all("ignore") == ["Name *.o", "Name .git"]
+    assert prof.get("maxthreads") == "4"
+
+
+def test_edits_touch_only_their_lines(tmp_path):
+    path = write(tmp_path)
+    prof = Profile.load(path)
+    prof.set("fastcheck", "true")
+    prof.add("ignore", "Name target")
+    prof.set("rsync", "false")
+    prof.save()
+    assert open(path).read() == (TEXT.replace("fastcheck = false", "fastcheck = true")
+                                 .replace("ignore = Name .git\n", "ignore = Name .git\nignore = Name target\n")
+                                 + "\nrsync = false\n")
+    assert Profile.load(path).render() == open(path).read()
+
+
+def test_set_collapses_duplicates_and_none_removes(tmp_path):
+    prof = Profile.load(write(tmp_path, "batch = true\nbatch = false\nauto = true\n"))
+    prof.set("batch", "true")
+    assert prof.render() == "batch = true\nauto = true\n"
+    prof.set("auto", None)
+    assert prof.render() == "batch = true\n"
+
+
+def test_save_is_atomic_and_keeps_mode(tmp_path):
+    path = write(tmp_path)
+    os.chmod(path, 0o600)
+    prof = Profile.load(path)
+    prof.set("fastcheck", "true")
+    prof.save()
+    assert os.stat(path).st_mode & 0o777 == 0o600
+    assert os.listdir(tmp_path) == ["work.prf"]            # no temp file left behind
+
+
+def test_new_profile_round_trips(tmp_path):
+    prof = Profile.new("docs", "/a", "/b", unison_dir=str(tmp_path))
+    prof.save()
+    loaded = Profile.load(os.path.join(tmp_path, "docs.prf"))
+    assert loaded.render() == prof.render()
+    assert loaded.roots == ["/a", "/b"] and loaded.get("logfile") == f"{tmp_path}/docs.log"
+
+
+def test_apply_tuning_only_writes_changes(tmp_path):
+    path = write(tmp_path)
+    assert apply_tuning(path, {"fastcheck": "true"}, ["Name *.o"])
+    mtime = os.stat(path).st_mtime_ns
+    assert not apply_tuning(path, {"fastcheck": "true"}, ["Name *.o"])
+    assert os.stat(path).st_mtime_ns == mtime